@@ -11434,15 +11434,17 @@ DELIMITER ;
 
 
 -- Procedure: Delete AQI and pollutant data older than N days
+-- (row-by-row; once database/partition_tables.sql is applied use retention.py,
+--  which drops or archives whole months instead)
 DELIMITER $$
 CREATE PROCEDURE purge_old_aqi_proc(IN p_days INT)
 BEGIN
-    DECLARE cutoff DATETIME;
-    SET cutoff = DATE_SUB(NOW(), INTERVAL p_days DAY);
+    DECLARE cutoff DATE;
+    SET cutoff = DATE_SUB(CURDATE(), INTERVAL p_days DAY);
 
     START TRANSACTION;
       DELETE FROM pollutants WHERE date < cutoff;
-      DELETE FROM aqi WHERE measurement_date < cutoff;
+      DELETE FROM aqi WHERE date < cutoff;
       INSERT INTO audit_log (user_id, action, table_name, record_id, details, timestamp)
       VALUES (IFNULL(@current_user_id, NULL),
               'DELETE',
@@ -11465,7 +11467,7 @@ BEGIN
     SELECT ROUND(AVG(aqi_value),2) INTO result
     FROM aqi
     WHERE city_id = p_city_id
-      AND measurement_date >= DATE_SUB(NOW(), INTERVAL p_days DAY);
+      AND date >= DATE_SUB(CURDATE(), INTERVAL p_days DAY);
     RETURN IFNULL(result, 0.00);
 END $$
 DELIMITER ;
@@ -11500,42 +11502,17 @@ SELECT
     c.city_name,
     a.aqi_id,
     a.aqi_value,
-    a.measurement_date
+    a.date
 FROM aqi a
 JOIN stations s ON a.station_id = s.station_id
 JOIN cities c ON s.city_id = c.city_id
-WHERE (a.station_id, a.measurement_date) IN (
-    SELECT station_id, MAX(measurement_date)
+WHERE (a.station_id, a.date) IN (
+    SELECT station_id, MAX(date)
     FROM aqi
     GROUP BY station_id
 );
 
 
--- Trigger: After AQI insert, update city and log audit
-DELIMITER $$
-CREATE TRIGGER trg_after_aqi_insert
-AFTER INSERT ON aqi
-FOR EACH ROW
-BEGIN
-    IF EXISTS (
-        SELECT 1
-        FROM INFORMATION_SCHEMA.COLUMNS
-        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'cities' AND COLUMN_NAME = 'last_aqi_value'
-    ) THEN
-        UPDATE cities
-        SET last_aqi_value = NEW.aqi_value,
-            last_aqi_date  = NEW.measurement_date
-        WHERE city_id = NEW.city_id;
-    END IF;
-
-    INSERT INTO audit_log (user_id, action, table_name, record_id, details, timestamp)
-    VALUES (IFNULL(@current_user_id, NULL),
-            'INSERT',
-            'aqi',
-            NEW.aqi_id,
-            CONCAT('Inserted AQI=', NEW.aqi_value, ' station_id=', NEW.station_id),
-            NOW());
-            
-END $$
-DELIMITER ;
+-- Latest AQI per station / city: maintained by the application in the latest_reading
+-- table (database/create_latest_reading.sql, latest_reading.py) instead of a per-row trigger
 show tables;
\ No newline at end of file
@@ -0,0 +1,252 @@
+"""
+JSON API Core
+SQL and response shaping shared by the Flask routes in app.py and the
+asyncio API tier in asgi_api.py, so both serving modes return identical
+payloads. Nothing here performs I/O - callers run the queries and HTTP
+calls with their own (sync or async) clients.
+"""
+
+import random
+from datetime import date, datetime
+
+from config import Config
+
+# Daily AQI series the trend views can read from (aqi_daily_filled is built by resampling.py)
+AQI_SOURCES = {
+    'raw': 'aqi',
+    'filled': 'aqi_daily_filled'
+}
+
+# ==================== Dashboard Stats ====================
+
+# Averages come from the cube's city rollups, which cover archived months too
+DASHBOARD_AQI_ALL_QUERY = """
+    SELECT c.city_name, SUM(k.aqi_sum) / SUM(k.aqi_count) as avg_aqi
+    FROM aqi_cube_city k
+    JOIN cities c ON k.city_id = c.city_id
+    GROUP BY c.city_name
+    HAVING avg_aqi IS NOT NULL
+    ORDER BY avg_aqi DESC
+    LIMIT 10
+"""
+
+DASHBOARD_AQI_CITY_QUERY = """
+    SELECT c.city_name, SUM(k.aqi_sum) / SUM(k.aqi_count) as avg_aqi
+    FROM aqi_cube_city k
+    JOIN cities c ON k.city_id = c.city_id
+    WHERE k.city_id = %s
+    GROUP BY c.city_name
+    HAVING avg_aqi IS NOT NULL
+"""
+
+VEHICLE_TOTALS_QUERY = """
+    SELECT vehicle_id, SUM(vehicle_count) as total_count
+    FROM vehicle_info
+    GROUP BY vehicle_id
+"""
+
+
+def dashboard_aqi_query(role, city_id):
+    """(query, params) of the AQI-by-city chart for a user"""
+    if role == 'admin':
+        return DASHBOARD_AQI_ALL_QUERY, None
+    return DASHBOARD_AQI_CITY_QUERY, (city_id,)
+
+
+# ==================== AQI Trends ====================
+
+def aqi_trends_query(aqi_table, role, city_id):
+    """(query, params) of the 12-month AQI trend for a user; aqi_table comes from AQI_SOURCES"""
+    if role == 'admin':
+        return f"""
+            SELECT DATE_FORMAT(date, '%Y-%m') as month,
+                   AVG(aqi_value) as avg_aqi
+            FROM {aqi_table}
+            WHERE date >= DATE_SUB(CURDATE(), INTERVAL 12 MONTH)
+            GROUP BY month
+            ORDER BY month
+        """, None
+    return f"""
+            SELECT DATE_FORMAT(date, '%Y-%m') as month,
+                   AVG(aqi_value) as avg_aqi
+            FROM {aqi_table}
+            WHERE city_id = %s AND date >= DATE_SUB(CURDATE(), INTERVAL 12 MONTH)
+            GROUP BY month
+            ORDER BY month
+        """, (city_id,)
+
+
+# ==================== City Search ====================
+
+# Latest AQI reading with pollutants (one keyed row maintained by latest_reading.py)
+LATEST_READING_QUERY = """
+    SELECT aqi_value, date, pm25, pm10, no2, so2, co, o3
+    FROM latest_reading
+    WHERE scope = 'city' AND scope_id = %s
+"""
+
+# Year of the monthly trend chart shown by city search (the bundled dataset covers 2024)
+TREND_YEAR = 2024
+
+
+def trend_range():
+    """[start, end) of the city search trend"""
+    return date(TREND_YEAR, 1, 1), date(TREND_YEAR + 1, 1, 1)
+
+
+def build_trends(readings):
+    """
+    Monthly avg/max/min AQI and the dates of the extremes
+
+    Args:
+        readings: DataFrame with date and aqi_value columns (archive.read_range)
+    """
+    trends = {
+        'months': [],
+        'avg_aqi': [],
+        'max_aqi': [],
+        'min_aqi': [],
+        'max_dates': [],
+        'min_dates': []
+    }
+
+    readings = readings.dropna(subset=['aqi_value'])
+    for month, values in readings.groupby(readings['date'].dt.month)['aqi_value']:
+        trends['months'].append(int(month))
+        trends['avg_aqi'].append(round(float(values.mean()), 2))
+        trends['max_aqi'].append(int(values.max()))
+        trends['min_aqi'].append(int(values.min()))
+        trends['max_dates'].append(str(readings.loc[values.idxmax(), 'date'].date()))
+        trends['min_dates'].append(str(readings.loc[values.idxmin(), 'date'].date()))
+    return trends
+
+
+def get_aqi_health_impact(aqi_value):
+    """Get AQI category, health impact message, and color based on AQI value"""
+    if aqi_value <= 50:
+        return {
+            'category': 'Good',
+            'message': 'Air quality is satisfactory, and air pollution poses little or no risk.',
+            'color': 'success',
+            'text_color': 'text-success'
+        }
+    elif aqi_value <= 100:
+        return {
+            'category': 'Moderate',
+            'message': 'Air quality is acceptable. However, there may be a risk for some people.',
+            'color': 'info',
+            'text_color': 'text-info'
+        }
+    elif aqi_value <= 150:
+        return {
+            'category': 'Unhealthy for Sensitive Groups',
+            'message': 'Members of sensitive groups may experience health effects.',
+            'color': 'warning',
+            'text_color': 'text-warning'
+        }
+    elif aqi_value <= 200:
+        return {
+            'category': 'Unhealthy',
+            'message': 'Everyone may begin to experience health effects; sensitive groups at greater risk.',
+            'color': 'orange',
+            'text_color': 'text-warning'
+        }
+    elif aqi_value <= 300:
+        return {
+            'category': 'Very Unhealthy',
+            'message': 'Health alert: everyone may experience more serious health effects.',
+            'color': 'danger',
+            'text_color': 'text-danger'
+        }
+    else:
+        return {
+            'category': 'Hazardous',
+            'message': 'Health warning: everyone may experience serious health effects.',
+            'color': 'danger',
+            'text_color': 'text-danger'
+        }
+
+
+def build_city_response(city, latest, trends, live_data):
+    """
+    City search payload - live API data when available, database fallback otherwise
+
+    Args:
+        city: city_index.resolve() row
+        latest: Rows of LATEST_READING_QUERY
+        trends: build_trends() result
+        live_data: shape_live_data() result or None
+    """
+    response = {
+        'city_name': city['city_name'],
+        'state_name': city['state_name'],
+        'city_id': city['city_id'],
+        'station_names': city['station_names'] if city['station_names'] else 'No stations',
+        'station_count': city['station_count'],
+        'total_readings': city['reading_count'],
+        'trends': trends
+    }
+
+    if live_data:
+        response.update(live_data)
+        response.update({
+            'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'data_source': 'Live API'
+        })
+    else:
+        reading = latest[0] if latest else None
+
+        def pollutant(name):
+            return round(float(reading[name]), 2) if reading and reading[name] else 0
+
+        response.update({
+            'live_aqi': int(reading['aqi_value']) if reading else 0,
+            'pm25': pollutant('pm25'),
+            'pm10': pollutant('pm10'),
+            'no2': pollutant('no2'),
+            'so2': pollutant('so2'),
+            'co': pollutant('co'),
+            'o3': pollutant('o3'),
+            'temperature': random.randint(20, 35),
+            'humidity': random.randint(50, 80),
+            'wind_speed': random.randint(5, 25),
+            'precipitation': round(random.uniform(0, 10), 1),
+            'last_updated': str(reading['date']) if reading else datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'data_source': 'Database'
+        })
+
+    # Add AQI health impact information
+    response['health_impact'] = get_aqi_health_impact(response.get('live_aqi', 0))
+    return response
+
+
+# ==================== OpenWeatherMap ====================
+
+def geo_url(city_name):
+    return f"{Config.OPENWEATHER_GEO_URL}/direct?q={city_name},IN&limit=1&appid={Config.OPENWEATHER_API_KEY}"
+
+
+def weather_url(lat, lon):
+    return f"{Config.OPENWEATHER_BASE_URL}/weather?lat={lat}&lon={lon}&appid={Config.OPENWEATHER_API_KEY}&units=metric"
+
+
+def pollution_url(lat, lon):
+    return f"{Config.OPENWEATHER_BASE_URL}/air_pollution?lat={lat}&lon={lon}&appid={Config.OPENWEATHER_API_KEY}"
+
+
+def shape_live_data(weather_data, pollution_data):
+    """Extract the fields city search shows from the weather and air pollution payloads"""
+    components = pollution_data['list'][0]['components']
+    return {
+        'temperature': round(weather_data['main']['temp'], 1),
+        'humidity': weather_data['main']['humidity'],
+        'wind_speed': round(weather_data['wind']['speed'] * 3.6, 1),  # Convert m/s to km/h
+        'precipitation': round(weather_data.get('rain', {}).get('1h', 0), 1),
+        'live_aqi': pollution_data['list'][0]['main']['aqi'] * 50,  # Convert to US AQI scale
+        'pm25': round(components['pm2_5'], 2),
+        'pm10': round(components['pm10'], 2),
+        'no2': round(components['no2'], 2),
+        'so2': round(components['so2'], 2),
+        'co': round(components['co'] / 1000, 2),  # Convert to mg/m³
+        'o3': round(components['o3'], 2)
+    }
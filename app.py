@@ -6,10 +6,7 @@ Date: November 2025
 """
 
 from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, send_file
-from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
-import mysql.connector
-from mysql.connector import Error
 from config import Config
 from datetime import datetime
 import csv
@@ -17,10 +14,32 @@ import io
 import json
 import requests
 import logging
+import math
+import os
+import uuid
+
+import api_core
+import city_index
+import city_stats
+import comparison
+import credentials
+import cube
+import exposure
+import geo_index
+import health_analytics
+import instrumentation
+import jobs
+import latest_reading
+import live_updates
+import page_cache
+import report_builder
+import response_cache
+import singleflight
+from response_cache import cached_json
 
 # Import improved database module
+import database
 from database import (
-    get_db_connection, 
     execute_query, 
     execute_transaction, 
     check_db_health, 
@@ -31,9 +50,15 @@ app = Flask(__name__)
 app.config.from_object(Config)
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=Config.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
+# Per-route latency and DB query accounting (exposed at /metrics)
+instrumentation.init_app(app)
+
+# Read-your-writes stickiness for replica routing (no-op without DB_REPLICAS)
+database.init_app(app)
+
 # ==================== Custom Template Filters ====================
 
 @app.template_filter('datetime')
@@ -45,38 +70,6 @@ def format_datetime(value):
 
 # ==================== Database Helper Functions ====================
 
-def get_db_connection():
-    """Establish and return MySQL database connection"""
-    try:
-        connection = mysql.connector.connect(**Config.get_db_config())
-        return connection
-    except Error as e:
-        print(f"Database connection error: {e}")
-        return None
-
-def execute_query(query, params=None, fetch=False):
-    """Execute SQL query with parameters (prevents SQL injection)"""
-    connection = get_db_connection()
-    if not connection:
-        return None
-    
-    try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(query, params or ())
-        
-        if fetch:
-            result = cursor.fetchall()
-        else:
-            connection.commit()
-            result = cursor.lastrowid
-        
-        cursor.close()
-        connection.close()
-        return result
-    except Error as e:
-        print(f"Query execution error: {e}")
-        return None
-
 def log_audit(user_id, action, table_name, record_id, details):
     """Log user actions for audit trail"""
     try:
@@ -90,6 +83,25 @@ def log_audit(user_id, action, table_name, record_id, details):
         logger.warning(f"Audit logging failed (table may not exist): {e}")
         pass
 
+def data_changed(city_id=None):
+    """Invalidate precomputed data and cached responses after a write"""
+    health_analytics.mark_stale()
+    exposure.invalidate(city_id)
+    city_index.invalidate()
+    geo_index.invalidate()
+    response_cache.bump_data_version()
+    page_cache.clear()
+
+# Daily AQI series the trend views can read from (aqi_daily_filled is built by resampling.py)
+AQI_SOURCES = api_core.AQI_SOURCES
+
+def get_aqi_source():
+    """Return (source, table) selected by the ?source= query parameter, defaulting to raw"""
+    source = request.args.get('source', 'raw')
+    if source not in AQI_SOURCES:
+        source = 'raw'
+    return source, AQI_SOURCES[source]
+
 # ==================== Authentication Decorators ====================
 
 def login_required(f):
@@ -130,6 +142,98 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# ==================== Background Jobs ====================
+
+def _queue_export(table_name, start_arg=None, end_arg=None):
+    """Validate and queue a full export; returns (job_id, error message)"""
+    if table_name not in jobs.EXPORT_TABLES:
+        return None, 'Invalid table name'
+    try:
+        for value in (start_arg, end_arg):
+            if value:
+                datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return None, 'Dates must be in YYYY-MM-DD format'
+    job_id = jobs.enqueue('export_csv', {'table': table_name, 'start': start_arg, 'end': end_arg},
+                          session.get('user_id'))
+    if job_id is None:
+        return None, 'Could not queue the export'
+    log_audit(session.get('user_id'), 'EXPORT', table_name, None, f'Queued CSV export job {job_id}')
+    return job_id, None
+
+def _job_response(job_id, status=200):
+    return jsonify({
+        'job_id': job_id,
+        'status_url': url_for('job_status_api', job_id=job_id),
+        'download_url': url_for('job_download_api', job_id=job_id)
+    }), status
+
+def _visible_job(job_id, include_result=False):
+    """The job if it exists and belongs to the session user (admins see all)"""
+    job = jobs.get_job(job_id, include_result)
+    if job is None or (session.get('role') != 'admin' and job['user_id'] != session.get('user_id')):
+        return None
+    return job
+
+@app.route('/api/v1/jobs/export/<table_name>', methods=['POST'])
+@login_required
+def queue_export_api(table_name):
+    """Queue a full CSV export of a table (?start=&end= YYYY-MM-DD for the time-series tables)"""
+    job_id, error = _queue_export(table_name, request.values.get('start'), request.values.get('end'))
+    if error:
+        return jsonify({'error': error}), 400
+    return _job_response(job_id, 202)
+
+@app.route('/api/v1/jobs/ingest', methods=['POST'])
+@admin_required
+def queue_ingest_api():
+    """Queue the bulk load of an uploaded AQI file (form field 'file', CSV or XLSX)"""
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'error': 'No file uploaded'}), 400
+    extension = upload.filename.rsplit('.', 1)[-1].lower() if '.' in upload.filename else ''
+    if extension not in Config.ALLOWED_EXTENSIONS or extension not in ('csv', 'xlsx'):
+        return jsonify({'error': 'Only .csv and .xlsx files can be ingested'}), 400
+
+    os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+    path = os.path.abspath(os.path.join(Config.UPLOAD_FOLDER, f'{uuid.uuid4().hex}.{extension}'))
+    upload.save(path)
+    job_id = jobs.enqueue('ingest_aqi', {'path': path, 'filename': upload.filename}, session.get('user_id'))
+    if job_id is None:
+        os.remove(path)
+        return jsonify({'error': 'Could not queue the ingestion'}), 503
+    log_audit(session.get('user_id'), 'INSERT', 'aqi', None, f'Queued ingestion of {upload.filename} as job {job_id}')
+    return _job_response(job_id, 202)
+
+@app.route('/api/v1/jobs')
+@login_required
+def jobs_api():
+    """The session user's recent jobs (all users' for admins)"""
+    user_id = None if session.get('role') == 'admin' else session.get('user_id')
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    return jsonify({'jobs': [jobs.describe(job) for job in jobs.list_jobs(user_id, limit)]})
+
+@app.route('/api/v1/jobs/<job_id>')
+@login_required
+def job_status_api(job_id):
+    """Status and progress of one job"""
+    job = _visible_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(jobs.describe(job))
+
+@app.route('/api/v1/jobs/<job_id>/download')
+@login_required
+def job_download_api(job_id):
+    """The result file of a finished job"""
+    job = _visible_job(job_id, include_result=True)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] != 'succeeded' or not job['result_path'] or not os.path.exists(job['result_path']):
+        return jsonify({'error': f"No result to download (job is {job['status']})"}), 409
+    return send_file(job['result_path'], mimetype=job['result_mimetype'], as_attachment=True,
+                     download_name=job['result_name'])
+
 # ==================== Error Handlers ====================
 
 @app.errorhandler(404)
@@ -159,6 +263,27 @@ def health_check():
     status_code = 200 if health_status['status'] == 'healthy' else 503
     return jsonify(health_status), status_code
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus-style metrics: route latency, DB usage, slow queries, upstream calls"""
+    if Config.METRICS_TOKEN:
+        token = request.args.get('token') or request.headers.get('Authorization', '').replace('Bearer ', '', 1)
+        if token != Config.METRICS_TOKEN:
+            return jsonify({'error': 'Invalid metrics token'}), 403
+    live = live_updates.hub.stats()
+    extra_gauges = {
+        'dcds_live_subscribers': live['subscribers'],
+        'dcds_live_dropped_events': live['dropped_events'],
+        'dcds_statement_cache_hit_ratio': instrumentation.statement_cache_hit_ratio()
+    }
+    return app.response_class(instrumentation.render_metrics(extra_gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/slow-queries')
+@admin_required
+def slow_queries():
+    """Captured slow SQL statements (normalized), slowest first"""
+    return jsonify(instrumentation.get_slow_queries())
+
 
 # ==================== Authentication Routes ====================
 
@@ -206,8 +331,14 @@ def login():
         
         if user and len(user) > 0:
             user = user[0]
-            # Verify password
-            if check_password_hash(user['password_hash'], password):
+            # Verify password (in the hashing pool; outdated hashes come back upgraded)
+            password_ok, new_hash = credentials.verify_password(user['password_hash'], password)
+            if password_ok:
+                if new_hash:
+                    execute_query("UPDATE users SET password_hash = %s WHERE user_id = %s",
+                                  (new_hash, user['user_id']))
+                    logger.info(f"✅ Upgraded password hash of {user['username']}")
+                
                 # Set session variables
                 session['user_id'] = user['user_id']
                 session['username'] = user['username']
@@ -263,7 +394,7 @@ def signup():
             return redirect(url_for('signup'))
         
         # Hash password and insert user
-        password_hash = generate_password_hash(password)
+        password_hash = credentials.hash_password(password)
         insert_query = """
             INSERT INTO users (username, email, password_hash, full_name, role, city_id)
             VALUES (%s, %s, %s, %s, 'user', %s)
@@ -295,6 +426,16 @@ def logout():
 @login_required
 def dashboard():
     """Main dashboard with statistics and charts"""
+    return page_cache.render_cached_page('dashboard.html', dashboard_context)
+
+def dashboard_context():
+    """
+    Template context for the dashboard
+
+    Audit activity is not part of it: log_audit() does not change the data
+    version, so a cached page would show it stale (and dashboard.html never
+    rendered it).
+    """
     user_role = session.get('role')
     user_city_id = session.get('city_id')
     
@@ -346,27 +487,6 @@ def dashboard():
     """
     stats['vehicle_distribution'] = execute_query(vehicle_query, fetch=True)
     
-    # Recent activities (last 10)
-    if user_role == 'admin':
-        activity_query = """
-            SELECT al.*, u.username, u.full_name
-            FROM audit_log al
-            JOIN users u ON al.user_id = u.user_id
-            ORDER BY al.timestamp DESC
-            LIMIT 10
-        """
-        stats['recent_activities'] = execute_query(activity_query, fetch=True)
-    else:
-        activity_query = """
-            SELECT al.*, u.username, u.full_name
-            FROM audit_log al
-            JOIN users u ON al.user_id = u.user_id
-            WHERE al.user_id = %s
-            ORDER BY al.timestamp DESC
-            LIMIT 10
-        """
-        stats['recent_activities'] = execute_query(activity_query, (session['user_id'],), fetch=True)
-    
     # Health impact stats
     health_query = """
         SELECT c.city_name, h.respiratory_cases, h.lung_cancer_cases, h.asthma_cases
@@ -377,7 +497,7 @@ def dashboard():
     """
     stats['health_impact'] = execute_query(health_query, fetch=True)
     
-    return render_template('dashboard.html', stats=stats, role=user_role)
+    return dict(stats=stats, role=user_role)
 
 # ==================== CRUD Routes for Cities ====================
 
@@ -385,85 +505,101 @@ def dashboard():
 @login_required
 def cities():
     """View all cities with AQI and Health Impact data"""
+    return page_cache.render_cached_page('cities.html', cities_context,
+                                         params=('aqi_sort', 'health_sort', 'health_limit'))
+
+# Whitelisted sort variants of the cities page queries: one fixed statement per
+# sort key, so each stays prepared per pooled connection (see database.StatementCache).
+# AQI averages come from the cube's city rollups, which cover archived months too
+CITY_AQI_QUERIES = {
+    sort: f"""
+        SELECT c.city_name, 
+               ROUND(SUM(k.aqi_sum) / SUM(k.aqi_count), 2) as avg_aqi,
+               CAST(COALESCE(SUM(k.aqi_count), 0) AS SIGNED) as reading_count
+        FROM cities c
+        LEFT JOIN aqi_cube_city k ON c.city_id = k.city_id
+        GROUP BY c.city_id, c.city_name
+        HAVING avg_aqi IS NOT NULL
+        ORDER BY {order}
+        LIMIT 10
+    """
+    for sort, order in {
+        'aqi_desc': 'avg_aqi DESC',
+        'aqi_asc': 'avg_aqi ASC',
+        'city_asc': 'c.city_name ASC',
+        'city_desc': 'c.city_name DESC'
+    }.items()
+}
+
+CITY_HEALTH_QUERIES = {
+    sort: f"""
+        SELECT ha.city_name, 
+               ha.respiratory_cases, 
+               ha.lung_cancer_cases, 
+               ha.asthma_cases,
+               ha.total_cases,
+               ha.cases_per_100k,
+               ha.total_cases_yoy
+        FROM health_analytics ha
+        ORDER BY {order}
+        LIMIT %s
+    """
+    for sort, order in {
+        'cases_desc': 'ha.total_cases DESC',
+        'cases_asc': 'ha.total_cases ASC',
+        'city_asc': 'ha.city_name ASC',
+        'city_desc': 'ha.city_name DESC',
+        'respiratory_desc': 'ha.respiratory_cases DESC',
+        'lung_cancer_desc': 'ha.lung_cancer_cases DESC'
+    }.items()
+}
+
+def cities_context():
+    """Template context for the cities page"""
     # Get sorting and filter parameters
     aqi_sort = request.args.get('aqi_sort', 'aqi_desc')  # Default: highest AQI first
     health_sort = request.args.get('health_sort', 'cases_desc')  # Default: most cases first
     health_limit = int(request.args.get('health_limit', 5))  # Default: Top 5
     
-    # Cities basic data
+    # Cities basic data with their precomputed counters (city_stats.py)
     query = """
         SELECT c.*, 
-               COUNT(DISTINCT s.station_id) as station_count,
-               COUNT(DISTINCT a.aqi_id) as aqi_count
+               COALESCE(cs.station_count, 0) as station_count,
+               COALESCE(cs.reading_count, 0) as aqi_count,
+               cs.last_aqi,
+               cs.last_reading_date
         FROM cities c
-        LEFT JOIN stations s ON c.city_id = s.city_id
-        LEFT JOIN aqi a ON c.city_id = a.city_id
-        GROUP BY c.city_id
+        LEFT JOIN city_stats cs ON cs.city_id = c.city_id
         ORDER BY c.city_name
     """
     cities_data = execute_query(query, fetch=True)
     
     # Average AQI by City with sorting
-    aqi_order = {
-        'aqi_desc': 'avg_aqi DESC',
-        'aqi_asc': 'avg_aqi ASC',
-        'city_asc': 'c.city_name ASC',
-        'city_desc': 'c.city_name DESC'
-    }.get(aqi_sort, 'avg_aqi DESC')
-    
-    aqi_query = f"""
-        SELECT c.city_name, 
-               ROUND(AVG(a.aqi_value), 2) as avg_aqi,
-               COUNT(a.aqi_id) as reading_count
-        FROM cities c
-        LEFT JOIN aqi a ON c.city_id = a.city_id
-        GROUP BY c.city_id, c.city_name
-        HAVING avg_aqi IS NOT NULL
-        ORDER BY {aqi_order}
-        LIMIT 10
-    """
+    aqi_query = CITY_AQI_QUERIES.get(aqi_sort, CITY_AQI_QUERIES['aqi_desc'])
     aqi_data = execute_query(aqi_query, fetch=True)
     
     # Health Impact with sorting and configurable limit
-    health_order = {
-        'cases_desc': 'total_cases DESC',
-        'cases_asc': 'total_cases ASC',
-        'city_asc': 'c.city_name ASC',
-        'city_desc': 'c.city_name DESC',
-        'respiratory_desc': 'h.respiratory_cases DESC',
-        'lung_cancer_desc': 'h.lung_cancer_cases DESC'
-    }.get(health_sort, 'total_cases DESC')
-    
-    health_query = f"""
-        SELECT c.city_name, 
-               h.respiratory_cases, 
-               h.lung_cancer_cases, 
-               h.asthma_cases,
-               (h.respiratory_cases + h.lung_cancer_cases + h.asthma_cases) as total_cases
-        FROM health_impact h
-        JOIN cities c ON h.city_id = c.city_id
-        ORDER BY {health_order}
-        LIMIT {health_limit}
-    """
-    health_data = execute_query(health_query, fetch=True)
+    # (precomputed in health_analytics; every sort key below is indexed)
+    health_analytics.ensure_fresh()
+    health_query = CITY_HEALTH_QUERIES.get(health_sort, CITY_HEALTH_QUERIES['cases_desc'])
+    health_data = execute_query(health_query, (health_limit,), fetch=True)
     
 
     # DEBUG: Log the AQI data being sent to template
-    logger.info(f"AQI Data being sent to template: {len(aqi_data)} cities")
-    if aqi_data:
-        for city in aqi_data:
-            logger.info(f"  {city['city_name']}: {city['avg_aqi']}")
-    else:
+    if not aqi_data:
         logger.warning("No AQI data found!")
+    elif logger.isEnabledFor(logging.DEBUG):
+        logger.debug("AQI Data being sent to template: %d cities", len(aqi_data))
+        for city in aqi_data:
+            logger.debug("  %s: %s", city['city_name'], city['avg_aqi'])
 
-    return render_template('cities.html', 
-                         cities=cities_data, 
-                         aqi_data=aqi_data,
-                         health_data=health_data,
-                         aqi_sort=aqi_sort,
-                         health_sort=health_sort,
-                         health_limit=health_limit,
-                         role=session.get('role'))
+    return dict(cities=cities_data, 
+                aqi_data=aqi_data,
+                health_data=health_data,
+                aqi_sort=aqi_sort,
+                health_sort=health_sort,
+                health_limit=health_limit,
+                role=session.get('role'))
 
 @app.route('/cities/add', methods=['POST'])
 @admin_required
@@ -516,6 +652,8 @@ def add_city():
         result = execute_query(query, (city_id, city_name.strip(), pin_code, state_name.strip()))
 
         if result:
+            city_stats.refresh(city_id)
+            data_changed()
             log_audit(session['user_id'], 'INSERT', 'cities', city_id, f'Added city: {city_name}')
             flash(f'✅ City "{city_name}" added successfully!', 'success')
         else:
@@ -537,6 +675,7 @@ def update_city(city_id):
     
     query = "UPDATE cities SET city_name = %s, pin_code = %s, state_name = %s WHERE city_id = %s"
     execute_query(query, (city_name, pin_code, state_name, city_id))
+    data_changed(city_id)
     
     log_audit(session['user_id'], 'UPDATE', 'cities', city_id, f'Updated city: {city_name}')
     flash(f'City {city_name} updated successfully!', 'success')
@@ -548,6 +687,7 @@ def delete_city(city_id):
     """Delete city"""
     query = "DELETE FROM cities WHERE city_id = %s"
     execute_query(query, (city_id,))
+    data_changed(city_id)
     
     log_audit(session['user_id'], 'DELETE', 'cities', city_id, f'Deleted city ID: {city_id}')
     flash('City deleted successfully!', 'success')
@@ -655,11 +795,13 @@ def update_city_aqi(city_id):
                 SET aqi_value = %s
                 WHERE city_id = %s AND date = %s
             """
-            execute_query(aqi_update_query, (aqi_value, city_id, date))
+            aqi_saved = execute_query(aqi_update_query, (aqi_value, city_id, date)) is not None
+            if aqi_saved:
+                city_stats.reading_updated(city_id, date, aqi_value)
 
-            log_audit(session['user_id'], 'UPDATE', 'pollutants', city_id,
-                     f'Updated AQI for {city_name} on {date}')
-            flash(f'✅ AQI values for "{city_name}" on {date} updated successfully! (AQI: {aqi_value})', 'success')
+                log_audit(session['user_id'], 'UPDATE', 'pollutants', city_id,
+                         f'Updated AQI for {city_name} on {date}')
+                flash(f'✅ AQI values for "{city_name}" on {date} updated successfully! (AQI: {aqi_value})', 'success')
         else:
             # Insert new record into pollutants
             insert_pollutants = """
@@ -673,12 +815,26 @@ def update_city_aqi(city_id):
                 INSERT INTO aqi (city_id, date, aqi_value)
                 VALUES (%s, %s, %s)
             """
-            execute_query(insert_aqi, (city_id, date, aqi_value))
+            aqi_saved = execute_query(insert_aqi, (city_id, date, aqi_value)) is not None
+            if aqi_saved:
+                city_stats.record_reading(city_id, date, aqi_value)
 
-            log_audit(session['user_id'], 'INSERT', 'pollutants', city_id,
-                     f'Added AQI for {city_name} on {date}')
-            flash(f'✅ AQI values for "{city_name}" on {date} added successfully! (AQI: {aqi_value})', 'success')
+                log_audit(session['user_id'], 'INSERT', 'pollutants', city_id,
+                         f'Added AQI for {city_name} on {date}')
+                flash(f'✅ AQI values for "{city_name}" on {date} added successfully! (AQI: {aqi_value})', 'success')
 
+        if not aqi_saved:
+            # Nothing changed, so no cache, cube month or live client has to hear about it
+            flash(f'❌ AQI value for "{city_name}" on {date} could not be saved. Please try again.', 'danger')
+            return redirect(url_for('cities'))
+
+        pollutant_values = {'pm25': pm25, 'pm10': pm10, 'no2': no2, 'so2': so2, 'co': co, 'o3': o3}
+        pollutant_values = {name: float(value) if value else None for name, value in pollutant_values.items()}
+        latest_reading.record([dict(pollutant_values, city_id=city_id, station_id=None, date=date, aqi_value=aqi_val)])
+        cube.mark_dirty([date])
+
+        data_changed(city_id)
+        live_updates.publish_reading(city_id, date, aqi_val, pollutant_values)
         return redirect(url_for('cities'))
 
     except Exception as e:
@@ -692,6 +848,10 @@ def update_city_aqi(city_id):
 @login_required
 def stations():
     """View all monitoring stations"""
+    return page_cache.render_cached_page('stations.html', stations_context)
+
+def stations_context():
+    """Template context for the stations page"""
     role = session.get('role')
     city_id = session.get('city_id')
     
@@ -714,7 +874,7 @@ def stations():
         stations_data = execute_query(query, (city_id,), fetch=True)
     
     cities_data = execute_query("SELECT * FROM cities ORDER BY city_name", fetch=True)
-    return render_template('stations.html', stations=stations_data, cities=cities_data, role=role)
+    return dict(stations=stations_data, cities=cities_data, role=role)
 
 @app.route('/stations/add', methods=['POST'])
 @admin_required
@@ -725,14 +885,19 @@ def add_station():
     station_name = request.form.get('station_name')
     station_type = request.form.get('station_type')
     managed_by = request.form.get('managed_by')
+    latitude = request.form.get('latitude') or None  # Optional; geo_index.py falls back to the city's
+    longitude = request.form.get('longitude') or None
     
     query = """
-        INSERT INTO stations (station_id, city_id, station_name, station_type, managed_by)
-        VALUES (%s, %s, %s, %s, %s)
+        INSERT INTO stations (station_id, city_id, station_name, station_type, managed_by, latitude, longitude)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
     """
-    result = execute_query(query, (station_id, city_id, station_name, station_type, managed_by))
+    result = execute_query(query, (station_id, city_id, station_name, station_type, managed_by,
+                                   latitude, longitude))
     
     if result:
+        city_stats.refresh_station_counts()
+        data_changed()
         log_audit(session['user_id'], 'INSERT', 'stations', station_id, f'Added station: {station_name}')
         flash(f'Station {station_name} added successfully!', 'success')
     else:
@@ -748,13 +913,18 @@ def update_station(station_id):
     station_name = request.form.get('station_name')
     station_type = request.form.get('station_type')
     managed_by = request.form.get('managed_by')
+    latitude = request.form.get('latitude') or None
+    longitude = request.form.get('longitude') or None
     
     query = """
         UPDATE stations 
-        SET city_id = %s, station_name = %s, station_type = %s, managed_by = %s
+        SET city_id = %s, station_name = %s, station_type = %s, managed_by = %s,
+            latitude = %s, longitude = %s
         WHERE station_id = %s
     """
-    execute_query(query, (city_id, station_name, station_type, managed_by, station_id))
+    execute_query(query, (city_id, station_name, station_type, managed_by, latitude, longitude, station_id))
+    city_stats.refresh_station_counts()
+    data_changed()
     
     log_audit(session['user_id'], 'UPDATE', 'stations', station_id, f'Updated station: {station_name}')
     flash(f'Station {station_name} updated successfully!', 'success')
@@ -766,6 +936,8 @@ def delete_station(station_id):
     """Delete station"""
     query = "DELETE FROM stations WHERE station_id = %s"
     execute_query(query, (station_id,))
+    city_stats.refresh_station_counts()
+    data_changed()
     
     log_audit(session['user_id'], 'DELETE', 'stations', station_id, f'Deleted station ID: {station_id}')
     flash('Station deleted successfully!', 'success')
@@ -791,7 +963,7 @@ def aqi_records():
             FROM aqi a
             JOIN cities c ON a.city_id = c.city_id
             JOIN stations s ON a.station_id = s.station_id
-            ORDER BY a.measurement_date DESC
+            ORDER BY a.date DESC, a.aqi_id DESC
             LIMIT %s OFFSET %s
         """
         aqi_data = execute_query(query, (per_page, offset), fetch=True)
@@ -804,7 +976,7 @@ def aqi_records():
             JOIN cities c ON a.city_id = c.city_id
             JOIN stations s ON a.station_id = s.station_id
             WHERE a.city_id = %s
-            ORDER BY a.measurement_date DESC
+            ORDER BY a.date DESC, a.aqi_id DESC
             LIMIT %s OFFSET %s
         """
         aqi_data = execute_query(query, (city_id, per_page, offset), fetch=True)
@@ -845,6 +1017,7 @@ def toggle_user_status(user_id):
     """Activate/Deactivate user"""
     query = "UPDATE users SET is_active = NOT is_active WHERE user_id = %s"
     execute_query(query, (user_id,))
+    data_changed()
     
     log_audit(session['user_id'], 'UPDATE', 'users', user_id, f'Toggled user status')
     flash('User status updated!', 'success')
@@ -860,6 +1033,7 @@ def delete_user(user_id):
     
     query = "DELETE FROM users WHERE user_id = %s"
     execute_query(query, (user_id,))
+    data_changed()
     
     log_audit(session['user_id'], 'DELETE', 'users', user_id, f'Deleted user')
     flash('User deleted successfully!', 'success')
@@ -871,31 +1045,46 @@ def delete_user(user_id):
 @login_required
 def reports():
     """Reports and analytics page"""
+    return page_cache.render_cached_page('reports.html', reports_context, params=('source',))
+
+def reports_context():
+    """Template context for the reports page"""
     role = session.get('role')
     city_id = session.get('city_id')
+    source, aqi_table = get_aqi_source()
     
     # AQI trends
     if role == 'admin':
-        aqi_trend_query = """
-            SELECT DATE_FORMAT(measurement_date, '%Y-%m') as month, 
+        aqi_trend_query = f"""
+            SELECT DATE_FORMAT(date, '%Y-%m') as month, 
                    AVG(aqi_value) as avg_aqi
-            FROM aqi
-            WHERE measurement_date >= DATE_SUB(NOW(), INTERVAL 12 MONTH)
+            FROM {aqi_table}
+            WHERE date >= DATE_SUB(CURDATE(), INTERVAL 12 MONTH)
             GROUP BY month
             ORDER BY month
         """
         aqi_trends = execute_query(aqi_trend_query, fetch=True)
     else:
-        aqi_trend_query = """
-            SELECT DATE_FORMAT(measurement_date, '%Y-%m') as month, 
+        aqi_trend_query = f"""
+            SELECT DATE_FORMAT(date, '%Y-%m') as month, 
                    AVG(aqi_value) as avg_aqi
-            FROM aqi
-            WHERE city_id = %s AND measurement_date >= DATE_SUB(NOW(), INTERVAL 12 MONTH)
+            FROM {aqi_table}
+            WHERE city_id = %s AND date >= DATE_SUB(CURDATE(), INTERVAL 12 MONTH)
             GROUP BY month
             ORDER BY month
         """
         aqi_trends = execute_query(aqi_trend_query, (city_id,), fetch=True)
     
+    # AQI exposure distribution per city (full history)
+    if role == 'admin':
+        exposure_data = exposure.get_all_exposure()
+    else:
+        exposure_data = [exposure.get_city_exposure(city_id)] if city_id else []
+    city_names = {c['city_id']: c['city_name'] for c in execute_query(
+        "SELECT city_id, city_name FROM cities", fetch=True) or []}
+    exposure_data = [dict(item, city_name=city_names.get(item['city_id'], f"City {item['city_id']}"))
+                     for item in exposure_data]
+    
     # Emission by city
     emission_query = """
         SELECT c.city_name, e.total_co2_emission, e.total_pm25_emission
@@ -906,10 +1095,79 @@ def reports():
     """
     emissions = execute_query(emission_query, fetch=True)
     
-    return render_template('reports.html', 
-                         aqi_trends=aqi_trends, 
-                         emissions=emissions,
-                         role=role)
+    # Cities offered by the downloadable reports form
+    report_cities = [{'city_id': cid, 'city_name': name} for cid, name in sorted(city_names.items(), key=lambda c: c[1] or '')
+                     if role == 'admin' or cid == city_id]
+    
+    return dict(aqi_trends=aqi_trends, 
+                emissions=emissions,
+                report_cities=report_cities,
+                report_formats=report_builder.available_formats(),
+                exposure=exposure_data,
+                aqi_categories=exposure.AQI_CATEGORIES,
+                source=source,
+                role=role)
+
+@app.route('/reports/city/<int:city_id>/<period>.<fmt>')
+@login_required
+def city_report(city_id, period, fmt):
+    """
+    Monthly (period YYYY-MM) or annual (YYYY) city report as PDF or XLSX
+
+    Served from disk when the report for the current data version exists;
+    otherwise its build is queued (once, however many users ask for it) and
+    202 is returned - poll the same URL with ?job=<job_id> until it is ready.
+    A finished job's report is served even if the data version moved on
+    while it was being built, so polling always ends.
+    """
+    if session.get('role') != 'admin' and city_id != session.get('city_id'):
+        return jsonify({'error': 'Report not available'}), 403
+    if fmt not in report_builder.available_formats():
+        return jsonify({'error': f'{fmt} reports are not available'}), 404
+    try:
+        report_builder.parse_period(period)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    path = report_builder.cached_report(city_id, period, fmt)
+    if path:
+        index = city_index.get_index()
+        city_name = index.cities.get(city_id, {}).get('city_name') if index else None
+        return send_file(path, mimetype=report_builder.MIMETYPES[fmt], as_attachment=True,
+                         download_name=report_builder.download_name(city_name or f'city_{city_id}', period, fmt))
+
+    previous = jobs.get_job(request.args['job'], include_result=True) if request.args.get('job') else None
+    if previous and previous['job_type'] == 'city_report':
+        if previous['status'] == 'failed':
+            return jsonify({'error': previous['error'] or 'Report build failed', 'job_id': previous['job_id']}), 500
+        built = previous['result_path']
+        if (previous['status'] == 'succeeded' and report_builder.is_report_of(built, city_id, period, fmt)
+                and os.path.exists(built)):
+            return send_file(built, mimetype=report_builder.MIMETYPES[fmt], as_attachment=True,
+                             download_name=previous['result_name'])
+
+    job_id = jobs.enqueue_once('city_report', {'city_id': city_id, 'period': period, 'format': fmt},
+                               session.get('user_id'))
+    if job_id is None:
+        return jsonify({'error': 'Could not queue the report'}), 503
+    return jsonify({'job_id': job_id, 'status': 'building',
+                    'poll_url': url_for('city_report', city_id=city_id, period=period, fmt=fmt, job=job_id)}), 202
+
+@app.route('/analytics/health/refresh', methods=['POST'])
+@admin_required
+def refresh_health_analytics():
+    """Rebuild the precomputed health analytics table"""
+    rows = health_analytics.refresh_health_analytics()
+    
+    if rows is not None:
+        response_cache.bump_data_version()
+        page_cache.clear()
+        log_audit(session['user_id'], 'UPDATE', 'health_analytics', None, f'Refreshed health analytics ({rows} rows)')
+        flash(f'Health analytics refreshed ({rows} rows).', 'success')
+    else:
+        flash('Failed to refresh health analytics.', 'danger')
+    
+    return redirect(url_for('cities'))
 
 @app.route('/export/csv/<table_name>')
 @login_required
@@ -921,7 +1179,18 @@ def export_csv(table_name):
         flash('Invalid table name', 'danger')
         return redirect(url_for('dashboard'))
     
-    # Get data
+    # A date range (?start=YYYY-MM-DD&end=YYYY-MM-DD, end exclusive) or ?all=1 exports every
+    # matching row - that runs as a background job; otherwise the first 1000 live rows
+    start_arg = request.args.get('start')
+    end_arg = request.args.get('end')
+    if start_arg or end_arg or request.args.get('all'):
+        job_id, error = _queue_export(table_name, start_arg, end_arg)
+        if error:
+            flash(error, 'danger')
+        else:
+            flash(f'Export of {table_name} queued - download it from the Background Jobs panel when it is done', 'info')
+        return redirect(url_for('reports'))
+    
     query = f"SELECT * FROM {table_name} LIMIT 1000"
     data = execute_query(query, fetch=True)
     
@@ -954,6 +1223,7 @@ def export_csv(table_name):
 
 @app.route('/api/dashboard_stats')
 @login_required
+@cached_json
 def api_dashboard_stats():
     """API endpoint for dashboard statistics"""
     role = session.get('role')
@@ -962,66 +1232,47 @@ def api_dashboard_stats():
     stats = {}
     
     # AQI by city
-    if role == 'admin':
-        aqi_query = """
-            SELECT c.city_name, AVG(a.aqi_value) as avg_aqi
-            FROM aqi a
-            JOIN cities c ON a.city_id = c.city_id
-            GROUP BY c.city_name
-            ORDER BY avg_aqi DESC
-            LIMIT 10
-        """
-        stats['aqi_by_city'] = execute_query(aqi_query, fetch=True)
-    else:
-        aqi_query = """
-            SELECT c.city_name, AVG(a.aqi_value) as avg_aqi
-            FROM aqi a
-            JOIN cities c ON a.city_id = c.city_id
-            WHERE a.city_id = %s
-            GROUP BY c.city_name
-        """
-        stats['aqi_by_city'] = execute_query(aqi_query, (city_id,), fetch=True)
+    aqi_query, params = api_core.dashboard_aqi_query(role, city_id)
+    stats['aqi_by_city'] = execute_query(aqi_query, params, fetch=True)
     
     # Vehicle distribution
-    vehicle_query = """
-        SELECT vehicle_id, SUM(vehicle_count) as total_count
-        FROM vehicle_info
-        GROUP BY vehicle_id
-    """
-    stats['vehicles'] = execute_query(vehicle_query, fetch=True)
+    stats['vehicles'] = execute_query(api_core.VEHICLE_TOTALS_QUERY, fetch=True)
     
     return jsonify(stats)
 
 @app.route('/api/aqi_trends')
 @login_required
+@cached_json
 def api_aqi_trends():
     """API endpoint for AQI trends"""
     role = session.get('role')
     city_id = session.get('city_id')
+    source, aqi_table = get_aqi_source()
     
-    if role == 'admin':
-        query = """
-            SELECT DATE_FORMAT(measurement_date, '%Y-%m') as month, 
-                   AVG(aqi_value) as avg_aqi
-            FROM aqi
-            WHERE measurement_date >= DATE_SUB(NOW(), INTERVAL 12 MONTH)
-            GROUP BY month
-            ORDER BY month
-        """
-        trends = execute_query(query, fetch=True)
-    else:
-        query = """
-            SELECT DATE_FORMAT(measurement_date, '%Y-%m') as month, 
-                   AVG(aqi_value) as avg_aqi
-            FROM aqi
-            WHERE city_id = %s AND measurement_date >= DATE_SUB(NOW(), INTERVAL 12 MONTH)
-            GROUP BY month
-            ORDER BY month
-        """
-        trends = execute_query(query, (city_id,), fetch=True)
+    query, params = api_core.aqi_trends_query(aqi_table, role, city_id)
+    trends = execute_query(query, params, fetch=True)
     
     return jsonify(trends)
 
+@app.route('/api/exposure')
+@login_required
+@cached_json
+def api_exposure():
+    """API endpoint for AQI exposure metrics (category days, percentiles, unhealthy streaks)"""
+    role = session.get('role')
+    city_id = request.args.get('city_id', type=int)
+    year = request.args.get('year', type=int)
+    
+    # Regular users only see their own city
+    if role != 'admin':
+        city_id = session.get('city_id')
+        if not city_id:
+            return jsonify([])
+    
+    if city_id:
+        return jsonify(exposure.get_city_exposure(city_id, year))
+    return jsonify(exposure.get_all_exposure(year))
+
 # ==================== Profile Management ====================
 
 @app.route('/profile')
@@ -1071,7 +1322,8 @@ def change_password():
     query = "SELECT password_hash FROM users WHERE user_id = %s"
     user = execute_query(query, (session['user_id'],), fetch=True)[0]
     
-    if not check_password_hash(user['password_hash'], current_password):
+    password_ok, _ = credentials.verify_password(user['password_hash'], current_password)
+    if not password_ok:
         flash('Current password is incorrect!', 'danger')
         return redirect(url_for('profile'))
     
@@ -1084,7 +1336,7 @@ def change_password():
         return redirect(url_for('profile'))
     
     # Update password
-    new_hash = generate_password_hash(new_password)
+    new_hash = credentials.hash_password(new_password)
     update_query = "UPDATE users SET password_hash = %s WHERE user_id = %s"
     execute_query(update_query, (new_hash, session['user_id']))
     
@@ -1098,192 +1350,159 @@ def change_password():
 @login_required
 def analytics():
     """Analytics page with environmental data"""
-    
-    # Get selected city from query parameter
-    selected_city = request.args.get('city_id', 'all')
-    
-    # Get all cities for dropdown
-    cities_query = "SELECT city_id, city_name FROM cities ORDER BY city_name"
-    cities_list = execute_query(cities_query, fetch=True)
-    
-    # Build WHERE clause for filtering
-    city_filter = ""
-    city_params = ()
-    if selected_city != 'all':
-        city_filter = "WHERE c.city_id = %s"
-        city_params = (selected_city,)
-    
+    return page_cache.render_cached_page('analytics.html', analytics_context, params=('city_id',))
+
+def _city_filtered(query):
+    """All-cities and single-city (one %s parameter) variants of a query with a {city_filter} slot"""
+    return {
+        'all': query.format(city_filter=''),
+        'city': query.format(city_filter='WHERE c.city_id = %s')
+    }
+
+# Whitelisted analytics page queries (fixed statements, see CITY_AQI_QUERIES)
+ANALYTICS_QUERIES = {
     # Vehicle Distribution with city names
-    vehicle_query = f"""
+    'vehicle': _city_filtered("""
         SELECT vi.*, c.city_name
         FROM vehicle_info vi
         JOIN cities c ON vi.city_id = c.city_id
         {city_filter}
         ORDER BY c.city_name, vi.vehicle_id
-    """
-    vehicle_data = execute_query(vehicle_query, city_params, fetch=True)
-    
+    """),
     # Emissions by City
-    emissions_query = f"""
+    'emissions': _city_filtered("""
         SELECT e.*, c.city_name
         FROM emissions_by_city e
         JOIN cities c ON e.city_id = c.city_id
         {city_filter}
         ORDER BY e.total_pollution DESC
-    """
-    emissions_data = execute_query(emissions_query, city_params, fetch=True)
-    
+    """),
     # Population Data
-    population_query = f"""
+    'population': _city_filtered("""
         SELECT p.*, c.city_name
         FROM population p
         JOIN cities c ON p.city_id = c.city_id
         {city_filter}
         ORDER BY p.total_population DESC
-    """
-    population_data = execute_query(population_query, city_params, fetch=True)
-    
+    """),
     # Public Transport
-    transport_query = f"""
+    'transport': _city_filtered("""
         SELECT pt.*, c.city_name
         FROM public_transport pt
         JOIN cities c ON pt.city_id = c.city_id
         {city_filter}
         ORDER BY c.city_name
-    """
-    transport_data = execute_query(transport_query, city_params, fetch=True)
-    
+    """),
     # Sources of Energy
-    energy_query = f"""
+    'energy': _city_filtered("""
         SELECT se.*, c.city_name
         FROM sources_of_energy se
         JOIN cities c ON se.city_id = c.city_id
         {city_filter}
         ORDER BY c.city_name
-    """
-    energy_data = execute_query(energy_query, city_params, fetch=True)
-    
+    """),
     # Waste Management
-    waste_query = f"""
+    'waste': _city_filtered("""
         SELECT wm.*, c.city_name
         FROM waste_management wm
         JOIN cities c ON wm.city_id = c.city_id
         {city_filter}
         ORDER BY wm.solid_waste DESC
-    """
-    waste_data = execute_query(waste_query, city_params, fetch=True)
-    
-    return render_template('analytics.html',
-                         vehicle_data=vehicle_data,
-                         emissions_data=emissions_data,
-                         population_data=population_data,
-                         transport_data=transport_data,
-                         energy_data=energy_data,
-                         waste_data=waste_data,
-                         cities_list=cities_list,
-                         selected_city=selected_city)
+    """),
+}
+
+def analytics_context():
+    """Template context for the analytics page"""
+    
+    # Get selected city from query parameter
+    selected_city = request.args.get('city_id', 'all')
+    
+    # Get all cities for dropdown
+    cities_query = "SELECT city_id, city_name FROM cities ORDER BY city_name"
+    cities_list = execute_query(cities_query, fetch=True)
+    
+    # Pick the all-cities or single-city variant of each whitelisted query
+    variant = 'all' if selected_city == 'all' else 'city'
+    city_params = () if selected_city == 'all' else (selected_city,)
+    
+    vehicle_data = execute_query(ANALYTICS_QUERIES['vehicle'][variant], city_params, fetch=True)
+    emissions_data = execute_query(ANALYTICS_QUERIES['emissions'][variant], city_params, fetch=True)
+    population_data = execute_query(ANALYTICS_QUERIES['population'][variant], city_params, fetch=True)
+    transport_data = execute_query(ANALYTICS_QUERIES['transport'][variant], city_params, fetch=True)
+    energy_data = execute_query(ANALYTICS_QUERIES['energy'][variant], city_params, fetch=True)
+    waste_data = execute_query(ANALYTICS_QUERIES['waste'][variant], city_params, fetch=True)
+    
+    return dict(vehicle_data=vehicle_data,
+                emissions_data=emissions_data,
+                population_data=population_data,
+                transport_data=transport_data,
+                energy_data=energy_data,
+                waste_data=waste_data,
+                cities_list=cities_list,
+                selected_city=selected_city)
 
 # ==================== API Routes ====================
 
-def get_aqi_health_impact(aqi_value):
-    """Get AQI category, health impact message, and color based on AQI value"""
-    if aqi_value <= 50:
-        return {
-            'category': 'Good',
-            'message': 'Air quality is satisfactory, and air pollution poses little or no risk.',
-            'color': 'success',
-            'text_color': 'text-success'
-        }
-    elif aqi_value <= 100:
-        return {
-            'category': 'Moderate',
-            'message': 'Air quality is acceptable. However, there may be a risk for some people.',
-            'color': 'info',
-            'text_color': 'text-info'
-        }
-    elif aqi_value <= 150:
-        return {
-            'category': 'Unhealthy for Sensitive Groups',
-            'message': 'Members of sensitive groups may experience health effects.',
-            'color': 'warning',
-            'text_color': 'text-warning'
-        }
-    elif aqi_value <= 200:
-        return {
-            'category': 'Unhealthy',
-            'message': 'Everyone may begin to experience health effects; sensitive groups at greater risk.',
-            'color': 'orange',
-            'text_color': 'text-warning'
-        }
-    elif aqi_value <= 300:
-        return {
-            'category': 'Very Unhealthy',
-            'message': 'Health alert: everyone may experience more serious health effects.',
-            'color': 'danger',
-            'text_color': 'text-danger'
-        }
-    else:
-        return {
-            'category': 'Hazardous',
-            'message': 'Health warning: everyone may experience serious health effects.',
-            'color': 'danger',
-            'text_color': 'text-danger'
-        }
+# Concurrent lookups of the same city share one upstream fetch / one set of history queries
+_openweather_flights = singleflight.Group('openweather')
+_city_history_flights = singleflight.Group('city_history')
+
+def fetch_openweather_data(city_name, city_id=None):
+    """Fetch live weather and AQI data from OpenWeatherMap API (coalesced per city)"""
+    key = city_id if city_id is not None else ' '.join(city_name.lower().split())
+    return _openweather_flights.do(key, _fetch_openweather_data, city_name, city_id)
 
-def fetch_openweather_data(city_name):
-    """Fetch live weather and AQI data from OpenWeatherMap API"""
+def _fetch_openweather_data(city_name, city_id=None):
     try:
-        # Get coordinates first
-        geo_url = f"http://api.openweathermap.org/geo/1.0/direct?q={city_name},IN&limit=1&appid={Config.OPENWEATHER_API_KEY}"
-        geo_response = requests.get(geo_url, timeout=5)
-        
-        if geo_response.status_code != 200:
-            return None
-        
-        geo_data = geo_response.json()
-        if not geo_data:
-            return None
-        
-        lat = geo_data[0]['lat']
-        lon = geo_data[0]['lon']
+        # Stored coordinates skip geocoding; a geocoded city's are stored for next time
+        coordinates = geo_index.city_coordinates(city_id) if city_id is not None else None
+        if coordinates:
+            lat, lon = coordinates
+        else:
+            with instrumentation.track_upstream('openweather_geo'):
+                geo_response = requests.get(api_core.geo_url(city_name), timeout=5)
+            
+            if geo_response.status_code != 200:
+                return None
+            
+            geo_data = geo_response.json()
+            if not geo_data:
+                return None
+            
+            lat = geo_data[0]['lat']
+            lon = geo_data[0]['lon']
+            if city_id is not None:
+                geo_index.save_city_coordinates(city_id, lat, lon)
         
         # Fetch weather data
-        weather_url = f"{Config.OPENWEATHER_BASE_URL}/weather?lat={lat}&lon={lon}&appid={Config.OPENWEATHER_API_KEY}&units=metric"
-        weather_response = requests.get(weather_url, timeout=5)
+        with instrumentation.track_upstream('openweather_weather'):
+            weather_response = requests.get(api_core.weather_url(lat, lon), timeout=5)
         
         # Fetch air pollution data
-        pollution_url = f"{Config.OPENWEATHER_BASE_URL}/air_pollution?lat={lat}&lon={lon}&appid={Config.OPENWEATHER_API_KEY}"
-        pollution_response = requests.get(pollution_url, timeout=5)
+        with instrumentation.track_upstream('openweather_air_pollution'):
+            pollution_response = requests.get(api_core.pollution_url(lat, lon), timeout=5)
         
         if weather_response.status_code != 200 or pollution_response.status_code != 200:
             return None
         
-        weather_data = weather_response.json()
-        pollution_data = pollution_response.json()
-        
-        # Extract relevant data
-        result = {
-            'temperature': round(weather_data['main']['temp'], 1),
-            'humidity': weather_data['main']['humidity'],
-            'wind_speed': round(weather_data['wind']['speed'] * 3.6, 1),  # Convert m/s to km/h
-            'precipitation': round(weather_data.get('rain', {}).get('1h', 0), 1),
-            'live_aqi': pollution_data['list'][0]['main']['aqi'] * 50,  # Convert to US AQI scale
-            'pm25': round(pollution_data['list'][0]['components']['pm2_5'], 2),
-            'pm10': round(pollution_data['list'][0]['components']['pm10'], 2),
-            'no2': round(pollution_data['list'][0]['components']['no2'], 2),
-            'so2': round(pollution_data['list'][0]['components']['so2'], 2),
-            'co': round(pollution_data['list'][0]['components']['co'] / 1000, 2),  # Convert to mg/m³
-            'o3': round(pollution_data['list'][0]['components']['o3'], 2)
-        }
-        
-        return result
+        return api_core.shape_live_data(weather_response.json(), pollution_response.json())
     
     except Exception as e:
-        print(f"OpenWeatherMap API Error: {e}")
+        logger.warning(f"OpenWeatherMap API Error: {e}")
         return None
 
+@app.route('/api/v1/autocomplete')
+@login_required
+def autocomplete_api():
+    """City suggestions for a partial or misspelled city, state or station name"""
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', Config.AUTOCOMPLETE_MAX_RESULTS, type=int)
+    limit = max(1, min(limit, Config.AUTOCOMPLETE_MAX_RESULTS))
+    return jsonify({'query': query, 'results': city_index.search(query, limit)})
+
 @app.route('/api/city-search')
 @login_required
+@cached_json(ttl=Config.LIVE_DATA_TTL)
 def city_search_api():
     """API endpoint to search city and get live data"""
     city_name = request.args.get('city', '')
@@ -1292,170 +1511,168 @@ def city_search_api():
         return jsonify({'error': 'City name is required'}), 400
     
     try:
-        # Get city info with station names
-        city_query = """
-            SELECT c.*, 
-                   COUNT(DISTINCT s.station_id) as station_count,
-                   COUNT(DISTINCT a.aqi_id) as reading_count,
-                   GROUP_CONCAT(DISTINCT s.station_name SEPARATOR ', ') as station_names
-            FROM cities c
-            LEFT JOIN stations s ON c.city_id = s.city_id
-            LEFT JOIN aqi a ON c.city_id = a.city_id
-            WHERE c.city_name LIKE %s
-            GROUP BY c.city_id
-            LIMIT 1
-        """
-        city_data = execute_query(city_query, (f'%{city_name}%',), fetch=True)
+        # Resolve the city (fuzzy) with its station names and counts from the in-memory index
+        city = city_index.resolve(city_name)
         
-        if not city_data or len(city_data) == 0:
+        if not city:
             return jsonify({'error': f'City "{city_name}" not found'}), 404
         
-        city = city_data[0]
-        
-        # Get latest AQI reading with pollutants
-        aqi_query = """
-            SELECT a.aqi_value, a.date,
-                   p.pm25, p.pm10, p.no2, p.so2, p.co, p.o3
-            FROM aqi a
-            LEFT JOIN pollutants p ON a.city_id = p.city_id AND a.date = p.date
-            WHERE a.city_id = %s
-            ORDER BY a.date DESC
-            LIMIT 1
-        """
-        aqi_data = execute_query(aqi_query, (city['city_id'],), fetch=True)
-        
-        # Get monthly AQI trends for 2024 - simplified query
-        trends_query = """
-            SELECT 
-                MONTH(date) as month,
-                ROUND(AVG(aqi_value), 2) as avg_aqi,
-                MAX(aqi_value) as max_aqi,
-                MIN(aqi_value) as min_aqi
-            FROM aqi
-            WHERE city_id = %s AND YEAR(date) = 2024
-            GROUP BY MONTH(date)
-            ORDER BY MONTH(date)
-        """
-        trends_data = execute_query(trends_query, (city['city_id'],), fetch=True)
-        
-        # Get dates for max and min AQI values for each month
-        max_min_dates = {}
-        if trends_data:
-            for row in trends_data:
-                month = row['month']
-                max_aqi = row['max_aqi']
-                min_aqi = row['min_aqi']
-                
-                # Get date of max AQI for this month
-                max_date_query = """
-                    SELECT DATE(date) as date 
-                    FROM aqi 
-                    WHERE city_id = %s AND YEAR(date) = 2024 AND MONTH(date) = %s AND aqi_value = %s
-                    LIMIT 1
-                """
-                max_date_result = execute_query(max_date_query, (city['city_id'], month, max_aqi), fetch=True)
-                
-                # Get date of min AQI for this month
-                min_date_query = """
-                    SELECT DATE(date) as date 
-                    FROM aqi 
-                    WHERE city_id = %s AND YEAR(date) = 2024 AND MONTH(date) = %s AND aqi_value = %s
-                    LIMIT 1
-                """
-                min_date_result = execute_query(min_date_query, (city['city_id'], month, min_aqi), fetch=True)
-                
-                max_min_dates[month] = {
-                    'max_date': str(max_date_result[0]['date']) if max_date_result and len(max_date_result) > 0 else '',
-                    'min_date': str(min_date_result[0]['date']) if min_date_result and len(min_date_result) > 0 else ''
-                }
-        
-        # Prepare trends data
-        trends = {
-            'months': [],
-            'avg_aqi': [],
-            'max_aqi': [],
-            'min_aqi': [],
-            'max_dates': [],
-            'min_dates': []
-        }
-        
-        if trends_data:
-            for row in trends_data:
-                month = row['month']
-                trends['months'].append(month)
-                trends['avg_aqi'].append(float(row['avg_aqi']) if row['avg_aqi'] else 0)
-                trends['max_aqi'].append(int(row['max_aqi']) if row['max_aqi'] else 0)
-                trends['min_aqi'].append(int(row['min_aqi']) if row['min_aqi'] else 0)
-                trends['max_dates'].append(max_min_dates.get(month, {}).get('max_date', ''))
-                trends['min_dates'].append(max_min_dates.get(month, {}).get('min_date', ''))
+        # Latest reading and monthly trends, shared by concurrent lookups of the same city
+        aqi_data, trends = _city_history_flights.do(city['city_id'], city_history, city['city_id'])
         
         # Fetch live data from OpenWeatherMap API
-        live_data = fetch_openweather_data(city['city_name'])
+        live_data = fetch_openweather_data(city['city_name'], city['city_id'])
+        live_updates.publish_snapshot(city['city_id'], live_data)
         
         # Prepare response - prioritize live API data, fallback to database
-        response = {
-            'city_name': city['city_name'],
-            'state_name': city['state_name'],
-            'city_id': city['city_id'],
-            'station_names': city['station_names'] if city['station_names'] else 'No stations',
-            'station_count': city['station_count'],
-            'total_readings': city['reading_count'],
-            'trends': trends
-        }
-        
-        # Use live API data if available, otherwise fallback to database
-        if live_data:
-            response.update({
-                'live_aqi': live_data['live_aqi'],
-                'pm25': live_data['pm25'],
-                'pm10': live_data['pm10'],
-                'no2': live_data['no2'],
-                'so2': live_data['so2'],
-                'co': live_data['co'],
-                'o3': live_data['o3'],
-                'temperature': live_data['temperature'],
-                'humidity': live_data['humidity'],
-                'wind_speed': live_data['wind_speed'],
-                'precipitation': live_data['precipitation'],
-                'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'data_source': 'Live API'
-            })
-        else:
-            # Fallback to database data
-            import random
-            response.update({
-                'live_aqi': int(aqi_data[0]['aqi_value']) if aqi_data and len(aqi_data) > 0 else 0,
-                'pm25': round(float(aqi_data[0]['pm25']), 2) if aqi_data and len(aqi_data) > 0 and aqi_data[0]['pm25'] else 0,
-                'pm10': round(float(aqi_data[0]['pm10']), 2) if aqi_data and len(aqi_data) > 0 and aqi_data[0]['pm10'] else 0,
-                'no2': round(float(aqi_data[0]['no2']), 2) if aqi_data and len(aqi_data) > 0 and aqi_data[0]['no2'] else 0,
-                'so2': round(float(aqi_data[0]['so2']), 2) if aqi_data and len(aqi_data) > 0 and aqi_data[0]['so2'] else 0,
-                'co': round(float(aqi_data[0]['co']), 2) if aqi_data and len(aqi_data) > 0 and aqi_data[0]['co'] else 0,
-                'o3': round(float(aqi_data[0]['o3']), 2) if aqi_data and len(aqi_data) > 0 and aqi_data[0]['o3'] else 0,
-                'temperature': random.randint(20, 35),
-                'humidity': random.randint(50, 80),
-                'wind_speed': random.randint(5, 25),
-                'precipitation': round(random.uniform(0, 10), 1),
-                'last_updated': str(aqi_data[0]['date']) if aqi_data and len(aqi_data) > 0 else datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'data_source': 'Database'
-            })
-        
-        # Add AQI health impact information
-        aqi_value = response.get('live_aqi', 0)
-        health_impact = get_aqi_health_impact(aqi_value)
-        response['health_impact'] = health_impact
+        response = api_core.build_city_response(city, aqi_data, trends, live_data)
         
         # Add debug logging for trends data
-        print(f"DEBUG - Trends data for {city['city_name']}: {trends}")
-        print(f"DEBUG - Response trends: {response.get('trends', {})}")
+        logger.debug("Trends data for %s: %s", city['city_name'], trends)
         
         return jsonify(response)
         
     except Exception as e:
-        print(f"Error in city search API: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"Error in city search API: {e}", exc_info=True)
         return jsonify({'error': 'Failed to fetch city data', 'details': str(e)}), 500
 
+def city_history(city_id):
+    """Latest AQI reading with pollutants and the monthly AQI trends of a city"""
+    aqi_data = execute_query(api_core.LATEST_READING_QUERY, (city_id,), fetch=True)
+    
+    # Monthly AQI trends - one range read through the archive facade
+    # (closed months may already live in cold storage), then per-month stats in pandas
+    import archive
+    readings = archive.read_range('aqi', *api_core.trend_range(), city_id=city_id)
+    return aqi_data, api_core.build_trends(readings)
+
+@app.route('/api/v1/aqi-grid')
+@login_required
+@cached_json
+def aqi_grid_api():
+    """
+    AQI interpolated (inverse distance weighting) from the stations onto a lat/lon grid
+
+    ?date=YYYY-MM-DD (default: each station's latest reading),
+    ?bbox=min_lat,min_lon,max_lat,max_lon, ?resolution= points per side, ?power=
+    """
+    try:
+        day = request.args.get('date')
+        day = datetime.strptime(day, '%Y-%m-%d').date() if day else None
+        bbox = request.args.get('bbox')
+        if bbox:
+            bbox = tuple(float(value) for value in bbox.split(','))
+            # float() accepts nan / inf, which no comparison below would reject
+            if (len(bbox) != 4 or not all(math.isfinite(value) for value in bbox)
+                    or not -90 <= bbox[0] < bbox[2] <= 90 or not -180 <= bbox[1] < bbox[3] <= 180):
+                raise ValueError('bbox must be min_lat,min_lon,max_lat,max_lon within -90..90 and -180..180')
+        resolution = request.args.get('resolution', Config.AQI_GRID_RESOLUTION, type=int)
+        power = request.args.get('power', Config.AQI_GRID_IDW_POWER, type=float)
+        if not 2 <= resolution <= Config.AQI_GRID_MAX_RESOLUTION or not 0 < power <= 10:
+            raise ValueError(f'resolution must be 2-{Config.AQI_GRID_MAX_RESOLUTION} and power 0-10')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    grid = geo_index.aqi_grid(day, bbox, resolution, power)
+    if grid is None:
+        return jsonify({'error': 'No located station has a reading for this date'}), 404
+    return jsonify(grid)
+
+@app.route('/api/v1/cube')
+@login_required
+@cached_json
+def cube_api():
+    """
+    Slice, dice and roll-up of AQI / pollutant aggregates from the precomputed cube
+
+    ?by=city,month groups by dimensions (city, station, year, month, weekday,
+    category; none = grand total), ?measures=aqi,pm25 (default aqi), and
+    filters per dimension: ?city=1,2&year=2022-2024&category=Unhealthy,Hazardous
+    """
+    try:
+        group_by, measures, filters = cube.parse_request(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if session.get('role') != 'admin':
+        filters['city'] = [city for city in filters.get('city', [session.get('city_id')])
+                           if city == session.get('city_id')]
+
+    result = cube.query(group_by, filters, measures)
+    if result is None:
+        return jsonify({'error': 'Cube unavailable'}), 503
+    return jsonify(result)
+
+@app.route('/api/v1/compare')
+@login_required
+@cached_json
+def compare_api():
+    """
+    Aligned AQI and pollutant series plus summary statistics for up to
+    Config.COMPARE_MAX_CITIES cities in one response
+
+    ?cities=1,2,Delhi (IDs or names), ?from=&to= YYYY-MM-DD (inclusive, default
+    the last 90 days), ?interval=day|month (default day up to COMPARE_MAX_DAYS).
+    Non-admin users may only request their own city, as with the cube.
+    """
+    try:
+        city_ids, start, end, interval = comparison.parse_request(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if session.get('role') != 'admin' and any(city_id != session.get('city_id') for city_id in city_ids):
+        return jsonify({'error': 'Comparison not available for these cities'}), 403
+
+    result = comparison.compare(city_ids, start, end, interval)
+    if result is None:
+        return jsonify({'error': 'Comparison data unavailable'}), 503
+    return jsonify(result)
+
+@app.route('/api/v1/stations/nearest')
+@login_required
+def nearest_stations_api():
+    """The ?n= stations closest to ?lat=&lon= (distances in km)"""
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None or not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        return jsonify({'error': 'lat and lon are required'}), 400
+    n = max(1, min(request.args.get('n', 5, type=int), Config.NEAREST_STATIONS_MAX))
+    return jsonify({'lat': lat, 'lon': lon, 'stations': geo_index.nearest_stations(lat, lon, n)})
+
+@app.route('/api/stream')
+@login_required
+def live_stream():
+    """
+    Server-Sent Events stream of new readings and live snapshot changes
+
+    ?city_id= (repeatable) narrows the stream; non-admin users only receive
+    their own city. Each client holds a connection (and a server thread)
+    for as long as it listens, so a worker serving
+    Config.LIVE_MAX_SUBSCRIBERS streams (GUNICORN_THREADS - 8 by default)
+    answers 503 instead. Readings written by other processes arrive through
+    the live_events relay (Config.LIVE_RELAY_ENABLED, on by default).
+    """
+    if session.get('role') == 'admin':
+        city_ids = request.args.getlist('city_id', type=int)
+    else:
+        city_ids = [session.get('city_id')]
+
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    subscription = live_updates.subscribe(city_ids, last_event_id)
+    if subscription is None:
+        response = jsonify({'error': 'Too many live streams, try again later'})
+        response.headers['Retry-After'] = str(Config.LIVE_RETRY_MS // 1000 or 1)
+        return response, 503
+
+    response = app.response_class(
+        live_updates.stream(subscription),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # The generator's own cleanup never runs if the client leaves before the first frame
+    response.call_on_close(lambda: live_updates.hub.unsubscribe(subscription))
+    return response
+
 # ==================== Error Handlers ====================
 
 @app.errorhandler(404)
@@ -1469,4 +1686,5 @@ def internal_error(e):
 # ==================== Main ====================
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Development server; production runs wsgi.py under gunicorn (gunicorn.conf.py)
+    app.run(debug=Config.DEV_SERVER_DEBUG, host='0.0.0.0', port=5000)
@@ -0,0 +1,411 @@
+"""
+Cold-Storage Archive Module
+Moves closed months of aqi, pollutants and weather out of MySQL into
+compressed columnar files (Parquet when pyarrow is installed, otherwise
+NumPy .npz) under Config.ARCHIVE_DIR, and provides a query facade that
+merges archived and live rows for range queries and exports.
+
+Months are archived oldest first, so everything before the table's
+``archived_through`` date lives on disk and everything from it onwards
+lives in MySQL - except rows written to an archived month later, which
+stay in MySQL until the next run. The facade therefore always merges the
+live rows of the whole range. Archive tables left behind by retention.py
+(<table>_archive_pYYYYMM) are picked up as well.
+
+Usage:
+    python archive.py                  # archive months older than ARCHIVE_AFTER_MONTHS
+    python archive.py --months 6 --table aqi
+    python archive.py --status
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from database import get_db_connection, execute_query
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+TABLE_COLUMNS = {
+    'aqi': ['aqi_id', 'city_id', 'station_id', 'date', 'aqi_value'],
+    'pollutants': ['pollutant_id', 'city_id', 'station_id', 'date', 'pm25', 'pm10', 'o3', 'no2', 'so2', 'co'],
+    'weather': ['weather_id', 'city_id', 'date', 'temp', 'humidity', 'wind_speed', 'precipitation']
+}
+INTEGER_COLUMNS = {'aqi_id', 'pollutant_id', 'weather_id', 'city_id', 'station_id', 'aqi_value'}
+
+DELETE_BATCH_SIZE = 10000
+
+_manifest_lock = threading.Lock()
+_manifest_cache = {'mtime': None, 'data': None}
+
+
+def month_start(day, offset=0):
+    """First day of the month ``offset`` months after day's month"""
+    index = day.year * 12 + day.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+# ==================== Manifest ====================
+
+def _manifest_path():
+    return os.path.join(Config.ARCHIVE_DIR, 'manifest.json')
+
+
+def load_manifest():
+    """
+    Archive manifest: {table: {'archived_through': 'YYYY-MM-DD', 'months': {'YYYY-MM': {...}}}}
+
+    Re-read only when the file changes, so the facade costs one stat() per call.
+    """
+    path = _manifest_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+
+    with _manifest_lock:
+        if _manifest_cache['mtime'] != mtime:
+            with open(path) as f:
+                _manifest_cache['data'] = json.load(f)
+            _manifest_cache['mtime'] = mtime
+        return _manifest_cache['data']
+
+
+def _save_manifest(manifest):
+    os.makedirs(Config.ARCHIVE_DIR, exist_ok=True)
+    tmp_path = _manifest_path() + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, _manifest_path())
+
+
+def archived_through(table):
+    """First date still held in MySQL for table (None if nothing is archived)"""
+    boundary = load_manifest().get(table, {}).get('archived_through')
+    return date.fromisoformat(boundary) if boundary else None
+
+
+def full_history():
+    """(start, end) range covering every archived and live row, for read_range()"""
+    return date(1970, 1, 1), date.today() + timedelta(days=1)
+
+
+# ==================== Columnar Files ====================
+
+def _frame_from_rows(table, rows):
+    frame = pd.DataFrame.from_records(rows, columns=TABLE_COLUMNS[table])
+    frame['date'] = pd.to_datetime(frame['date'])
+    for column in TABLE_COLUMNS[table]:
+        if column != 'date':
+            frame[column] = pd.to_numeric(frame[column], errors='coerce')
+    return frame
+
+
+def write_month_file(table, month, frame):
+    """Write one month atomically; returns the file name relative to ARCHIVE_DIR"""
+    directory = os.path.join(Config.ARCHIVE_DIR, table)
+    os.makedirs(directory, exist_ok=True)
+    stem = f'{month:%Y-%m}'
+
+    if PARQUET_AVAILABLE:
+        name = f'{stem}.parquet'
+        tmp_path = os.path.join(directory, name + '.tmp')
+        frame.to_parquet(tmp_path, compression='zstd', index=False)
+    else:
+        name = f'{stem}.npz'
+        tmp_path = os.path.join(directory, stem + '.tmp.npz')
+        arrays = {column: frame[column].to_numpy(dtype='datetime64[D]' if column == 'date' else np.float64)
+                  for column in frame.columns}
+        np.savez_compressed(tmp_path, **arrays)
+
+    os.replace(tmp_path, os.path.join(directory, name))
+    return os.path.join(table, name)
+
+
+def read_month_file(table, relative_path):
+    """Load one archived month as a DataFrame with the table's columns"""
+    path = os.path.join(Config.ARCHIVE_DIR, relative_path)
+    if path.endswith('.parquet'):
+        frame = pd.read_parquet(path)
+    else:
+        with np.load(path) as arrays:
+            frame = pd.DataFrame({column: arrays[column] for column in TABLE_COLUMNS[table]})
+        frame['date'] = pd.to_datetime(frame['date'])
+    return frame
+
+
+# ==================== Archiving ====================
+
+def _retention_tables(table):
+    """Archive tables left by retention.py, e.g. aqi_archive_p202401"""
+    rows = execute_query(
+        """SELECT TABLE_NAME AS name FROM information_schema.TABLES
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME LIKE %s ORDER BY TABLE_NAME""",
+        (f'{table}\\_archive\\_p%',), fetch=True
+    ) or []
+    return [row['name'] for row in rows]
+
+
+def _fetch_month(source, table, month):
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            f"SELECT {', '.join(TABLE_COLUMNS[table])} FROM {source} WHERE date >= %s AND date < %s ORDER BY date",
+            (month, month_start(month, 1))
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+    return rows
+
+
+def primary_key(table):
+    return TABLE_COLUMNS[table][0]
+
+
+def _delete_rows(table, ids):
+    """
+    Remove archived rows from the live table by primary key in bounded batches
+
+    Deleting by key rather than by date range leaves rows written after the
+    month was read in MySQL; the next run archives them.
+    """
+    key = primary_key(table)
+    deleted = 0
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        for offset in range(0, len(ids), DELETE_BATCH_SIZE):
+            batch = ids[offset:offset + DELETE_BATCH_SIZE]
+            cursor.execute(f"DELETE FROM {table} WHERE {key} IN ({', '.join(['%s'] * len(batch))})", batch)
+            connection.commit()
+            deleted += cursor.rowcount
+        cursor.close()
+    return deleted
+
+
+def archive_month(table, month, source=None):
+    """
+    Copy one month to a columnar file, then remove it from the live table
+
+    Rows arriving later for an already archived month are appended to its file.
+
+    Args:
+        source: Table to read from instead of the live table (a retention
+                archive table; the caller drops it afterwards)
+
+    Returns:
+        Number of rows archived
+    """
+    manifest = json.loads(json.dumps(load_manifest()))
+    entry = manifest.setdefault(table, {'archived_through': None, 'months': {}})
+
+    rows = _fetch_month(source or table, table, month)
+    existing = entry['months'].get(f'{month:%Y-%m}')
+    if rows:
+        frame = _frame_from_rows(table, rows)
+        if existing:
+            # A run interrupted before its delete leaves rows that are already on disk
+            frame = pd.concat([read_month_file(table, existing['file']), frame], ignore_index=True)
+            frame = frame.drop_duplicates(primary_key(table), keep='last', ignore_index=True)
+        relative_path = write_month_file(table, month, frame)
+
+        # Re-read the file before deleting anything from the database
+        if len(read_month_file(table, relative_path)) != len(frame):
+            raise IOError(f"Archive verification failed for {table} {month:%Y-%m}")
+
+        entry['months'][f'{month:%Y-%m}'] = {
+            'file': relative_path,
+            'rows': len(frame),
+            'archived_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+    boundary = entry.get('archived_through')
+    next_month = month_start(month, 1).isoformat()
+    entry['archived_through'] = max(boundary, next_month) if boundary else next_month
+    _save_manifest(manifest)
+
+    if rows and not source:
+        _delete_rows(table, [row[0] for row in rows])
+
+    logger.info(f"✅ Archived {table} {month:%Y-%m}: {len(rows)} rows")
+    return len(rows)
+
+
+def archive_closed_months(tables=tuple(TABLE_COLUMNS), keep_months=None, today=None):
+    """
+    Archive every month older than the last ``keep_months`` months, oldest first
+
+    Returns:
+        Dict table -> {month: rows}
+    """
+    keep_months = Config.ARCHIVE_AFTER_MONTHS if keep_months is None else keep_months
+    cutoff = month_start(today or date.today(), -keep_months)
+    summary = {}
+
+    for table in tables:
+        summary[table] = {}
+        sources = _retention_tables(table) + [table]
+        for source in sources:
+            bounds = execute_query(f"SELECT MIN(date) AS oldest, MAX(date) AS newest FROM {source}", fetch=True)
+            if not bounds or bounds[0]['oldest'] is None:
+                if source != table:
+                    execute_query(f"DROP TABLE {source}")
+                continue
+
+            # Retention tables are exported whole; the live table up to the cutoff
+            last = month_start(bounds[0]['newest'], 1) if source != table else cutoff
+            month = month_start(bounds[0]['oldest'])
+            while month < last:
+                rows = archive_month(table, month, source=None if source == table else source)
+                key = f'{month:%Y-%m}'
+                summary[table][key] = summary[table].get(key, 0) + rows
+                month = month_start(month, 1)
+            if source != table:
+                execute_query(f"DROP TABLE {source}")
+
+    if any(summary.values()):
+        # Archiving does not change results, but drop caches built on the old split
+        import response_cache
+        response_cache.bump_data_version()
+        if summary.get('aqi'):
+            # city_stats counts the readings left in the live table
+            import city_stats
+            city_stats.refresh()
+    return summary
+
+
+# ==================== Query Facade ====================
+
+def live_query(table, start, end, filters):
+    """SQL and params selecting the live rows of a range (shared with the async API tier)"""
+    where = ['date >= %s', 'date < %s']
+    params = [start, end]
+    for column, value in filters.items():
+        if isinstance(value, (list, tuple, set, frozenset)):
+            values = list(value)
+            where.append(f"{column} IN ({', '.join(['%s'] * len(values))})" if values else 'FALSE')
+            params.extend(values)
+        else:
+            where.append(f'{column} = %s')
+            params.append(value)
+    query = f"SELECT {', '.join(TABLE_COLUMNS[table])} FROM {table} WHERE {' AND '.join(where)} ORDER BY date"
+    return query, tuple(params)
+
+
+def frame_from_dicts(table, rows):
+    """DataFrame from dictionary-cursor rows"""
+    return _frame_from_rows(table, [tuple(row[c] for c in TABLE_COLUMNS[table]) for row in rows])
+
+
+def read_archived(table, start, end, **filters):
+    """
+    Archived rows of a range
+
+    Rows can still reach MySQL for archived months (late or back-dated
+    writes), so callers merge this with the live rows of the whole range
+    (merge_frames() drops rows present on both sides).
+
+    Returns:
+        DataFrame of archived rows
+    """
+    if table not in TABLE_COLUMNS:
+        raise ValueError(f"{table} is not an archivable table")
+    unknown = set(filters) - set(TABLE_COLUMNS[table])
+    if unknown:
+        raise ValueError(f"Unknown filter column(s): {', '.join(sorted(unknown))}")
+
+    boundary = archived_through(table)
+    frames = []
+
+    if boundary and start < boundary:
+        months = load_manifest()[table]['months']
+        month = month_start(start)
+        while month < min(end, boundary):
+            info = months.get(f'{month:%Y-%m}')
+            if info:
+                frame = read_month_file(table, info['file'])
+                mask = (frame['date'] >= pd.Timestamp(start)) & (frame['date'] < pd.Timestamp(end))
+                for column, value in filters.items():
+                    if isinstance(value, (list, tuple, set, frozenset)):
+                        mask &= frame[column].isin(list(value))
+                    else:
+                        mask &= frame[column] == value
+                frames.append(frame[mask])
+            month = month_start(month, 1)
+
+    return pd.concat(frames, ignore_index=True) if frames else _frame_from_rows(table, [])
+
+
+def merge_frames(archived, live):
+    """Archived plus live rows, ordered by date; a row on both sides keeps its live version"""
+    if archived.empty:
+        return live
+    merged = pd.concat([archived, live], ignore_index=True)
+    merged = merged.drop_duplicates(merged.columns[0], keep='last')
+    return merged.sort_values('date', kind='stable', ignore_index=True)
+
+
+def read_range(table, start, end, **filters):
+    """
+    Rows of table with start <= date < end from archive files and MySQL
+
+    Args:
+        filters: Equality filters, e.g. city_id=3 or station_id=12; a list
+                 matches any of its values (city_id=[1, 2, 5])
+
+    Returns:
+        DataFrame with the table's columns, ordered by date
+    """
+    archived = read_archived(table, start, end, **filters)
+    query, params = live_query(table, start, end, filters)
+    live = frame_from_dicts(table, execute_query(query, params, fetch=True) or [])
+    return merge_frames(archived, live)
+
+
+def iter_rows(table, start, end, **filters):
+    """read_range() as plain dicts (ints as int, NULLs as None, dates as date) for CSV export"""
+    return frame_rows(table, read_range(table, start, end, **filters))
+
+
+def frame_rows(table, frame):
+    """A read_range() frame as the plain dicts of iter_rows()"""
+    for record in frame.to_dict('records'):
+        row = {}
+        for column in TABLE_COLUMNS[table]:
+            value = record[column]
+            if column == 'date':
+                row[column] = value.date()
+            elif pd.isna(value):
+                row[column] = None
+            else:
+                row[column] = int(value) if column in INTEGER_COLUMNS else float(value)
+        yield row
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archive closed months of time-series tables to disk')
+    parser.add_argument('--months', type=int, help='Months kept in MySQL (default ARCHIVE_AFTER_MONTHS)')
+    parser.add_argument('--table', action='append', choices=list(TABLE_COLUMNS), help='Table (repeatable)')
+    parser.add_argument('--status', action='store_true', help='Print the manifest summary and exit')
+    args = parser.parse_args()
+
+    if args.status:
+        for name, entry in load_manifest().items():
+            rows = sum(m['rows'] for m in entry['months'].values())
+            logger.info(f"{name}: {len(entry['months'])} months, {rows} rows, live from {entry['archived_through']}")
+    else:
+        result = archive_closed_months(tables=args.table or tuple(TABLE_COLUMNS), keep_months=args.months)
+        logger.info(f"✅ Archived {result}")
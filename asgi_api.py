@@ -0,0 +1,297 @@
+"""
+Async JSON API Tier
+ASGI application serving /api/city-search, /api/dashboard_stats and
+/api/aqi_trends on asyncio: MySQL through an aiomysql pool and the
+OpenWeatherMap calls through a shared httpx.AsyncClient, so one process can
+hold hundreds of concurrent slow live-data lookups instead of one per
+worker thread.
+
+SQL and response shaping come from api_core.py (the Flask routes use the
+same functions), and the Flask session cookie is honoured, so a reverse
+proxy can send these three paths here and everything else to app.py.
+
+Usage:
+    uvicorn asgi_api:app --host 0.0.0.0 --port 8001
+"""
+
+import asyncio
+import decimal
+import json
+import logging
+import re
+import time
+import uuid
+from datetime import date
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+import aiomysql
+import httpx
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+from werkzeug.http import http_date
+
+import api_core
+import archive
+import city_index
+import geo_index
+import instrumentation
+import live_updates
+from config import Config
+
+logging.basicConfig(level=Config.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+_pool = None
+_http = None
+
+# ==================== Session ====================
+
+_session_app = Flask(__name__)
+_session_app.config.from_object(Config)
+_session_serializer = SecureCookieSessionInterface().get_signing_serializer(_session_app)
+
+
+def load_session(headers):
+    """Decode the Flask session cookie (empty dict if missing or invalid)"""
+    cookie_header = headers.get(b'cookie', b'').decode('latin-1')
+    if not cookie_header:
+        return {}
+    cookies = SimpleCookie()
+    cookies.load(cookie_header)
+    morsel = cookies.get(_session_app.config.get('SESSION_COOKIE_NAME', 'session'))
+    if morsel is None:
+        return {}
+    try:
+        return _session_serializer.loads(
+            morsel.value, max_age=int(Config.PERMANENT_SESSION_LIFETIME.total_seconds())
+        )
+    except Exception:
+        return {}
+
+
+async def resolve_user(session):
+    """(role, city_id) of the caller - like login_required, anonymous callers act as admin"""
+    if 'user_id' in session:
+        return session.get('role'), session.get('city_id')
+    rows = await fetch_all("SELECT role, city_id FROM users WHERE username = %s AND is_active = TRUE", ('admin',))
+    if rows:
+        return rows[0]['role'], rows[0]['city_id']
+    return None, None
+
+
+# ==================== MySQL ====================
+
+_LITERAL_PERCENT = re.compile(r'%(?!s)')
+
+
+def _pyformat(query, params):
+    """aiomysql interpolates with ``query % params``; escape literal % (DATE_FORMAT patterns)"""
+    return _LITERAL_PERCENT.sub('%%', query) if params else query
+
+
+async def fetch_all(query, params=None):
+    """Run a SELECT on the async pool; rows as dicts"""
+    started = time.perf_counter()
+    try:
+        async with _pool.acquire() as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(_pyformat(query, params), params)
+                return await cursor.fetchall()
+    finally:
+        instrumentation.record_query(query, time.perf_counter() - started)
+
+
+# ==================== OpenWeatherMap ====================
+
+async def _get_json(service, url):
+    with instrumentation.track_upstream(service):
+        response = await _http.get(url)
+    if response.status_code != 200:
+        return None
+    return response.json()
+
+
+async def fetch_openweather_data(city_name, city_id=None):
+    """Async twin of app.fetch_openweather_data(); weather and pollution are fetched concurrently"""
+    try:
+        coordinates = None
+        if city_id is not None:
+            coordinates = await asyncio.to_thread(geo_index.city_coordinates, city_id)
+        if coordinates:
+            lat, lon = coordinates
+        else:
+            geo_data = await _get_json('openweather_geo', api_core.geo_url(city_name))
+            if not geo_data:
+                return None
+
+            lat = geo_data[0]['lat']
+            lon = geo_data[0]['lon']
+            if city_id is not None:
+                await asyncio.to_thread(geo_index.save_city_coordinates, city_id, lat, lon)
+        weather_data, pollution_data = await asyncio.gather(
+            _get_json('openweather_weather', api_core.weather_url(lat, lon)),
+            _get_json('openweather_air_pollution', api_core.pollution_url(lat, lon))
+        )
+        if weather_data is None or pollution_data is None:
+            return None
+
+        return api_core.shape_live_data(weather_data, pollution_data)
+
+    except Exception as e:
+        logger.warning(f"OpenWeatherMap API Error: {e}")
+        return None
+
+
+# ==================== Endpoints ====================
+
+async def city_trends(city_id):
+    """Trend readings merged from archive files (read in a thread) and the async pool"""
+    start, end = api_core.trend_range()
+    archived = await asyncio.to_thread(archive.read_archived, 'aqi', start, end, city_id=city_id)
+    query, params = archive.live_query('aqi', start, end, {'city_id': city_id})
+    live = archive.frame_from_dicts('aqi', await fetch_all(query, params))
+    return api_core.build_trends(archive.merge_frames(archived, live))
+
+
+async def city_search_api(query, session):
+    """API endpoint to search city and get live data"""
+    city_name = query.get('city', '')
+
+    if not city_name:
+        return 400, {'error': 'City name is required'}
+
+    try:
+        # The index lives in memory; only its periodic rebuild runs (sync) queries
+        city = await asyncio.to_thread(city_index.resolve, city_name)
+        if not city:
+            return 404, {'error': f'City "{city_name}" not found'}
+
+        aqi_data, trends, live_data = await asyncio.gather(
+            fetch_all(api_core.LATEST_READING_QUERY, (city['city_id'],)),
+            city_trends(city['city_id']),
+            fetch_openweather_data(city['city_name'], city['city_id'])
+        )
+        # Reaches /api/stream clients of the Flask workers through the live_events relay
+        await asyncio.to_thread(live_updates.publish_snapshot, city['city_id'], live_data)
+        return 200, api_core.build_city_response(city, aqi_data, trends, live_data)
+
+    except Exception as e:
+        logger.error(f"Error in city search API: {e}", exc_info=True)
+        return 500, {'error': 'Failed to fetch city data', 'details': str(e)}
+
+
+async def api_dashboard_stats(query, session):
+    """API endpoint for dashboard statistics"""
+    role, city_id = await resolve_user(session)
+    aqi_query, params = api_core.dashboard_aqi_query(role, city_id)
+    aqi_by_city, vehicles = await asyncio.gather(
+        fetch_all(aqi_query, params),
+        fetch_all(api_core.VEHICLE_TOTALS_QUERY)
+    )
+    return 200, {'aqi_by_city': aqi_by_city, 'vehicles': vehicles}
+
+
+async def api_aqi_trends(query, session):
+    """API endpoint for AQI trends"""
+    role, city_id = await resolve_user(session)
+    aqi_table = api_core.AQI_SOURCES.get(query.get('source', 'raw'), 'aqi')
+    sql, params = api_core.aqi_trends_query(aqi_table, role, city_id)
+    return 200, await fetch_all(sql, params)
+
+
+ROUTES = {
+    '/api/city-search': city_search_api,
+    '/api/dashboard_stats': api_dashboard_stats,
+    '/api/aqi_trends': api_aqi_trends,
+}
+
+
+# ==================== ASGI ====================
+
+def _json_default(value):
+    """Serialize like Flask's default JSON provider (dates as HTTP dates, Decimal as str)"""
+    if isinstance(value, date):
+        return http_date(value)
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+async def startup():
+    global _pool, _http
+    db = Config.get_db_config()
+    _pool = await aiomysql.create_pool(
+        host=db['host'], port=db.get('port', 3306), user=db['user'], password=db['password'],
+        db=db['database'], charset=db.get('charset', 'utf8mb4'), autocommit=True,
+        minsize=1, maxsize=Config.ASYNC_DB_POOL_SIZE
+    )
+    _http = httpx.AsyncClient(
+        timeout=5,
+        limits=httpx.Limits(max_connections=Config.ASYNC_HTTP_MAX_CONNECTIONS)
+    )
+    logger.info("✅ Async API tier started")
+
+
+async def shutdown():
+    if _http is not None:
+        await _http.aclose()
+    if _pool is not None:
+        _pool.close()
+        await _pool.wait_closed()
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await startup()
+            except Exception as e:
+                logger.error(f"❌ Async API tier failed to start: {e}")
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    handler = ROUTES.get(scope['path'])
+    started = instrumentation.start_request()
+    if handler is None:
+        status, payload = 404, {'error': 'Not found'}
+    elif scope['method'] not in ('GET', 'HEAD'):
+        status, payload = 405, {'error': 'Method not allowed'}
+    else:
+        query = {k: v[0] for k, v in parse_qs(scope['query_string'].decode('latin-1')).items()}
+        session = load_session(dict(scope['headers']))
+        try:
+            status, payload = await handler(query, session)
+        except Exception as e:
+            logger.error(f"Unhandled exception: {e}", exc_info=True)
+            status, payload = 500, {'error': 'Internal server error'}
+
+    body = json.dumps(payload, default=_json_default, sort_keys=True).encode('utf-8')
+    elapsed, queries, db_seconds = instrumentation.finish_request(
+        handler.__name__ if handler else None, scope['method'], status, started)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'server-timing', f'app;dur={elapsed * 1000:.1f}, db;dur={db_seconds * 1000:.1f};'
+                               f'desc="{queries} queries"'.encode()),
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
@@ -0,0 +1,7 @@
+"""
+DCDS Project - Benchmark Suite
+Seeding, load-testing and micro-benchmark scripts. Run from the project root:
+
+    python -m benchmarks.seed --cities 50 --stations 4 --years 3
+    python -m benchmarks.load_test --concurrency 16 --duration 30 --output bench.json
+"""
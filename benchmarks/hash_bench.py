@@ -0,0 +1,108 @@
+"""
+Password Hash Benchmark
+Measures hash throughput and latency for each algorithm / cost setting of
+credentials.py, both on the calling thread and through the hashing process
+pool, to pick PASSWORD_HASH_COST and PASSWORD_HASH_WORKERS for a host: the
+per-hash latency is what one login waits, the pool throughput is how fast a
+post-restart login burst drains.
+
+Usage:
+    python -m benchmarks.hash_bench
+    python -m benchmarks.hash_bench --algorithm bcrypt --costs 10 11 12 13 --workers 4 --output hash.json
+"""
+
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+import credentials
+from benchmarks.load_test import git_commit
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Costs measured when --costs is not given
+DEFAULT_COST_SWEEP = {
+    'bcrypt': (10, 11, 12, 13),
+    'pbkdf2': (260000, 600000, 1000000),
+    'scrypt': (16384, 32768, 65536)
+}
+
+
+def bench_inline(algorithm, cost, samples):
+    """Per-hash latency on the calling thread"""
+    timings = []
+    for index in range(samples):
+        started = time.perf_counter()
+        credentials.hash_with(f'benchmark-password-{index}', algorithm, cost)
+        timings.append(time.perf_counter() - started)
+    timings = np.array(timings)
+    return {
+        'p50_ms': round(float(np.percentile(timings, 50)) * 1000, 2),
+        'p95_ms': round(float(np.percentile(timings, 95)) * 1000, 2),
+        'hashes_per_second': round(samples / float(timings.sum()), 2)
+    }
+
+
+def bench_pool(executor, workers, algorithm, cost, burst):
+    """Wall time to hash a burst of passwords through the process pool"""
+    # Warm the workers so process start-up is not measured
+    list(executor.map(credentials.hash_with, ['warmup'] * workers, [algorithm] * workers, [cost] * workers))
+    started = time.perf_counter()
+    list(executor.map(credentials.hash_with, [f'burst-{i}' for i in range(burst)],
+                      [algorithm] * burst, [cost] * burst))
+    elapsed = time.perf_counter() - started
+    return {
+        'burst': burst,
+        'seconds': round(elapsed, 3),
+        'hashes_per_second': round(burst / elapsed, 2)
+    }
+
+
+def run(algorithms, costs=None, samples=5, workers=2, burst=20):
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for algorithm in algorithms:
+            for cost in costs or DEFAULT_COST_SWEEP[algorithm]:
+                logger.info(f"Benchmarking {algorithm} cost {cost}")
+                results.append({
+                    'algorithm': algorithm,
+                    'cost': cost,
+                    'inline': bench_inline(algorithm, cost, samples),
+                    'pool': bench_pool(executor, workers, algorithm, cost, burst)
+                })
+
+    return {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'workers': workers,
+        'results': results
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark password hashing cost settings')
+    parser.add_argument('--algorithm', action='append', choices=credentials.ALGORITHMS,
+                        help='Algorithm (repeatable, default: all)')
+    parser.add_argument('--costs', type=int, nargs='+',
+                        help='Costs to measure for every selected algorithm (default: a sweep per algorithm)')
+    parser.add_argument('--samples', type=int, default=5, help='Inline hashes per setting')
+    parser.add_argument('--workers', type=int, default=2, help='Hashing processes')
+    parser.add_argument('--burst', type=int, default=20, help='Hashes per pool burst')
+    parser.add_argument('--output', help='Write the JSON result here')
+    args = parser.parse_args()
+
+    algorithms = args.algorithm or [a for a in credentials.ALGORITHMS if a != 'bcrypt' or credentials.bcrypt]
+    result = run(algorithms, args.costs, args.samples, args.workers, args.burst)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+        logger.info(f"✅ Results written to {args.output}")
+    else:
+        print(text)
@@ -0,0 +1,219 @@
+"""
+Load Test Driver
+Drives a fixed-concurrency mix of the hot pages and APIs against the app and
+writes per-route latency percentiles and throughput to a JSON file, so runs
+before and after a change can be compared side by side.
+
+By default the app is served in-process (threaded werkzeug server) with the
+OpenWeatherMap stub from owm_stub.py in front of city search; pass
+--base-url to test an already running deployment instead.
+
+Usage:
+    python -m benchmarks.load_test --concurrency 16 --duration 30 --output bench.json
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --requests 2000
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import requests
+
+from benchmarks.owm_stub import start_stub
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# (name, weight) of the request mix; paths are filled in by build_request()
+DEFAULT_MIX = (
+    ('dashboard', 3),
+    ('cities', 2),
+    ('aqi_page', 3),
+    ('city_search', 3),
+    ('analytics', 1),
+    ('export_aqi', 1),
+)
+
+
+def load_city_names(limit=50):
+    """City names to search for, read from the configured database"""
+    from database import execute_query
+
+    rows = execute_query("SELECT city_name FROM cities ORDER BY city_id LIMIT %s", (limit,), fetch=True)
+    return [row['city_name'] for row in rows or []] or ['Delhi']
+
+
+def build_request(name, rng, city_names, max_page):
+    """Path for one request of the given kind"""
+    if name == 'dashboard':
+        return '/dashboard'
+    if name == 'cities':
+        return '/cities'
+    if name == 'aqi_page':
+        return f'/aqi?page={rng.randint(1, max_page)}'
+    if name == 'city_search':
+        return f'/api/city-search?city={rng.choice(city_names)}'
+    if name == 'analytics':
+        return '/analytics'
+    if name == 'export_aqi':
+        return '/export/csv/aqi'
+    raise ValueError(f'Unknown request kind: {name}')
+
+
+def start_app(host='127.0.0.1', port=0):
+    """Serve app.py in a background thread; returns (server, base_url)"""
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_port}'
+
+
+def run_worker(base_url, plan, deadline, results, lock, timeout):
+    """Issue requests from ``plan`` until it is exhausted or ``deadline`` passes"""
+    session = requests.Session()
+    local = []
+    # With a deadline the plan is replayed until time runs out
+    for name, path in (itertools.cycle(plan) if deadline else plan):
+        if deadline and time.perf_counter() >= deadline:
+            break
+        started = time.perf_counter()
+        try:
+            response = session.get(base_url + path, timeout=timeout)
+            error = response.status_code >= 400
+        except requests.RequestException:
+            error = True
+        local.append((name, time.perf_counter() - started, error))
+    with lock:
+        results.extend(local)
+
+
+def summarize(results, wall_seconds):
+    """Per-route count, errors, percentiles (ms) and throughput"""
+    routes = {}
+    for name in sorted({r[0] for r in results}):
+        samples = np.array([r[1] for r in results if r[0] == name]) * 1000
+        errors = sum(1 for r in results if r[0] == name and r[2])
+        routes[name] = {
+            'count': int(samples.size),
+            'errors': errors,
+            'p50_ms': round(float(np.percentile(samples, 50)), 2),
+            'p95_ms': round(float(np.percentile(samples, 95)), 2),
+            'p99_ms': round(float(np.percentile(samples, 99)), 2),
+            'mean_ms': round(float(samples.mean()), 2),
+            'throughput_rps': round(samples.size / wall_seconds, 2) if wall_seconds else 0.0
+        }
+
+    return {
+        'total_requests': len(results),
+        'total_errors': sum(1 for r in results if r[2]),
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_rps': round(len(results) / wall_seconds, 2) if wall_seconds else 0.0,
+        'routes': routes
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(base_url=None, concurrency=8, total_requests=1000, duration=None, warmup=20,
+        max_page=20, upstream_latency=0.05, seed=42, timeout=30):
+    """
+    Run one load test
+
+    Returns:
+        Result dict ready to be written as JSON
+    """
+    server = stub = None
+    if base_url is None:
+        stub, owm_base, owm_geo = start_stub(latency=upstream_latency)
+        Config.OPENWEATHER_BASE_URL = owm_base
+        Config.OPENWEATHER_GEO_URL = owm_geo
+        server, base_url = start_app()
+        logger.info(f"✅ App on {base_url}, OpenWeatherMap stub on {owm_base}")
+
+    rng = random.Random(seed)
+    city_names = load_city_names()
+    kinds = [name for name, weight in DEFAULT_MIX for _ in range(weight)]
+
+    warm = requests.Session()
+    for _ in range(warmup):
+        kind = rng.choice(kinds)
+        try:
+            warm.get(base_url + build_request(kind, rng, city_names, max_page), timeout=timeout)
+        except requests.RequestException:
+            pass
+
+    # Requests are planned up front so every run with the same seed issues the same mix
+    plan = [(kind, build_request(kind, rng, city_names, max_page))
+            for kind in (rng.choice(kinds) for _ in range(max(total_requests, concurrency)))]
+    plans = [plan[i::concurrency] for i in range(concurrency)]
+
+    results, lock = [], threading.Lock()
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for worker_plan in plans:
+            pool.submit(run_worker, base_url, worker_plan, deadline, results, lock, timeout)
+    wall_seconds = time.perf_counter() - started
+
+    if server is not None:
+        server.shutdown()
+    if stub is not None:
+        stub.shutdown()
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'config': {
+            'base_url': base_url,
+            'concurrency': concurrency,
+            'requests': total_requests if duration is None else None,
+            'duration': duration,
+            'warmup': warmup,
+            'max_page': max_page,
+            'upstream_latency': upstream_latency,
+            'seed': seed,
+            'mix': dict(DEFAULT_MIX)
+        },
+        **summarize(results, wall_seconds)
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the DCDS web app')
+    parser.add_argument('--base-url', help='Test a running deployment instead of an in-process app')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=1000, help='Total requests (ignored with --duration)')
+    parser.add_argument('--duration', type=float, help='Run for this many seconds instead of a fixed count')
+    parser.add_argument('--warmup', type=int, default=20, help='Untimed requests before measuring')
+    parser.add_argument('--max-page', type=int, default=20, help='Highest /aqi page requested')
+    parser.add_argument('--upstream-latency', type=float, default=0.05, help='OpenWeatherMap stub delay (s)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the JSON result here (printed otherwise)')
+    args = parser.parse_args()
+
+    result = run(args.base_url, args.concurrency, args.requests, args.duration, args.warmup,
+                 args.max_page, args.upstream_latency, args.seed)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+        logger.info(f"✅ Results written to {args.output}")
+    else:
+        print(text)
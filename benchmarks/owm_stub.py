@@ -0,0 +1,91 @@
+"""
+OpenWeatherMap Stub Server
+Answers the geocoding, weather and air pollution endpoints used by
+fetch_openweather_data() with canned payloads, so load tests never hit the
+real API. Point the app at it with OPENWEATHER_BASE_URL / OPENWEATHER_GEO_URL
+
+Usage:
+    python -m benchmarks.owm_stub --port 8765 --latency 0.05
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+GEO_PAYLOAD = [{'name': 'Stub City', 'lat': 28.61, 'lon': 77.21, 'country': 'IN'}]
+
+WEATHER_PAYLOAD = {
+    'main': {'temp': 27.4, 'humidity': 62},
+    'wind': {'speed': 3.1},
+    'rain': {'1h': 0.0}
+}
+
+POLLUTION_PAYLOAD = {
+    'list': [{
+        'main': {'aqi': 3},
+        'components': {'pm2_5': 61.2, 'pm10': 98.4, 'no2': 21.7, 'so2': 8.3, 'co': 740.0, 'o3': 33.1}
+    }]
+}
+
+ROUTES = {
+    '/geo/1.0/direct': GEO_PAYLOAD,
+    '/data/2.5/weather': WEATHER_PAYLOAD,
+    '/data/2.5/air_pollution': POLLUTION_PAYLOAD
+}
+
+
+def make_handler(latency):
+    """Request handler class that sleeps ``latency`` seconds to mimic the real API"""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            payload = ROUTES.get(urlparse(self.path).path)
+            if latency:
+                time.sleep(latency)
+
+            body = json.dumps(payload if payload is not None else {'message': 'not found'}).encode('utf-8')
+            self.send_response(200 if payload is not None else 404)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub(host='127.0.0.1', port=0, latency=0.0):
+    """
+    Start the stub in a background thread
+
+    Returns:
+        Tuple (server, base_url, geo_url) for Config.OPENWEATHER_BASE_URL / OPENWEATHER_GEO_URL
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    root = f'http://{host}:{server.server_address[1]}'
+    return server, f'{root}/data/2.5', f'{root}/geo/1.0'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local OpenWeatherMap stub')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.latency))
+    print(f'OpenWeatherMap stub on http://{args.host}:{args.port} '
+          f'(OPENWEATHER_BASE_URL=http://{args.host}:{args.port}/data/2.5, '
+          f'OPENWEATHER_GEO_URL=http://{args.host}:{args.port}/geo/1.0)')
+    server.serve_forever()
@@ -0,0 +1,101 @@
+"""
+Start-up Benchmark
+Measures what a freshly started worker costs: the time to import the app
+(wsgi.py), the warm-up of its caches and the latency of its first and
+second requests, with and without the warm-up. Every run is a new
+interpreter, so nothing is shared between runs.
+
+Usage:
+    python -m benchmarks.startup_bench
+    python -m benchmarks.startup_bench --runs 10 --path /api/v1/autocomplete?q=del --output startup.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.load_test import git_commit
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATHS = ('/api/v1/autocomplete?q=del', '/dashboard')
+
+# Runs inside the fresh interpreter; prints one JSON line
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import wsgi
+result = {'import_seconds': time.perf_counter() - started}
+if sys.argv[1] == 'warm':
+    warm_started = time.perf_counter()
+    wsgi.warm_up()
+    result['warmup_seconds'] = time.perf_counter() - warm_started
+client = wsgi.application.test_client()
+with client.session_transaction() as session:
+    session.update(user_id=1, username='admin', full_name='Admin', role='admin', city_id=None)
+for label, path in (('first', sys.argv[2]), ('second', sys.argv[2])):
+    request_started = time.perf_counter()
+    client.get(path)
+    result[label + '_request_seconds'] = time.perf_counter() - request_started
+result['ready_to_first_response_seconds'] = time.perf_counter() - started
+print(json.dumps(result))
+"""
+
+
+def probe(mode, path):
+    """One fresh worker; returns the timings of the probe script"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', PROBE, mode, path], cwd=root, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    summary = {}
+    for key in samples[0]:
+        values = np.array([sample[key] for sample in samples]) * 1000
+        summary[key.replace('_seconds', '_ms')] = {
+            'p50': round(float(np.percentile(values, 50)), 2),
+            'max': round(float(values.max()), 2)
+        }
+    return summary
+
+
+def run(paths=DEFAULT_PATHS, runs=5):
+    results = []
+    for path in paths:
+        for mode in ('cold', 'warm'):
+            logger.info(f"Starting {runs} {mode} workers for {path}")
+            samples = [probe(mode, path) for _ in range(runs)]
+            results.append({'path': path, 'mode': mode, **summarize(samples)})
+
+    return {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'runs': runs,
+        'results': results
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure worker start-up and first-request latency')
+    parser.add_argument('--path', action='append', help='Path requested first (repeatable)')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per path and mode')
+    parser.add_argument('--output', help='Write the JSON result here')
+    args = parser.parse_args()
+
+    result = run(args.path or DEFAULT_PATHS, args.runs)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+        logger.info(f"✅ Results written to {args.output}")
+    else:
+        print(text)
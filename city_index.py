@@ -0,0 +1,277 @@
+"""
+City Search Index
+In-memory prefix and trigram index over city, state and station names,
+backing /api/v1/autocomplete and the city resolution of /api/city-search.
+Lookups never touch MySQL: each city's station names, station count and
+reading count are precomputed when the index is built.
+
+Ranking (best match per city wins):
+    exact name > name prefix > word prefix > substring > fuzzy similarity
+    (trigram overlap or edit distance),
+    weighted by what matched (city name > station name > state name)
+
+The index is rebuilt lazily on the next lookup after invalidate() (called by
+data_changed() in app.py) or Config.CITY_INDEX_TTL seconds, which also
+picks up changes made outside the app.
+"""
+
+import bisect
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from config import Config
+from database import execute_query
+
+logger = logging.getLogger(__name__)
+
+# Match kinds and their weight in the ranking
+KIND_WEIGHTS = {
+    'city': 1.0,
+    'station': 0.9,
+    'state': 0.8
+}
+
+# Scores of the match types before the kind weight
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.9
+WORD_PREFIX_SCORE = 0.8
+SUBSTRING_SCORE = 0.7
+FUZZY_SCORE = 0.6  # Multiplied by the trigram / edit-distance similarity
+
+# Fuzzy matching scores only the terms sharing the most trigrams with the query
+FUZZY_CANDIDATES = 200
+
+CITIES_QUERY = "SELECT city_id, city_name, state_name, pin_code FROM cities"
+STATIONS_QUERY = "SELECT city_id, station_name FROM stations ORDER BY station_id"
+READING_COUNTS_QUERY = "SELECT city_id, reading_count FROM city_stats"
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(text):
+    """Lowercase ASCII with accents removed and punctuation collapsed to single spaces"""
+    text = unicodedata.normalize('NFKD', str(text or '')).encode('ascii', 'ignore').decode('ascii')
+    return _NON_ALNUM.sub(' ', text.lower()).strip()
+
+
+def trigrams(text):
+    """Set of word trigrams, padded like pg_trgm ('  del', ' de', 'del', 'elh', 'lhi', 'hi ')"""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def edit_similarity(a, b):
+    """1 - optimal string alignment distance / longer length (catches transpositions like 'dehli')"""
+    if not a or not b:
+        return 0.0
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return 1 - previous[-1] / max(len(a), len(b))
+
+
+class CityIndex:
+    """Immutable index snapshot; build() creates a new one and readers swap references"""
+
+    def __init__(self, cities, stations, reading_counts):
+        self.cities = {}
+        self._terms = []  # (normalized text, kind, city_id, original text)
+        for row in cities:
+            self.cities[row['city_id']] = {
+                'city_id': row['city_id'],
+                'city_name': row['city_name'],
+                'state_name': row['state_name'],
+                'pin_code': row.get('pin_code'),
+                'station_names': [],
+                'station_count': 0,
+                'reading_count': reading_counts.get(row['city_id'], 0)
+            }
+            self._add_term(row['city_name'], 'city', row['city_id'])
+            self._add_term(row['state_name'], 'state', row['city_id'])
+
+        for row in stations:
+            city = self.cities.get(row['city_id'])
+            if city is None:
+                continue
+            city['station_names'].append(row['station_name'])
+            city['station_count'] += 1
+            self._add_term(row['station_name'], 'station', row['city_id'])
+
+        # Sorted (key, term id) pairs for the full text and every word suffix of each term
+        prefixes = []
+        self._trigrams = defaultdict(set)
+        self._term_grams = []
+        for term_id, (text, _, _, _) in enumerate(self._terms):
+            words = text.split()
+            for position in range(len(words)):
+                prefixes.append((' '.join(words[position:]), term_id))
+            grams = trigrams(text)
+            self._term_grams.append(grams)
+            for gram in grams:
+                self._trigrams[gram].add(term_id)
+        prefixes.sort()
+        self._prefix_keys = [key for key, _ in prefixes]
+        self._prefix_terms = [term_id for _, term_id in prefixes]
+        self.built_at = time.monotonic()
+
+    def _add_term(self, text, kind, city_id):
+        normalized = normalize(text)
+        if normalized:
+            self._terms.append((normalized, kind, city_id, text))
+
+    def _prefix_matches(self, query):
+        """Term ids with a word starting with query (bisect over the sorted keys)"""
+        start = bisect.bisect_left(self._prefix_keys, query)
+        end = bisect.bisect_left(self._prefix_keys, query + '\x7f')
+        return set(self._prefix_terms[start:end])
+
+    def _score(self, query, term_id, query_grams):
+        text, kind, _, _ = self._terms[term_id]
+        if text == query:
+            score = EXACT_SCORE
+        elif text.startswith(query):
+            score = PREFIX_SCORE
+        elif f' {query}' in f' {text}':
+            score = WORD_PREFIX_SCORE
+        elif query in text:
+            score = SUBSTRING_SCORE
+        else:
+            term_grams = self._term_grams[term_id]
+            similarity = len(query_grams & term_grams) / len(query_grams | term_grams)
+            # Compare with the whole name and each word, so 'dehli' still finds 'New Delhi'
+            similarity = max([similarity, edit_similarity(query, text)] +
+                             [edit_similarity(query, word) for word in text.split()])
+            score = FUZZY_SCORE * similarity
+        return score * KIND_WEIGHTS[kind]
+
+    def search(self, query, limit=10, min_score=None):
+        """
+        Cities matching a (partial, possibly misspelled) name
+
+        Returns:
+            List of dicts with city_id, city_name, state_name, matched (the
+            matched name), match_kind and score, best first
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        min_score = Config.CITY_INDEX_MIN_SCORE if min_score is None else min_score
+
+        candidates = self._prefix_matches(query)
+        query_grams = trigrams(query)
+        # Enough word-prefix hits fill the list on their own (they outrank nearly every fuzzy match)
+        if len({self._terms[term_id][2] for term_id in candidates}) < limit:
+            # Substrings and misspellings share trigrams with the query; score the best-overlapping ones
+            gram_hits = defaultdict(int)
+            for gram in query_grams:
+                for term_id in self._trigrams.get(gram, ()):
+                    gram_hits[term_id] += 1
+            needed = max(1, len(query_grams) // 3)
+            fuzzy = [term_id for term_id, hits in gram_hits.items()
+                     if hits >= needed and term_id not in candidates]
+            if len(fuzzy) > FUZZY_CANDIDATES:
+                fuzzy = heapq.nlargest(FUZZY_CANDIDATES, fuzzy, key=gram_hits.__getitem__)
+            candidates.update(fuzzy)
+
+        best = {}
+        for term_id in candidates:
+            score = self._score(query, term_id, query_grams)
+            if score < min_score:
+                continue
+            _, kind, city_id, original = self._terms[term_id]
+            if city_id not in best or score > best[city_id][0]:
+                best[city_id] = (score, kind, original)
+
+        results = []
+        for city_id, (score, kind, original) in best.items():
+            city = self.cities[city_id]
+            results.append({
+                'city_id': city_id,
+                'city_name': city['city_name'],
+                'state_name': city['state_name'],
+                'matched': original,
+                'match_kind': kind,
+                'score': round(score, 3)
+            })
+        # Ties: shorter city names first (closer to what was typed), then better-covered cities
+        results.sort(key=lambda r: (-r['score'], len(r['city_name']),
+                                    -self.cities[r['city_id']]['reading_count'], r['city_name']))
+        return results[:limit]
+
+    def city_row(self, city_id):
+        """City details in the shape of the former city search query row"""
+        city = self.cities[city_id]
+        return dict(city, station_names=', '.join(city['station_names']) or None)
+
+
+# ==================== Shared Instance ====================
+
+_index = None
+_stale = True
+_build_lock = threading.Lock()
+
+
+def build_index():
+    """Read cities, stations and per-city reading counts and build a new index"""
+    cities = execute_query(CITIES_QUERY, fetch=True)
+    stations = execute_query(STATIONS_QUERY, fetch=True)
+    counts = execute_query(READING_COUNTS_QUERY, fetch=True)
+    if cities is None or stations is None:
+        return None
+    reading_counts = {row['city_id']: row['reading_count'] for row in counts or []}
+    index = CityIndex(cities, stations, reading_counts)
+    logger.info(f"✅ City index built ({len(index.cities)} cities, {len(index._terms)} names)")
+    return index
+
+
+def get_index():
+    """Current index, rebuilt first if invalidated or older than Config.CITY_INDEX_TTL"""
+    global _index, _stale
+    index = _index
+    if index is not None and not _stale and time.monotonic() - index.built_at < Config.CITY_INDEX_TTL:
+        return index
+
+    with _build_lock:
+        if _index is not None and not _stale and time.monotonic() - _index.built_at < Config.CITY_INDEX_TTL:
+            return _index
+        _stale = False
+        rebuilt = build_index()
+        if rebuilt is not None:
+            _index = rebuilt
+        elif _index is not None:
+            logger.warning("⚠️ City index rebuild failed, serving the previous index")
+        return _index
+
+
+def invalidate():
+    """Rebuild the index on the next lookup (called after writes)"""
+    global _stale
+    _stale = True
+
+
+def search(query, limit=10):
+    index = get_index()
+    return index.search(query, limit) if index else []
+
+
+def resolve(name):
+    """City row (see CityIndex.city_row) best matching name, or None"""
+    index = get_index()
+    if index is None:
+        return None
+    matches = index.search(name, limit=1)
+    return index.city_row(matches[0]['city_id']) if matches else None
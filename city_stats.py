@@ -0,0 +1,210 @@
+"""
+Per-City Stats Module
+Maintains the city_stats table (database/create_city_stats.sql): station
+count, reading count, first / last reading date and the latest AQI of each
+city. The hot path - a new reading from update_city_aqi - is a single
+keyed upsert; rarer changes (stations, deletes, ingestion, archiving)
+recompute the affected rows from the source tables, aggregating stations
+and aqi separately so no stations x readings fan-out is ever built.
+Months moved to cold storage (archive.py) are counted from the cube's city
+rollups, and their first / last reading read from the edge month files.
+
+Usage:
+    python city_stats.py            # rebuild every city's row
+"""
+
+import logging
+from datetime import date
+
+from database import execute_query, get_db_connection
+
+logger = logging.getLogger(__name__)
+
+REFRESH_QUERY = """
+    INSERT INTO city_stats (city_id, station_count, reading_count, first_reading_date, last_reading_date, last_aqi)
+    SELECT c.city_id,
+           (SELECT COUNT(*) FROM stations s WHERE s.city_id = c.city_id),
+           COALESCE(a.reading_count, 0),
+           a.first_reading_date,
+           a.last_reading_date,
+           (SELECT l.aqi_value FROM aqi l WHERE l.city_id = c.city_id
+            ORDER BY l.date DESC, l.aqi_id DESC LIMIT 1)
+    FROM cities c
+    LEFT JOIN (SELECT city_id, COUNT(*) AS reading_count,
+                      MIN(date) AS first_reading_date, MAX(date) AS last_reading_date
+               FROM aqi {aqi_where} GROUP BY city_id) a
+           ON a.city_id = c.city_id
+    {city_where}
+    ON DUPLICATE KEY UPDATE
+        station_count = VALUES(station_count),
+        reading_count = VALUES(reading_count),
+        first_reading_date = VALUES(first_reading_date),
+        last_reading_date = VALUES(last_reading_date),
+        last_aqi = VALUES(last_aqi)
+"""
+
+# Whitelisted variants (fixed statements, prepared once per connection);
+# the LIVE ones count only the rows from the archive boundary onwards
+REFRESH_ALL_QUERY = REFRESH_QUERY.format(aqi_where='', city_where='')
+REFRESH_CITY_QUERY = REFRESH_QUERY.format(aqi_where='WHERE city_id = %s', city_where='WHERE c.city_id = %s')
+REFRESH_ALL_LIVE_QUERY = REFRESH_QUERY.format(aqi_where='WHERE date >= %s', city_where='')
+REFRESH_CITY_LIVE_QUERY = REFRESH_QUERY.format(aqi_where='WHERE city_id = %s AND date >= %s',
+                                               city_where='WHERE c.city_id = %s')
+
+# Readings of the archived months per city, from the cube (database/create_cube.sql)
+ARCHIVED_COUNTS_QUERY = """
+    SELECT city_id, CAST(SUM(aqi_count) AS SIGNED) AS reading_count,
+           MIN(year * 100 + month) AS first_month, MAX(year * 100 + month) AS last_month
+    FROM aqi_cube_city
+    WHERE year * 100 + month < %s {city_where}
+    GROUP BY city_id
+"""
+ARCHIVED_COUNTS_ALL_QUERY = ARCHIVED_COUNTS_QUERY.format(city_where='')
+ARCHIVED_COUNTS_CITY_QUERY = ARCHIVED_COUNTS_QUERY.format(city_where='AND city_id = %s')
+
+# Archived months precede every live row counted by the LIVE refresh, so the
+# first reading is always archived and the last one only when nothing is live
+ADD_ARCHIVED_QUERY = """
+    UPDATE city_stats SET
+        reading_count = reading_count + %s,
+        first_reading_date = %s,
+        last_aqi = IF(last_reading_date IS NULL, %s, last_aqi),
+        last_reading_date = COALESCE(last_reading_date, %s)
+    WHERE city_id = %s
+"""
+
+# MySQL applies SET assignments left to right, so last_aqi is decided before
+# last_reading_date moves; a reading for an older day only widens the range
+RECORD_READING_QUERY = """
+    INSERT INTO city_stats (city_id, reading_count, first_reading_date, last_reading_date, last_aqi)
+    VALUES (%s, 1, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        reading_count = reading_count + 1,
+        last_aqi = IF(last_reading_date IS NULL OR VALUES(last_reading_date) >= last_reading_date,
+                      VALUES(last_aqi), last_aqi),
+        first_reading_date = LEAST(COALESCE(first_reading_date, VALUES(first_reading_date)),
+                                   VALUES(first_reading_date)),
+        last_reading_date = GREATEST(COALESCE(last_reading_date, VALUES(last_reading_date)),
+                                     VALUES(last_reading_date))
+"""
+
+# A corrected value only matters if it is for the latest day
+READING_UPDATED_QUERY = """
+    UPDATE city_stats SET last_aqi = %s
+    WHERE city_id = %s AND last_reading_date = %s
+"""
+
+STATION_COUNTS_QUERY = """
+    UPDATE city_stats cs
+    LEFT JOIN (SELECT city_id, COUNT(*) AS station_count FROM stations GROUP BY city_id) s
+           ON s.city_id = cs.city_id
+    SET cs.station_count = COALESCE(s.station_count, 0)
+"""
+
+
+def record_reading(city_id, date, aqi_value):
+    """Count a newly inserted AQI reading"""
+    execute_query(RECORD_READING_QUERY, (city_id, date, date, int(round(float(aqi_value)))))
+
+
+def reading_updated(city_id, date, aqi_value):
+    """Apply a corrected AQI value for an existing reading"""
+    execute_query(READING_UPDATED_QUERY, (int(round(float(aqi_value))), city_id, date))
+
+
+def refresh_station_counts():
+    """Recount stations for every city (after a station is added, moved or deleted)"""
+    execute_query(STATION_COUNTS_QUERY)
+
+
+def _month_readings(month_number, city_ids):
+    """Archived aqi rows of one month (YYYYMM) for the given cities"""
+    import archive
+
+    month = date(month_number // 100, month_number % 100, 1)
+    frame = archive.read_range('aqi', month, archive.month_start(month, 1), city_id=list(city_ids))
+    return frame[frame['aqi_value'].notna()]
+
+
+def archived_totals(city_id, boundary):
+    """
+    Reading count, first and last reading of each city's archived months
+
+    Args:
+        city_id: One city, or None for all
+        boundary: archive.archived_through('aqi')
+
+    Returns:
+        List of (reading_count, first_date, last_aqi, last_date, city_id)
+        tuples in ADD_ARCHIVED_QUERY order; None if the cube could not be read
+    """
+    month = boundary.year * 100 + boundary.month
+    if city_id is None:
+        rows = execute_query(ARCHIVED_COUNTS_ALL_QUERY, (month,), fetch=True)
+    else:
+        rows = execute_query(ARCHIVED_COUNTS_CITY_QUERY, (month, city_id), fetch=True)
+    if rows is None:
+        return None
+
+    # Only the first and last archived month of each city are read from disk
+    firsts, lasts = {}, {}
+    for row in rows:
+        firsts.setdefault(row['first_month'], []).append(row['city_id'])
+        lasts.setdefault(row['last_month'], []).append(row['city_id'])
+
+    first_dates, last_readings = {}, {}
+    for month_number, city_ids in firsts.items():
+        readings = _month_readings(month_number, city_ids)
+        first_dates.update(readings.groupby('city_id')['date'].min().items())
+    for month_number, city_ids in lasts.items():
+        readings = _month_readings(month_number, city_ids).sort_values(['date', 'aqi_id'])
+        for city, last in readings.groupby('city_id').tail(1).set_index('city_id').iterrows():
+            last_readings[city] = (int(round(float(last['aqi_value']))), last['date'].date())
+
+    totals = []
+    for row in rows:
+        city = row['city_id']
+        if city not in first_dates or city not in last_readings:
+            continue
+        last_aqi, last_date = last_readings[city]
+        totals.append((int(row['reading_count']), first_dates[city].date(), last_aqi, last_date, city))
+    return totals
+
+
+def refresh(city_id=None):
+    """Recompute one city's row (or all rows) from stations, aqi and the archived months"""
+    import archive
+
+    boundary = archive.archived_through('aqi')
+    if boundary is None:
+        if city_id is None:
+            execute_query(REFRESH_ALL_QUERY)
+        else:
+            execute_query(REFRESH_CITY_QUERY, (city_id, city_id))
+        return
+
+    totals = archived_totals(city_id, boundary)
+    if totals is None:
+        logger.error("❌ city_stats refresh failed: could not read the archived months from the cube")
+        return
+
+    try:
+        with get_db_connection() as connection:
+            cursor = connection.cursor()
+            connection.start_transaction()
+            if city_id is None:
+                cursor.execute(REFRESH_ALL_LIVE_QUERY, (boundary,))
+            else:
+                cursor.execute(REFRESH_CITY_LIVE_QUERY, (city_id, boundary, city_id))
+            if totals:
+                cursor.executemany(ADD_ARCHIVED_QUERY, totals)
+            connection.commit()
+            cursor.close()
+    except Exception as e:
+        logger.error(f"❌ city_stats refresh failed: {e}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    refresh()
+    logger.info("✅ city_stats rebuilt")
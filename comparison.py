@@ -0,0 +1,259 @@
+"""
+City Comparison Module
+Aligned AQI and pollutant series of many cities for /api/v1/compare. Daily
+series come from one grouped query over aqi and pollutants (plus the
+archived months, aggregated the same way in pandas); monthly series come
+from the city cuboid of the AQI cube. Either way the rows are scattered
+into a cities x periods matrix per measure with NumPy, and the per-city
+summary statistics are computed across those matrices in one pass.
+"""
+
+import logging
+import warnings
+from datetime import date, timedelta
+
+import numpy as np
+
+from config import Config
+from database import execute_query
+import cube
+import exposure
+
+logger = logging.getLogger(__name__)
+
+POLLUTANTS = ('pm25', 'pm10', 'o3', 'no2', 'so2', 'co')
+MEASURES = ('aqi',) + POLLUTANTS
+INTERVALS = ('day', 'month')
+
+# Station-less readings pair with the city's station-less pollutant row, as in the cube
+DAILY_QUERY = """
+    SELECT a.city_id, a.date, AVG(a.aqi_value) AS aqi, {pollutants}
+    FROM aqi a
+    LEFT JOIN pollutants p
+           ON p.city_id = a.city_id AND p.date = a.date AND p.station_id <=> a.station_id
+    WHERE a.city_id IN ({cities}) AND a.date >= %s AND a.date < %s
+    GROUP BY a.city_id, a.date
+"""
+
+
+def _archived_daily(city_ids, start, end):
+    """
+    Daily means of the archived part of the range, read through
+    archive.read_range() so rows written to archived months count too
+
+    Returns:
+        Tuple (frame or None, live_start) - the grouped query covers live_start to end
+    """
+    import archive
+
+    boundaries = [archive.archived_through(table) for table in ('aqi', 'pollutants')]
+    boundary = max((day for day in boundaries if day), default=None)
+    if not boundary or start >= boundary:
+        return None, start
+    live_start = min(end, boundary)
+
+    aqi = archive.read_range('aqi', start, live_start, city_id=list(city_ids))
+    if aqi.empty:
+        return None, live_start
+    pollutants = archive.read_range('pollutants', start, live_start, city_id=list(city_ids))
+
+    keys = ['city_id', 'station_id', 'date']
+    for frame in (aqi, pollutants):
+        frame['station_id'] = frame['station_id'].fillna(0)
+    merged = aqi.merge(pollutants[keys + list(POLLUTANTS)].drop_duplicates(keys, keep='last'), on=keys, how='left')
+    daily = merged.rename(columns={'aqi_value': 'aqi'}).groupby(['city_id', 'date'])[list(MEASURES)].mean()
+    return daily.reset_index(), live_start
+
+
+def daily_rows(city_ids, start, end):
+    """Long frame city_id, period (datetime64), measures... of daily city means"""
+    import pandas as pd
+
+    archived, live_start = _archived_daily(city_ids, start, end)
+    frames = [archived] if archived is not None else []
+
+    if live_start < end:
+        query = DAILY_QUERY.format(pollutants=', '.join(f'AVG(p.{name}) AS {name}' for name in POLLUTANTS),
+                                   cities=', '.join(['%s'] * len(city_ids)))
+        rows = execute_query(query, tuple(city_ids) + (live_start, end), fetch=True)
+        if rows is None:
+            return None
+        frames.append(pd.DataFrame(rows, columns=['city_id', 'date'] + list(MEASURES)))
+
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['city_id', 'date'] + list(MEASURES))
+    frame['period'] = pd.to_datetime(frame['date'])
+    return frame
+
+
+def monthly_rows(city_ids, start, end):
+    """Long frame city_id, period (month start), measures... from the cube"""
+    import pandas as pd
+
+    result = cube.query(['city', 'year', 'month'],
+                        {'city': list(city_ids), 'year': list(range(start.year, end.year + 1))}, MEASURES)
+    if result is None:
+        return None
+    frame = pd.DataFrame([
+        dict({'city_id': row['city_id'], 'period': pd.Timestamp(row['year'], row['month'], 1)},
+             **{name: row[name]['mean'] for name in MEASURES})
+        for row in result['rows']
+    ], columns=['city_id', 'period'] + list(MEASURES))
+    return frame
+
+
+def _align(frame, city_ids, axis, unit):
+    """Scatter the long rows into one (cities x periods) float matrix per measure"""
+    import pandas as pd
+
+    positions = {city_id: index for index, city_id in enumerate(city_ids)}
+    periods = frame['period'].to_numpy(dtype=f'datetime64[{unit}]')
+    columns = ((periods - axis[0]) // np.timedelta64(1, unit)).astype(np.int64)
+    rows = frame['city_id'].map(positions).to_numpy()
+    inside = (columns >= 0) & (columns < len(axis)) & ~pd.isna(rows)
+    rows, columns = rows[inside].astype(np.int64), columns[inside]
+
+    matrices = {}
+    for name in MEASURES:
+        matrix = np.full((len(city_ids), len(axis)), np.nan)
+        matrix[rows, columns] = pd.to_numeric(frame[name], errors='coerce').to_numpy(dtype=float)[inside]
+        matrices[name] = matrix
+    return matrices
+
+
+def _summaries(matrices):
+    """Per-city statistics of every measure, computed across the matrices at once"""
+    summaries = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # All-NaN rows (cities without data)
+        for name, matrix in matrices.items():
+            present = ~np.isnan(matrix)
+            count = present.sum(axis=1)
+            first = np.where(present.any(axis=1), present.argmax(axis=1), 0)
+            last = matrix.shape[1] - 1 - np.where(present.any(axis=1), present[:, ::-1].argmax(axis=1), 0)
+            rows = np.arange(matrix.shape[0])
+            summaries[name] = {
+                'count': count,
+                'mean': np.nanmean(matrix, axis=1),
+                'min': np.nanmin(matrix, axis=1),
+                'max': np.nanmax(matrix, axis=1),
+                'p90': np.nanpercentile(matrix, 90, axis=1),
+                'change': matrix[rows, last] - matrix[rows, first]
+            }
+            if name == 'aqi':
+                unhealthy = exposure.AQI_BREAKPOINTS[exposure.UNHEALTHY_CATEGORY - 1]
+                summaries[name]['periods_unhealthy'] = (np.nan_to_num(matrix, nan=0) > unhealthy).sum(axis=1)
+    return summaries
+
+
+def _value(value, digits=2):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def compare(city_ids, start, end, interval='day'):
+    """
+    Aligned series and summary statistics for several cities
+
+    Args:
+        city_ids: City IDs in output order
+        start, end: Date range, end exclusive
+        interval: 'day' or 'month'
+
+    Returns:
+        Dict of the period axis, one list per city per measure (None where a
+        city has no data) and per-city summaries; None if the data could not
+        be read
+    """
+    if interval == 'month':
+        start = start.replace(day=1)
+        axis = np.arange(np.datetime64(start, 'M'), np.datetime64(end - timedelta(days=1), 'M') + 1)
+        frame = monthly_rows(city_ids, start, end)
+        unit = 'M'
+    else:
+        axis = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D'))
+        frame = daily_rows(city_ids, start, end)
+        unit = 'D'
+    if frame is None:
+        return None
+
+    matrices = _align(frame, city_ids, axis, unit)
+    summaries = _summaries(matrices)
+
+    import city_index
+    index = city_index.get_index()
+    names = {city_id: city['city_name'] for city_id, city in index.cities.items()} if index else {}
+
+    means = summaries['aqi']['mean']
+    order = np.argsort(np.where(np.isnan(means), np.inf, means), kind='stable')
+    ranks = np.empty(len(city_ids), dtype=np.int64)
+    ranks[order] = np.arange(1, len(city_ids) + 1)
+
+    cities = []
+    for position, city_id in enumerate(city_ids):
+        city = {'city_id': city_id, 'city_name': names.get(city_id), 'rank_by_mean_aqi': int(ranks[position])}
+        for name, stats in summaries.items():
+            city[name] = {key: (int(values[position]) if key in ('count', 'periods_unhealthy')
+                                else _value(values[position]))
+                          for key, values in stats.items()}
+        cities.append(city)
+
+    return {
+        'interval': interval,
+        'from': str(start),
+        'to': str(end - timedelta(days=1)),
+        'periods': [str(period) for period in axis],
+        'cities': cities,
+        'series': {
+            name: [[_value(value, 1) for value in row] for row in matrix]
+            for name, matrix in matrices.items()
+        }
+    }
+
+
+def parse_request(args, today=None):
+    """
+    City IDs, range and interval of a /api/v1/compare query string
+
+    ?cities= takes IDs or names (resolved through the city index); ?from and
+    ?to are inclusive YYYY-MM-DD dates (default: the last 90 days).
+
+    Raises:
+        ValueError with a message for the client
+    """
+    import city_index
+
+    city_ids = []
+    for item in (part.strip() for part in args.get('cities', '').split(',')):
+        if not item:
+            continue
+        if item.isdigit():
+            city_id = int(item)
+        else:
+            match = city_index.resolve(item)
+            if match is None:
+                raise ValueError(f'Unknown city {item}')
+            city_id = match['city_id']
+        if city_id not in city_ids:
+            city_ids.append(city_id)
+    if not city_ids:
+        raise ValueError('cities is required (comma-separated IDs or names)')
+    if len(city_ids) > Config.COMPARE_MAX_CITIES:
+        raise ValueError(f'At most {Config.COMPARE_MAX_CITIES} cities can be compared')
+
+    today = today or date.today()
+    try:
+        last = date.fromisoformat(args['to']) if args.get('to') else today
+        start = date.fromisoformat(args['from']) if args.get('from') else last - timedelta(days=89)
+    except ValueError:
+        raise ValueError('from and to must be YYYY-MM-DD dates')
+    end = last + timedelta(days=1)
+    if start >= end:
+        raise ValueError('from must not be after to')
+
+    interval = args.get('interval') or ('day' if (end - start).days <= Config.COMPARE_MAX_DAYS else 'month')
+    if interval not in INTERVALS:
+        raise ValueError(f"interval must be one of {', '.join(INTERVALS)}")
+    if interval == 'day' and (end - start).days > Config.COMPARE_MAX_DAYS:
+        raise ValueError(f'Daily series cover at most {Config.COMPARE_MAX_DAYS} days; use interval=month')
+    if interval == 'month' and (end - start).days > Config.COMPARE_MAX_MONTHS * 31:
+        raise ValueError(f'Monthly series cover at most {Config.COMPARE_MAX_MONTHS} months')
+    return city_ids, start, end, interval
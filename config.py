@@ -18,21 +18,123 @@ class Config:
     
     # MySQL Database Configuration
     DB_CONFIG = {
-        'host': 'localhost',
-        'user': 'root',           # Change to your MySQL username
-        'password': '2630',           # Change to your MySQL password
-        'database': 'dcds_project',
+        'host': os.environ.get('DB_HOST', 'localhost'),
+        'port': int(os.environ.get('DB_PORT', 3306)),
+        'user': os.environ.get('DB_USER', 'root'),           # Change to your MySQL username
+        'password': os.environ.get('DB_PASSWORD', '2630'),   # Change to your MySQL password
+        'database': os.environ.get('DB_NAME', 'dcds_project'),
         'charset': 'utf8mb4',
         'autocommit': True
     }
     
+    # Read Replicas: DB_REPLICAS="replica1:3306,replica2:3306" (same user/password/database as the primary)
+    DB_REPLICAS = [r.strip() for r in os.environ.get('DB_REPLICAS', '').split(',') if r.strip()]
+    REPLICA_MAX_LAG = int(os.environ.get('REPLICA_MAX_LAG', 5))  # Seconds behind before a replica is ejected
+    REPLICA_CHECK_INTERVAL = 5  # Seconds between replication lag checks (background thread per process)
+    READ_YOUR_WRITES_WINDOW = 5  # Seconds reads stay on the primary after a write in the same session
+    
+    # Prepared Statement Cache (database.py): statements kept prepared per pooled connection, 0 disables
+    STATEMENT_CACHE_SIZE = int(os.environ.get('STATEMENT_CACHE_SIZE', 64))
+    
+    # Password Hashing Settings (credentials.py)
+    PASSWORD_HASH_ALGORITHM = os.environ.get('PASSWORD_HASH_ALGORITHM', 'bcrypt')  # bcrypt, pbkdf2 or scrypt
+    PASSWORD_HASH_COST = int(os.environ.get('PASSWORD_HASH_COST', 0))  # 0 = algorithm default (bcrypt 12 rounds)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', -1))  # Hashing processes per app worker, -1 = cores / gunicorn workers, 0 hashes inline
+    
     # Application Settings
     RECORDS_PER_PAGE = 10
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    DEV_SERVER_DEBUG = os.environ.get('FLASK_DEBUG', '1').lower() in ('1', 'true', 'yes')  # python app.py only
+    
+    # Instrumentation Settings (instrumentation.py)
+    SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD', 0.2))  # Seconds
+    SLOW_QUERY_MAX_ENTRIES = 200  # Distinct normalized statements kept
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # If set, /metrics requires ?token= or a Bearer header
+    
+    # Resampling Settings (resampling.py)
+    RESAMPLE_MAX_INTERPOLATION_GAP = 7  # Longest gap in days filled by interpolation
+    
+    # Partition Retention Settings (retention.py)
+    RETENTION_MONTHS = int(os.environ.get('RETENTION_MONTHS', 0))  # 0 keeps all months
+    PARTITION_MONTHS_AHEAD = 3  # Empty future partitions kept ready
+    RETENTION_ARCHIVE = True  # Exchange expired months into archive tables instead of dropping them
+    
+    # Cold-Storage Archive Settings (archive.py)
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive')
+    ARCHIVE_AFTER_MONTHS = int(os.environ.get('ARCHIVE_AFTER_MONTHS', 24))  # Months kept in MySQL
+    
+    # Precomputed Analytics Settings
+    HEALTH_ANALYTICS_CHECK_INTERVAL = 60  # Seconds between source change checks
+    
+    # Response Cache Settings (response_cache.py)
+    DATA_VERSION_CHECK_INTERVAL = 1  # Seconds between data_version re-reads
+    RESPONSE_CACHE_MAX_ENTRIES = 500
+    LIVE_DATA_TTL = 300  # Seconds a response embedding live API data stays cached
+    
+    # Request Coalescing Settings (singleflight.py)
+    SINGLEFLIGHT_WAIT_TIMEOUT = 30  # Seconds a request waits for an identical in-flight call before running its own
+    
+    # Page Fragment Cache Settings (page_cache.py)
+    PAGE_CACHE_MAX_ENTRIES = 200
+    PAGE_CACHE_TTL = 300  # Seconds; also catches changes made outside the app
+    
+    # City Search Index Settings (city_index.py)
+    CITY_INDEX_TTL = 300  # Seconds before the index is rebuilt even without writes
+    CITY_INDEX_MIN_SCORE = 0.3  # Weakest fuzzy match returned
+    AUTOCOMPLETE_MAX_RESULTS = 10
+
+    # Geospatial Index Settings (geo_index.py, /api/v1/aqi-grid)
+    GEO_INDEX_TTL = 300  # Seconds before the index is rebuilt even without writes
+    GEO_CELL_DEGREES = 0.5  # Bucket size of the station grid
+    NEAREST_STATIONS_MAX = 50
+    AQI_GRID_RESOLUTION = 50  # Default points per side of an interpolated grid
+    AQI_GRID_MAX_RESOLUTION = 200
+    AQI_GRID_IDW_POWER = 2
+    AQI_GRID_NEIGHBOURS = 8  # Nearest stations weighted per grid point
+    AQI_GRID_CACHE_SIZE = 32  # Interpolated grids kept (dropped on data changes)
+
+    # Background Job Settings (jobs.py, /api/v1/jobs)
+    JOB_RESULTS_DIR = os.environ.get('JOB_RESULTS_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'job_results')
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # Processes started by python jobs.py worker
+    JOB_POLL_INTERVAL = 1  # Seconds an idle worker waits before claiming again
+    JOB_HEARTBEAT_INTERVAL = 10  # Seconds between heartbeats of a running job
+    JOB_STALE_AFTER = 120  # Seconds without a heartbeat before a running job is re-queued
+    JOB_MAX_ATTEMPTS = 3
+    JOB_RESULT_TTL_HOURS = 24  # Result files kept for download
+
+    # AQI Cube Settings (cube.py, /api/v1/cube)
+    CUBE_MAX_ROWS = 10000  # Groups returned by one query
+    CUBE_REFRESH_INTERVAL = 30  # Seconds between dirty-month refreshes in the job workers
+
+    # City Comparison Settings (comparison.py, /api/v1/compare)
+    COMPARE_MAX_CITIES = 50
+    COMPARE_MAX_DAYS = 366  # Longer ranges default to monthly series
+    COMPARE_MAX_MONTHS = 120
+
+    # City Report Settings (report_builder.py, /reports/city/...)
+    REPORTS_DIR = os.environ.get('REPORTS_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports')
+
+    # Live Updates Settings (live_updates.py, /api/stream)
+    LIVE_QUEUE_SIZE = 100  # Events buffered per client before drops
+    LIVE_HISTORY_SIZE = 500  # Recent events replayed to reconnecting clients (Last-Event-ID)
+    LIVE_HEARTBEAT = 15  # Seconds between keep-alive comments
+    LIVE_RETRY_MS = 3000  # Client reconnect delay
+    # Streams per process: each holds a gthread thread, so the default leaves 8 of GUNICORN_THREADS for requests (0 = unlimited)
+    LIVE_MAX_SUBSCRIBERS = int(os.environ.get('LIVE_MAX_SUBSCRIBERS', max(1, int(os.environ.get('GUNICORN_THREADS', 32)) - 8)))
+    # Multi-process fan-out through live_events: without it a stream only sees writes made by its own process
+    # (not other gunicorn workers, job workers or synthetic_data.py); set 0 for a single-process dev server
+    LIVE_RELAY_ENABLED = os.environ.get('LIVE_RELAY_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    LIVE_RELAY_INTERVAL = 1  # Seconds between live_events polls (one poller per process)
+    
+    # Async API Tier Settings (asgi_api.py)
+    ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 20))
+    ASYNC_HTTP_MAX_CONNECTIONS = 100  # Concurrent OpenWeatherMap connections
     
     # OpenWeatherMap API Configuration
     # Get your free API key from: https://openweathermap.org/api
     OPENWEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY') or 'b8c0fc7b75cbbbaab9bf63fe4e49e7fd'  # Free demo key - replace with your own
-    OPENWEATHER_BASE_URL = 'https://api.openweathermap.org/data/2.5'
+    OPENWEATHER_BASE_URL = os.environ.get('OPENWEATHER_BASE_URL') or 'https://api.openweathermap.org/data/2.5'
+    OPENWEATHER_GEO_URL = os.environ.get('OPENWEATHER_GEO_URL') or 'http://api.openweathermap.org/geo/1.0'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file upload
     
     # File Upload Configuration
@@ -47,3 +149,12 @@ class Config:
     def get_db_config():
         """Returns database configuration dictionary"""
         return Config.DB_CONFIG
+    
+    @staticmethod
+    def get_replica_configs():
+        """Returns one connection dictionary per read replica in DB_REPLICAS"""
+        configs = []
+        for replica in Config.DB_REPLICAS:
+            host, _, port = replica.partition(':')
+            configs.append(dict(Config.DB_CONFIG, host=host, port=int(port or 3306)))
+        return configs
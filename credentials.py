@@ -0,0 +1,199 @@
+"""
+Credentials Module
+Password hashing with a configurable algorithm and cost
+(Config.PASSWORD_HASH_ALGORITHM / PASSWORD_HASH_COST), transparent rehashing
+of outdated hashes on login, and a small process pool that runs the
+CPU-bound hashing off the request threads. The pool caps how many cores a
+burst of logins can take, so other routes keep serving while it drains.
+It is started by wsgi.warm_up() in each gunicorn worker, before the request
+threads exist; anywhere else (the dev server, after the pool broke) hashing
+runs inline.
+
+Supported algorithms (stored formats):
+    bcrypt  - $2b$<cost>$...                     cost = log2 rounds
+    pbkdf2  - pbkdf2:sha256:<iterations>$...     cost = iterations (Werkzeug)
+    scrypt  - scrypt:<n>:8:1$...                 cost = N (Werkzeug)
+
+Hashes written by earlier versions (Werkzeug defaults) keep verifying and are
+upgraded the next time their user logs in.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from config import Config
+
+try:
+    import bcrypt
+except ImportError:  # bcrypt is optional; pbkdf2 / scrypt need only the standard library
+    bcrypt = None
+
+logger = logging.getLogger(__name__)
+
+ALGORITHMS = ('bcrypt', 'pbkdf2', 'scrypt')
+
+# Cost used when PASSWORD_HASH_COST is not set
+DEFAULT_COSTS = {
+    'bcrypt': 12,
+    'pbkdf2': 600000,
+    'scrypt': 32768
+}
+
+# bcrypt only looks at the first 72 bytes (bcrypt >= 5 refuses longer input)
+BCRYPT_MAX_BYTES = 72
+
+
+# ==================== Hashing (runs in the worker processes) ====================
+
+def hash_with(password, algorithm, cost):
+    """Hash a password with an explicit algorithm and cost"""
+    if algorithm == 'bcrypt':
+        if bcrypt is None:
+            raise RuntimeError("PASSWORD_HASH_ALGORITHM is bcrypt but the bcrypt package is not installed")
+        secret = password.encode('utf-8')[:BCRYPT_MAX_BYTES]
+        return bcrypt.hashpw(secret, bcrypt.gensalt(rounds=cost)).decode('ascii')
+    if algorithm == 'pbkdf2':
+        return generate_password_hash(password, method=f'pbkdf2:sha256:{cost}')
+    if algorithm == 'scrypt':
+        return generate_password_hash(password, method=f'scrypt:{cost}:8:1')
+    raise ValueError(f"Unknown password hash algorithm: {algorithm}")
+
+
+def hash_params(stored_hash):
+    """(algorithm, cost) a stored hash was made with, or (None, None) if unrecognized"""
+    try:
+        if stored_hash.startswith('$2'):
+            return 'bcrypt', int(stored_hash.split('$')[2])
+        method = stored_hash.split('$', 1)[0].split(':')
+        if method[0] == 'pbkdf2':
+            # Werkzeug omits the iterations only for very old hashes
+            return 'pbkdf2', int(method[2]) if len(method) > 2 else None
+        if method[0] == 'scrypt':
+            return 'scrypt', int(method[1]) if len(method) > 1 else None
+    except (IndexError, ValueError):
+        pass
+    return None, None
+
+
+def check_with(stored_hash, password):
+    """Verify a password against a hash of any supported format"""
+    if stored_hash.startswith('$2'):
+        if bcrypt is None:
+            logger.error("❌ bcrypt hash found but the bcrypt package is not installed")
+            return False
+        return bcrypt.checkpw(password.encode('utf-8')[:BCRYPT_MAX_BYTES], stored_hash.encode('ascii'))
+    return check_password_hash(stored_hash, password)
+
+
+def verify_and_rehash(stored_hash, password, algorithm, cost):
+    """
+    Check a password and, if it matches but the hash is outdated, hash it again
+
+    Returns:
+        Tuple (matches, new_hash or None)
+    """
+    if not stored_hash or not check_with(stored_hash, password):
+        return False, None
+    if hash_params(stored_hash) == (algorithm, cost):
+        return True, None
+    return True, hash_with(password, algorithm, cost)
+
+
+# ==================== Process Pool ====================
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def current_params():
+    """(algorithm, cost) new hashes are made with"""
+    algorithm = Config.PASSWORD_HASH_ALGORITHM
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"PASSWORD_HASH_ALGORITHM must be one of {ALGORITHMS}, not {algorithm!r}")
+    return algorithm, Config.PASSWORD_HASH_COST or DEFAULT_COSTS[algorithm]
+
+
+def pool_size():
+    """
+    Hashing processes per app worker
+
+    PASSWORD_HASH_WORKERS = -1 splits the cores between the gunicorn workers
+    (GUNICORN_WORKERS, default as in gunicorn.conf.py), so all pools together
+    do not oversubscribe the machine.
+    """
+    if Config.PASSWORD_HASH_WORKERS >= 0:
+        return Config.PASSWORD_HASH_WORKERS
+    cores = multiprocessing.cpu_count()
+    app_workers = int(os.environ.get('GUNICORN_WORKERS', cores * 2 + 1))
+    return max(1, cores // max(1, app_workers))
+
+
+def _run(function, *args):
+    """Run in the hashing pool, or in the calling thread if no pool was started"""
+    global _executor
+    executor = _executor
+    if executor is not None:
+        try:
+            return executor.submit(function, *args).result()
+        except BrokenProcessPool:
+            # Not recreated here: forking from a request thread of a threaded worker is unsafe
+            logger.warning("⚠️ Password hashing pool died, hashing inline from now on")
+            with _executor_lock:
+                if _executor is executor:
+                    _executor = None
+    return function(*args)
+
+
+def start_pool():
+    """
+    Start the hashing processes (wsgi.py warm-up, before the request threads start)
+
+    Returns:
+        Number of hashing processes (0 = hashing runs inline)
+    """
+    global _executor
+    size = pool_size()
+    if not size:
+        return 0
+    with _executor_lock:
+        if _executor is None:
+            # fork: spawn / forkserver children would re-import the main script (app.py).
+            # The forked workers only ever run the hash functions above.
+            context = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+            _executor = ProcessPoolExecutor(max_workers=size, mp_context=multiprocessing.get_context(context))
+        executor = _executor
+    executor.submit(hash_params, '').result()
+    return size
+
+
+def shutdown():
+    """Stop the hashing processes (tests, benchmarks, worker exit)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+
+# ==================== Public API ====================
+
+def hash_password(password):
+    """Hash a new password with the configured algorithm and cost"""
+    return _run(hash_with, password, *current_params())
+
+
+def verify_password(stored_hash, password):
+    """
+    Check a login attempt
+
+    Returns:
+        Tuple (matches, new_hash): new_hash is set when the stored hash uses an
+        outdated algorithm or cost and should be saved in its place
+    """
+    return _run(verify_and_rehash, stored_hash, password, *current_params())
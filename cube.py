@@ -0,0 +1,342 @@
+"""
+AQI Cube Module
+Precomputed aggregates of aqi and pollutants (database/create_cube.sql) over
+the dimensions city, station, year, month, weekday and AQI category, with
+count / sum / min / max per measure. /api/v1/cube answers slice (filter one
+dimension), dice (filter several) and roll-up (group by fewer dimensions)
+requests by re-aggregating the smallest cuboid that has every dimension a
+request involves - the raw tables are never read at query time.
+
+Write paths call mark_dirty() with the dates they touched; dirty months are
+recomputed (from archive.read_range(), so archived months stay correct) by
+the job workers every Config.CUBE_REFRESH_INTERVAL seconds, never on the
+request path. A MySQL named lock lets one process refresh at a time.
+
+Usage:
+    python cube.py              # recompute dirty months
+    python cube.py --rebuild    # recompute every month
+"""
+
+import argparse
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from config import Config
+from database import execute_query, get_db_connection
+import exposure
+
+logger = logging.getLogger(__name__)
+
+# Request name -> cube column
+DIMENSIONS = {
+    'city': 'city_id',
+    'station': 'station_id',
+    'year': 'year',
+    'month': 'month',
+    'weekday': 'weekday',
+    'category': 'aqi_category'
+}
+POLLUTANTS = ('pm25', 'pm10', 'o3', 'no2', 'so2', 'co')
+MEASURES = ('aqi',) + POLLUTANTS
+AGGREGATES = ('count', 'sum', 'min', 'max')
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# Smallest first: a query is served by the first cuboid holding all its dimensions
+CUBOIDS = (
+    ('aqi_cube_city', ('year', 'month', 'city', 'weekday', 'category')),
+    ('aqi_cube_station', ('year', 'month', 'city', 'station', 'weekday', 'category')),
+)
+
+MEASURE_COLUMNS = [f'{measure}_{aggregate}' for measure in MEASURES for aggregate in AGGREGATES]
+
+MARK_DIRTY_QUERY = """
+    INSERT INTO cube_dirty (month) VALUES {rows}
+    ON DUPLICATE KEY UPDATE marked_at = CURRENT_TIMESTAMP(6)
+"""
+
+# Every month the cube holds before a date (retention dropped its rows)
+MARK_DIRTY_BEFORE_QUERY = """
+    INSERT INTO cube_dirty (month)
+    SELECT DISTINCT CONCAT(year, '-', LPAD(month, 2, '0')) FROM aqi_cube_city
+    WHERE year * 100 + month < %s
+    ON DUPLICATE KEY UPDATE marked_at = CURRENT_TIMESTAMP(6)
+"""
+
+# MySQL named lock held while refreshing, shared by every process on the database
+REFRESH_LOCK = 'dcds_cube_refresh'
+
+
+def month_key(day):
+    """date / datetime / 'YYYY-MM-DD' -> 'YYYY-MM'"""
+    return str(day)[:7]
+
+
+def mark_dirty(dates, cursor=None):
+    """
+    Queue the months of the given dates for recomputation
+
+    Args:
+        dates: Iterable of dates (or YYYY-MM-DD strings) whose rows changed
+        cursor: Run inside the caller's transaction instead of execute_query
+    """
+    months = sorted({month_key(day) for day in dates})
+    if not months:
+        return
+    query = MARK_DIRTY_QUERY.format(rows=', '.join(['(%s)'] * len(months)))
+    if cursor is not None:
+        cursor.execute(query, months)
+    else:
+        execute_query(query, tuple(months))
+
+
+def mark_dirty_before(day):
+    """Queue every cube month before day's month (rows removed wholesale, e.g. by retention.py)"""
+    execute_query(MARK_DIRTY_BEFORE_QUERY, (day.year * 100 + day.month,))
+
+
+# ==================== Building ====================
+
+def _reduce(frame, keys):
+    reduced = frame.groupby(keys)[list(MEASURES)].agg(list(AGGREGATES))
+    reduced.columns = [f'{measure}_{aggregate}' for measure, aggregate in reduced.columns]
+    return reduced.reset_index()[list(keys) + MEASURE_COLUMNS]
+
+
+def aggregate_month(aqi, pollutants):
+    """
+    Both cuboids of one month from raw rows
+
+    Args:
+        aqi, pollutants: archive.read_range() frames of the month
+
+    Returns:
+        {cuboid table: DataFrame of key columns + MEASURE_COLUMNS}
+    """
+    readings = aqi.loc[aqi['aqi_value'].notna(), ['city_id', 'station_id', 'date', 'aqi_value']].copy()
+    readings['station_id'] = readings['station_id'].fillna(0).astype('int64')
+
+    # A reading's pollutants share its station (or its city, for station-less rows) and date
+    values = pollutants[['city_id', 'station_id', 'date'] + list(POLLUTANTS)].copy()
+    values['station_id'] = values['station_id'].fillna(0).astype('int64')
+    values = values.drop_duplicates(['city_id', 'station_id', 'date'], keep='last')
+
+    merged = readings.merge(values, on=['city_id', 'station_id', 'date'], how='left')
+    merged = merged.rename(columns={'aqi_value': 'aqi'})
+    merged['year'] = merged['date'].dt.year
+    merged['month'] = merged['date'].dt.month
+    merged['weekday'] = merged['date'].dt.weekday
+    merged['aqi_category'] = np.digitize(merged['aqi'].to_numpy(), exposure.AQI_BREAKPOINTS, right=True)
+
+    return {
+        table: _reduce(merged, [DIMENSIONS[name] for name in dimensions])
+        for table, dimensions in CUBOIDS
+    }
+
+
+def refresh_month(month):
+    """Recompute one month ('YYYY-MM') of both cuboids in one transaction"""
+    import archive
+
+    start = datetime.strptime(month, '%Y-%m').date()
+    end = archive.month_start(start, 1)
+    cuboids = aggregate_month(archive.read_range('aqi', start, end),
+                              archive.read_range('pollutants', start, end))
+
+    year, month_number = start.year, start.month
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        for table, frame in cuboids.items():
+            cursor.execute(f"DELETE FROM {table} WHERE year = %s AND month = %s", (year, month_number))
+            if len(frame):
+                columns = list(frame.columns)
+                rows = frame.astype(object).where(frame.notna(), None).values.tolist()
+                cursor.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                    rows
+                )
+        connection.commit()
+        cursor.close()
+    return {table: len(frame) for table, frame in cuboids.items()}
+
+
+def refresh_dirty():
+    """
+    Recompute every dirty month
+
+    A month marked again while it is being recomputed stays dirty (its
+    marked_at moved past the value read here) and is picked up next time.
+    Runs under the REFRESH_LOCK named lock; if another process holds it,
+    returns at once.
+
+    Returns:
+        Number of months recomputed (0 if another process is refreshing)
+    """
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (REFRESH_LOCK,))
+        if not cursor.fetchone()[0]:
+            cursor.close()
+            return 0
+        try:
+            dirty = execute_query("SELECT month, marked_at FROM cube_dirty ORDER BY month", fetch=True) or []
+            for row in dirty:
+                counts = refresh_month(row['month'])
+                execute_query("DELETE FROM cube_dirty WHERE month = %s AND marked_at <= %s",
+                              (row['month'], row['marked_at']))
+                logger.info(f"✅ Cube month {row['month']} recomputed {counts}")
+            if dirty:
+                # Cached /api/v1/cube and /api/v1/compare responses hold the old aggregates
+                import response_cache
+                response_cache.bump_data_version()
+            return len(dirty)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (REFRESH_LOCK,))
+            cursor.fetchone()
+            cursor.close()
+
+
+def rebuild():
+    """Mark every month with readings (live or archived) dirty and recompute them all"""
+    import archive
+
+    months = {row['month'] for row in execute_query(
+        "SELECT DISTINCT DATE_FORMAT(date, '%Y-%m') AS month FROM aqi", fetch=True) or []}
+    months |= set(archive.load_manifest().get('aqi', {}).get('months', {}))
+    execute_query("DELETE FROM aqi_cube_station")
+    execute_query("DELETE FROM aqi_cube_city")
+    mark_dirty(f'{month}-01' for month in months)
+    return refresh_dirty()
+
+
+# ==================== Queries ====================
+
+def _parse_values(name, text):
+    """'1,3,5-7' -> [1, 3, 5, 6, 7]; categories also by name"""
+    values = []
+    for part in (p.strip() for p in text.split(',')):
+        if not part:
+            continue
+        if name == 'category' and part in exposure.AQI_CATEGORIES:
+            values.append(exposure.AQI_CATEGORIES.index(part))
+        elif '-' in part:
+            low, high = (int(bound) for bound in part.split('-', 1))
+            if high < low or high - low > 1000:
+                raise ValueError(f'Invalid range {part} for {name}')
+            values.extend(range(low, high + 1))
+        else:
+            values.append(int(part))
+    return values
+
+
+def parse_request(args):
+    """
+    Group-by dimensions, measures and filters of a /api/v1/cube query string
+
+    Raises:
+        ValueError on unknown dimensions / measures or malformed values
+    """
+    group_by = [name.strip() for name in args.get('by', '').split(',') if name.strip()]
+    measures = [name.strip() for name in args.get('measures', 'aqi').split(',') if name.strip()]
+    unknown = [name for name in group_by if name not in DIMENSIONS]
+    if unknown or len(set(group_by)) != len(group_by):
+        raise ValueError(f"by must be distinct dimensions out of {', '.join(DIMENSIONS)}")
+    if not measures or any(name not in MEASURES for name in measures):
+        raise ValueError(f"measures must be out of {', '.join(MEASURES)}")
+
+    filters = {}
+    for name in DIMENSIONS:
+        if args.get(name):
+            try:
+                filters[name] = _parse_values(name, args[name])
+            except ValueError:
+                raise ValueError(f'{name} must be a comma-separated list of values or ranges')
+    return group_by, measures, filters
+
+
+def query(group_by, filters, measures=('aqi',)):
+    """
+    Re-aggregate the cube
+
+    Args:
+        group_by: Dimension names kept in the result (empty = grand total)
+        filters: {dimension name: allowed values}
+        measures: Measure names to return
+
+    Returns:
+        Dict with the cuboid used and one row per group; None if the cube
+        could not be read
+    """
+    involved = set(group_by) | set(filters)
+    table = next(name for name, dimensions in CUBOIDS if involved <= set(dimensions))
+    keys = [DIMENSIONS[name] for name in group_by]
+
+    select = list(keys)
+    for measure in measures:
+        select += [f'SUM({measure}_count) AS {measure}_count', f'SUM({measure}_sum) AS {measure}_sum',
+                   f'MIN({measure}_min) AS {measure}_min', f'MAX({measure}_max) AS {measure}_max']
+    where, params = [], []
+    for name, values in filters.items():
+        if not values:
+            where.append('FALSE')
+            continue
+        where.append(f"{DIMENSIONS[name]} IN ({', '.join(['%s'] * len(values))})")
+        params.extend(values)
+
+    sql = f"SELECT {', '.join(select)} FROM {table}"
+    if where:
+        sql += f" WHERE {' AND '.join(where)}"
+    if keys:
+        sql += f" GROUP BY {', '.join(keys)} ORDER BY {', '.join(keys)}"
+    sql += f" LIMIT {Config.CUBE_MAX_ROWS + 1}"
+
+    rows = execute_query(sql, tuple(params), fetch=True)
+    if rows is None:
+        return None
+
+    import city_index
+    index = city_index.get_index()
+    city_names = {city_id: city['city_name'] for city_id, city in index.cities.items()} if index else {}
+
+    result_rows = []
+    for row in rows[:Config.CUBE_MAX_ROWS]:
+        if not keys and not row[f'{measures[0]}_count']:
+            break  # Grand total over no rows
+        out = {column: row[column] for column in keys}
+        if 'city_id' in out:
+            out['city_name'] = city_names.get(out['city_id'])
+        if 'aqi_category' in out:
+            out['aqi_category'] = exposure.AQI_CATEGORIES[out['aqi_category']]
+        if 'weekday' in out:
+            out['weekday_name'] = WEEKDAYS[out['weekday']]
+        for measure in measures:
+            count = int(row[f'{measure}_count'] or 0)
+            total = float(row[f'{measure}_sum'] or 0)
+            out[measure] = {
+                'count': count,
+                'sum': round(total, 2),
+                'min': None if row[f'{measure}_min'] is None else float(row[f'{measure}_min']),
+                'max': None if row[f'{measure}_max'] is None else float(row[f'{measure}_max']),
+                'mean': round(total / count, 2) if count else None
+            }
+        result_rows.append(out)
+
+    return {
+        'group_by': list(group_by),
+        'filters': {name: values for name, values in filters.items()},
+        'measures': list(measures),
+        'cuboid': table,
+        'truncated': len(rows) > Config.CUBE_MAX_ROWS,
+        'rows': result_rows
+    }
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Maintain the AQI cube')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute every month')
+    args = parser.parse_args()
+
+    months = rebuild() if args.rebuild else refresh_dirty()
+    logger.info(f"✅ {months} cube months recomputed")
@@ -5,47 +5,351 @@ Provides efficient database connection management with pooling and error handlin
 
 import mysql.connector
 from mysql.connector import pooling, Error
+from mysql.connector.errors import PoolError
 from config import Config
+import contextvars
+import itertools
 import logging
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from contextlib import contextmanager
 
+import instrumentation
+
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=Config.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
-# Create connection pool
-try:
-    db_config = Config.get_db_config()
-    connection_pool = pooling.MySQLConnectionPool(
-        pool_name="dcds_pool",
-        pool_size=10,  # Maintain 10 connections in the pool
-        pool_reset_session=True,
-        **db_config
-    )
-    logger.info("✅ Database connection pool created successfully")
-except Error as e:
-    logger.error(f"❌ Error creating connection pool: {e}")
+READ_QUERY = re.compile(r'^\s*(?:/\*.*?\*/\s*)*\(?\s*(SELECT|WITH|SHOW|EXPLAIN|DESCRIBE)\b', re.IGNORECASE | re.DOTALL)
+PRIMARY_ONLY = re.compile(r'\bFOR\s+UPDATE\b|\bLOCK\s+IN\s+SHARE\s+MODE\b|\bGET_LOCK\s*\(|\bLAST_INSERT_ID\s*\(',
+                          re.IGNORECASE)
+# Statements execute_query runs as cached server-side prepared statements
+PREPARABLE_QUERY = re.compile(r'^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _create_pool(name, config):
+    """Connection pool for one server, or None if it cannot be reached"""
+    try:
+        pool = pooling.MySQLConnectionPool(
+            pool_name=name,
+            pool_size=10,  # Maintain 10 connections in the pool
+            # Resetting the session would deallocate the cached prepared statements;
+            # get_db_connection() ends open transactions itself instead
+            pool_reset_session=not Config.STATEMENT_CACHE_SIZE,
+            **config
+        )
+        logger.info(f"✅ Database connection pool {name} created successfully")
+        return pool
+    except Error as e:
+        logger.error(f"❌ Error creating connection pool {name}: {e}")
+        return None
+
+
+# Primary connection pool, created on first use in each process: a pool made
+# before a fork (gunicorn --preload) would share its sockets with every worker
+connection_pool = None
+_pool_lock = threading.Lock()
+_pool_retry_at = 0.0
+
+# Seconds before creating the pool is retried after the server was unreachable
+POOL_RETRY_INTERVAL = 30
+
+
+def get_pool():
+    """This process's primary pool (None while the server is unreachable)"""
+    global connection_pool, _pool_retry_at
+    if connection_pool is None and time.monotonic() >= _pool_retry_at:
+        with _pool_lock:
+            if connection_pool is None and time.monotonic() >= _pool_retry_at:
+                connection_pool = _create_pool("dcds_pool", Config.get_db_config())
+                if connection_pool is None:
+                    _pool_retry_at = time.monotonic() + POOL_RETRY_INTERVAL
+    return connection_pool
+
+
+def init_pools():
+    """
+    Create this process's pool now instead of on the first query and start
+    the replica health monitor (gunicorn post_fork hook)
+    """
+    start_replica_monitor()
+    return get_pool() is not None
+
+
+# ==================== Read Replicas ====================
+
+class Replica:
+    """One read replica: its pool plus the result of the last lag check"""
+
+    def __init__(self, index, config):
+        self.name = f"{config['host']}:{config.get('port', 3306)}"
+        self.pool_name = f"dcds_replica_{index}"
+        self.config = config
+        self.pool = None
+        self.healthy = False
+        self.lag = None
+        self.checked_at = 0.0
+
+    def check(self):
+        """Refresh health from the replica's replication lag (creates the pool on first use)"""
+        self.checked_at = time.monotonic()
+        if self.pool is None:
+            self.pool = _create_pool(self.pool_name, self.config)
+            if self.pool is None:
+                self.healthy = False
+                return
+
+        try:
+            connection = self.pool.get_connection()
+            try:
+                cursor = connection.cursor(dictionary=True)
+                try:
+                    cursor.execute("SHOW REPLICA STATUS")
+                except Error:
+                    # MySQL < 8.0.22 / MariaDB
+                    cursor.execute("SHOW SLAVE STATUS")
+                status = cursor.fetchone()
+                cursor.close()
+            finally:
+                connection.close()
+        except Error as e:
+            self._set_health(False, None, f"unreachable ({e})")
+            return
+
+        if status is None:
+            # Not replicating at all, e.g. a second local instance standing in for a replica
+            self._set_health(True, 0, None)
+            return
+
+        lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        if lag is None:
+            self._set_health(False, None, "replication stopped")
+        elif lag > Config.REPLICA_MAX_LAG:
+            self._set_health(False, lag, f"lagging {lag}s")
+        else:
+            self._set_health(True, lag, None)
+
+    def reset(self):
+        """Forget the pool and health state (a forked child must not use the parent's sockets)"""
+        self.pool = None
+        self.healthy = False
+        self.lag = None
+        self.checked_at = 0.0
+
+    def _set_health(self, healthy, lag, reason):
+        if healthy != self.healthy:
+            if healthy:
+                logger.info(f"✅ Replica {self.name} back in rotation (lag {lag}s)")
+            else:
+                logger.warning(f"⚠️ Replica {self.name} ejected: {reason}")
+        self.healthy = healthy
+        self.lag = lag
+
+
+replicas = [Replica(index, config) for index, config in enumerate(Config.get_replica_configs())]
+_replica_lock = threading.Lock()
+_replica_cursor = itertools.count()
+_replica_monitor = None
+
+# Time of this context's last write; reads within READ_YOUR_WRITES_WINDOW of it go to the primary
+_last_write = contextvars.ContextVar('db_last_write', default=0.0)
+
+
+def _monitor_replicas():
+    """Background loop re-checking every replica each REPLICA_CHECK_INTERVAL"""
+    while True:
+        for replica in replicas:
+            try:
+                replica.check()
+            except Exception as e:
+                logger.warning(f"⚠️ Replica {replica.name} check failed: {e}")
+        time.sleep(Config.REPLICA_CHECK_INTERVAL)
+
+
+def start_replica_monitor():
+    """
+    Start this process's replica health thread once (no-op without replicas)
+
+    Lag checks and pool creation can block for a connect timeout, so they
+    never run on a request thread; until the first check completes, reads
+    go to the primary.
+    """
+    global _replica_monitor
+    if not replicas:
+        return
+    with _replica_lock:
+        if _replica_monitor is None:
+            _replica_monitor = threading.Thread(target=_monitor_replicas, name='replica-monitor', daemon=True)
+            _replica_monitor.start()
+
+
+def _pick_replica():
+    """A healthy replica (round robin), or None to use the primary"""
+    if not replicas or time.time() - _last_write.get() < Config.READ_YOUR_WRITES_WINDOW:
+        return None
+    if _replica_monitor is None:
+        start_replica_monitor()  # Processes that skipped init_pools(), e.g. the dev server
+    healthy = [r for r in replicas if r.healthy and r.pool is not None]
+    if not healthy:
+        return None
+    return healthy[next(_replica_cursor) % len(healthy)]
+
+
+def is_read_query(query):
+    """True for statements that can be served by a replica"""
+    return bool(READ_QUERY.match(query)) and not PRIMARY_ONLY.search(query)
+
+
+def mark_write():
+    """Record a write in the current context (reads stick to the primary for a while)"""
+    _last_write.set(time.time())
+
+
+def begin_request(last_write=None):
+    """Reset the write marker for a new request, restoring it from the user's session"""
+    _last_write.set(last_write or 0.0)
+
+
+def init_app(app):
+    """Carry read-your-writes stickiness across requests of the same Flask session"""
+    if not replicas:
+        return
+    from flask import session
+
+    @app.before_request
+    def _restore_last_write():
+        begin_request(session.get('db_last_write'))
+
+    @app.after_request
+    def _remember_last_write(response):
+        last_write = _last_write.get()
+        if last_write and last_write != session.get('db_last_write'):
+            session['db_last_write'] = last_write
+        return response
+
+
+# ==================== Prepared Statement Cache ====================
+
+class StatementCache:
+    """
+    Prepared cursors of one physical connection, keyed by whitespace-normalized
+    SQL and evicted LRU beyond Config.STATEMENT_CACHE_SIZE
+
+    The connector only skips the PREPARE round trip when a cursor executes the
+    identical str object again, so each entry keeps the caller's original query
+    and executes that. The normalized text is only the lookup key - running it
+    would also collapse whitespace inside string literals.
+    """
+
+    def __init__(self, connection_id):
+        self.connection_id = connection_id
+        self.cursors = OrderedDict()
+
+    def get(self, connection, query):
+        key = _WHITESPACE.sub(' ', query).strip()
+        entry = self.cursors.get(key)
+        if entry is not None:
+            self.cursors.move_to_end(key)
+            instrumentation.record_statement_cache('hit')
+            if entry[1] != query:
+                # Same statement formatted differently: run this text (the cursor re-prepares)
+                entry = self.cursors[key] = (entry[0], query)
+            return entry
+
+        entry = self.cursors[key] = (connection.cursor(prepared=True, dictionary=True), query)
+        instrumentation.record_statement_cache('miss')
+        if len(self.cursors) > Config.STATEMENT_CACHE_SIZE:
+            _, (evicted, _) = self.cursors.popitem(last=False)
+            evicted.close()  # Deallocates the statement on the server
+            instrumentation.record_statement_cache('eviction')
+        return entry
+
+    def discard(self, query):
+        cursor, _ = self.cursors.pop(_WHITESPACE.sub(' ', query).strip(), (None, None))
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Error:
+                pass
+
+
+# Physical connection -> StatementCache (entries vanish with their connections)
+_statement_caches = weakref.WeakKeyDictionary()
+
+
+def _statement_cache(connection):
+    """StatementCache of a (pooled) connection, reset when the connector reconnected"""
+    raw = getattr(connection, '_cnx', connection)
+    cache = _statement_caches.get(raw)
+    if cache is None or cache.connection_id != raw.connection_id:
+        cache = _statement_caches[raw] = StatementCache(raw.connection_id)
+    return cache
+
+
+def _forget_inherited_connections():
+    """
+    Drop pools and cached statements inherited through fork() without closing
+    them: the sockets belong to the parent, and closing them here would end its
+    sessions. Each process then creates its own pools on first use.
+    """
+    global connection_pool, _pool_lock, _pool_retry_at, _replica_lock, _replica_monitor
     connection_pool = None
+    _pool_lock = threading.Lock()
+    _replica_lock = threading.Lock()
+    _replica_monitor = None  # Threads do not survive fork()
+    _pool_retry_at = 0.0
+    for replica in replicas:
+        replica.reset()
+    _statement_caches.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_inherited_connections)
+
+
+# ==================== Connections ====================
+
+def _connect(pool, config):
+    if pool:
+        try:
+            return pool.get_connection()
+        except PoolError:
+            # Pool exhausted: use a one-off connection instead of failing the request
+            logger.warning("Connection pool exhausted, opening a direct connection")
+    # Fallback to direct connection if pool failed
+    return mysql.connector.connect(**config)
 
 
 @contextmanager
-def get_db_connection():
+def get_db_connection(read_only=False):
     """
     Context manager for database connections with automatic cleanup
     Usage:
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM table")
+
+    Args:
+        read_only: Allow a healthy read replica to serve the connection
+                   (ignored right after a write in the same request/session)
     """
     connection = None
+    replica = _pick_replica() if read_only else None
     try:
-        if connection_pool:
-            connection = connection_pool.get_connection()
-            yield connection
-        else:
-            # Fallback to direct connection if pool failed
-            connection = mysql.connector.connect(**Config.get_db_config())
-            yield connection
+        if replica is not None:
+            try:
+                connection = _connect(replica.pool, replica.config)
+            except Error as e:
+                replica._set_health(False, None, f"connection failed ({e})")
+                connection = None
+        if connection is None:
+            connection = _connect(get_pool(), Config.get_db_config())
+        yield connection
     except Error as e:
         logger.error(f"❌ Database connection error: {e}")
         if connection:
@@ -53,6 +357,10 @@ def get_db_connection():
         raise
     finally:
         if connection and connection.is_connected():
+            if Config.STATEMENT_CACHE_SIZE and connection.in_transaction:
+                # Without the pool's session reset a lingering read view would
+                # serve stale snapshots to the connection's next user
+                connection.rollback()
             connection.close()
 
 
@@ -69,20 +377,39 @@ def execute_query(query, params=None, fetch=False, fetchone=False):
     Returns:
         Query results or lastrowid for INSERT operations
     """
+    started = time.perf_counter()
+    read_only = (fetch or fetchone) and is_read_query(query)
     try:
-        with get_db_connection() as connection:
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute(query, params or ())
-            
-            if fetch:
-                result = cursor.fetchall()
-            elif fetchone:
-                result = cursor.fetchone()
+        with get_db_connection(read_only=read_only) as connection:
+            statements = None
+            if Config.STATEMENT_CACHE_SIZE and PREPARABLE_QUERY.match(query):
+                statements = _statement_cache(connection)
+            if statements is not None:
+                cursor, operation = statements.get(connection, query)
             else:
-                connection.commit()
-                result = cursor.lastrowid
+                cursor, operation = connection.cursor(dictionary=True), query
+
+            try:
+                cursor.execute(operation, params or ())
+
+                if fetch:
+                    result = cursor.fetchall()
+                elif fetchone:
+                    result = cursor.fetchone()
+                    if statements is not None and cursor.with_rows:
+                        cursor.fetchall()  # The cached cursor must not keep unread rows
+                else:
+                    connection.commit()
+                    result = cursor.lastrowid
+            except Error:
+                if statements is not None:
+                    statements.discard(query)
+                raise
+            if not is_read_query(query):
+                mark_write()
             
-            cursor.close()
+            if statements is None:
+                cursor.close()
             return result
             
     except Error as e:
@@ -93,6 +420,8 @@ def execute_query(query, params=None, fetch=False, fetchone=False):
     except Exception as e:
         logger.error(f"❌ Unexpected error: {e}")
         return None
+    finally:
+        instrumentation.record_query(query, time.perf_counter() - started)
 
 
 def execute_transaction(queries_with_params):
@@ -112,12 +441,15 @@ def execute_transaction(queries_with_params):
             
             # Execute all queries
             for query, params in queries_with_params:
+                started = time.perf_counter()
                 cursor.execute(query, params or ())
+                instrumentation.record_query(query, time.perf_counter() - started)
             
             # Commit transaction if all queries succeed
             connection.commit()
+            mark_write()
             cursor.close()
-            logger.info("✅ Transaction committed successfully")
+            logger.debug("✅ Transaction committed successfully")
             return True
             
     except Error as e:
@@ -140,10 +472,14 @@ def check_db_health():
             cursor.fetchone()
             cursor.close()
             
+            pool = get_pool()
             return {
                 "status": "healthy",
-                "pool_size": connection_pool.pool_size if connection_pool else 0,
-                "message": "Database connection is working"
+                "pool_size": pool.pool_size if pool else 0,
+                "message": "Database connection is working",
+                "replicas": [
+                    {"name": r.name, "healthy": r.healthy, "lag_seconds": r.lag} for r in replicas
+                ]
             }
     except Exception as e:
         logger.error(f"❌ Database health check failed: {e}")
@@ -0,0 +1,27 @@
+-- Coordinates for Cities and Stations
+-- Used by the geospatial station index (geo_index.py: nearest stations, the
+-- /api/v1/aqi-grid interpolation) and by the live OpenWeatherMap lookup, which
+-- only geocodes a city whose coordinates are still missing and then stores them.
+-- Stations without their own coordinates are placed at their city's.
+
+USE dcds_project;
+
+ALTER TABLE cities
+    ADD COLUMN latitude DECIMAL(9,6) NULL,
+    ADD COLUMN longitude DECIMAL(9,6) NULL;
+
+ALTER TABLE stations
+    ADD COLUMN latitude DECIMAL(9,6) NULL,
+    ADD COLUMN longitude DECIMAL(9,6) NULL;
+
+-- Bundled cities (the rest are geocoded on their first live lookup)
+UPDATE cities SET latitude = 28.613900, longitude = 77.209000 WHERE city_id = 1;   -- Delhi
+UPDATE cities SET latitude = 19.076000, longitude = 72.877700 WHERE city_id = 2;   -- Mumbai
+UPDATE cities SET latitude = 12.971600, longitude = 77.594600 WHERE city_id = 3;   -- Bangalore
+UPDATE cities SET latitude = 13.082700, longitude = 80.270700 WHERE city_id = 4;   -- Chennai
+UPDATE cities SET latitude = 22.572600, longitude = 88.363900 WHERE city_id = 5;   -- Kolkata
+UPDATE cities SET latitude = 17.385000, longitude = 78.486700 WHERE city_id = 6;   -- Hyderabad
+UPDATE cities SET latitude = 18.520400, longitude = 73.856700 WHERE city_id = 7;   -- Pune
+UPDATE cities SET latitude = 23.259900, longitude = 77.412600 WHERE city_id = 8;   -- Bhopal
+UPDATE cities SET latitude = 26.912400, longitude = 75.787300 WHERE city_id = 9;   -- Jaipur
+UPDATE cities SET latitude = 26.846700, longitude = 80.946200 WHERE city_id = 10;  -- Lucknow
@@ -0,0 +1,39 @@
+-- Per-City Reading Counters
+-- One row per city, kept current by the write and ingestion paths (see city_stats.py)
+-- so the cities listing joins a single keyed row instead of aggregating
+-- stations x aqi. Rebuild at any time with: python city_stats.py
+
+USE dcds_project;
+
+CREATE TABLE IF NOT EXISTS city_stats (
+    city_id INT PRIMARY KEY,
+    station_count INT NOT NULL DEFAULT 0,
+    reading_count BIGINT NOT NULL DEFAULT 0,
+    first_reading_date DATE,
+    last_reading_date DATE,
+    last_aqi INT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (city_id) REFERENCES cities(city_id) ON DELETE CASCADE
+);
+
+-- Initial fill: stations and aqi are aggregated separately (no join fan-out)
+INSERT INTO city_stats (city_id, station_count, reading_count, first_reading_date, last_reading_date, last_aqi)
+SELECT c.city_id,
+       COALESCE(s.station_count, 0),
+       COALESCE(a.reading_count, 0),
+       a.first_reading_date,
+       a.last_reading_date,
+       (SELECT l.aqi_value FROM aqi l WHERE l.city_id = c.city_id
+        ORDER BY l.date DESC, l.aqi_id DESC LIMIT 1)
+FROM cities c
+LEFT JOIN (SELECT city_id, COUNT(*) AS station_count FROM stations GROUP BY city_id) s
+       ON s.city_id = c.city_id
+LEFT JOIN (SELECT city_id, COUNT(*) AS reading_count, MIN(date) AS first_reading_date, MAX(date) AS last_reading_date
+           FROM aqi GROUP BY city_id) a
+       ON a.city_id = c.city_id
+ON DUPLICATE KEY UPDATE
+    station_count = VALUES(station_count),
+    reading_count = VALUES(reading_count),
+    first_reading_date = VALUES(first_reading_date),
+    last_reading_date = VALUES(last_reading_date),
+    last_aqi = VALUES(last_aqi);
@@ -0,0 +1,94 @@
+-- AQI Cube
+-- Precomputed count / sum / min / max of AQI and each pollutant over the
+-- dimensions city, station, year, month, weekday and AQI category, so
+-- /api/v1/cube answers slice, dice and roll-up requests without reading the
+-- aqi and pollutants tables. Two cuboids are kept: per station, and rolled
+-- up to cities (served whenever a request does not involve stations).
+-- Months are recomputed by cube.py when a write path marks them dirty.
+-- Fill with: python cube.py --rebuild
+
+USE dcds_project;
+
+CREATE TABLE IF NOT EXISTS aqi_cube_station (
+    year SMALLINT NOT NULL,
+    month TINYINT NOT NULL,
+    city_id INT NOT NULL,
+    station_id INT NOT NULL,              -- 0 = city-level readings without a station
+    weekday TINYINT NOT NULL,             -- 0 = Monday, as WEEKDAY()
+    aqi_category TINYINT NOT NULL,        -- 0 = Good ... 5 = Hazardous (exposure.AQI_CATEGORIES)
+    aqi_count INT NOT NULL DEFAULT 0,
+    aqi_sum BIGINT NOT NULL DEFAULT 0,
+    aqi_min INT,
+    aqi_max INT,
+    pm25_count INT NOT NULL DEFAULT 0,
+    pm25_sum DOUBLE NOT NULL DEFAULT 0,
+    pm25_min DOUBLE,
+    pm25_max DOUBLE,
+    pm10_count INT NOT NULL DEFAULT 0,
+    pm10_sum DOUBLE NOT NULL DEFAULT 0,
+    pm10_min DOUBLE,
+    pm10_max DOUBLE,
+    o3_count INT NOT NULL DEFAULT 0,
+    o3_sum DOUBLE NOT NULL DEFAULT 0,
+    o3_min DOUBLE,
+    o3_max DOUBLE,
+    no2_count INT NOT NULL DEFAULT 0,
+    no2_sum DOUBLE NOT NULL DEFAULT 0,
+    no2_min DOUBLE,
+    no2_max DOUBLE,
+    so2_count INT NOT NULL DEFAULT 0,
+    so2_sum DOUBLE NOT NULL DEFAULT 0,
+    so2_min DOUBLE,
+    so2_max DOUBLE,
+    co_count INT NOT NULL DEFAULT 0,
+    co_sum DOUBLE NOT NULL DEFAULT 0,
+    co_min DOUBLE,
+    co_max DOUBLE,
+    PRIMARY KEY (year, month, city_id, station_id, weekday, aqi_category),
+    INDEX idx_cube_station_city (city_id, year, month),
+    INDEX idx_cube_station_station (station_id, year, month)
+);
+
+CREATE TABLE IF NOT EXISTS aqi_cube_city (
+    year SMALLINT NOT NULL,
+    month TINYINT NOT NULL,
+    city_id INT NOT NULL,
+    weekday TINYINT NOT NULL,
+    aqi_category TINYINT NOT NULL,
+    aqi_count INT NOT NULL DEFAULT 0,
+    aqi_sum BIGINT NOT NULL DEFAULT 0,
+    aqi_min INT,
+    aqi_max INT,
+    pm25_count INT NOT NULL DEFAULT 0,
+    pm25_sum DOUBLE NOT NULL DEFAULT 0,
+    pm25_min DOUBLE,
+    pm25_max DOUBLE,
+    pm10_count INT NOT NULL DEFAULT 0,
+    pm10_sum DOUBLE NOT NULL DEFAULT 0,
+    pm10_min DOUBLE,
+    pm10_max DOUBLE,
+    o3_count INT NOT NULL DEFAULT 0,
+    o3_sum DOUBLE NOT NULL DEFAULT 0,
+    o3_min DOUBLE,
+    o3_max DOUBLE,
+    no2_count INT NOT NULL DEFAULT 0,
+    no2_sum DOUBLE NOT NULL DEFAULT 0,
+    no2_min DOUBLE,
+    no2_max DOUBLE,
+    so2_count INT NOT NULL DEFAULT 0,
+    so2_sum DOUBLE NOT NULL DEFAULT 0,
+    so2_min DOUBLE,
+    so2_max DOUBLE,
+    co_count INT NOT NULL DEFAULT 0,
+    co_sum DOUBLE NOT NULL DEFAULT 0,
+    co_min DOUBLE,
+    co_max DOUBLE,
+    PRIMARY KEY (year, month, city_id, weekday, aqi_category),
+    INDEX idx_cube_city_city (city_id, year, month)
+);
+
+-- Months whose source rows changed since their cube rows were computed
+CREATE TABLE IF NOT EXISTS cube_dirty (
+    month CHAR(7) PRIMARY KEY,            -- YYYY-MM
+    marked_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+);
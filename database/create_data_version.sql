@@ -0,0 +1,13 @@
+-- Data Version Counter
+-- Bumped by every write route in app.py; read-only JSON APIs derive their
+-- ETags from it (see response_cache.py)
+
+USE dcds_project;
+
+CREATE TABLE IF NOT EXISTS data_version (
+    id TINYINT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO data_version (id, version) VALUES (1, 0);
@@ -0,0 +1,32 @@
+-- Gap-Filled Daily AQI and Pollutant Series
+-- Populated by resampling.py (python resampling.py)
+
+USE dcds_project;
+
+-- One row per station per calendar day between the station's first and last reading.
+-- Every value column has a matching *_flag column:
+--   0 = raw reading, 1 = interpolated, 2 = seasonal imputation, 3 = still missing
+CREATE TABLE IF NOT EXISTS aqi_daily_filled (
+    station_id INT NOT NULL,
+    date DATE NOT NULL,
+    city_id INT NOT NULL,
+    aqi_value INT,
+    aqi_flag TINYINT NOT NULL DEFAULT 0,
+    pm25 DECIMAL(6,2),
+    pm25_flag TINYINT NOT NULL DEFAULT 0,
+    pm10 DECIMAL(6,2),
+    pm10_flag TINYINT NOT NULL DEFAULT 0,
+    o3 DECIMAL(6,2),
+    o3_flag TINYINT NOT NULL DEFAULT 0,
+    no2 DECIMAL(6,2),
+    no2_flag TINYINT NOT NULL DEFAULT 0,
+    so2 DECIMAL(6,2),
+    so2_flag TINYINT NOT NULL DEFAULT 0,
+    co DECIMAL(6,2),
+    co_flag TINYINT NOT NULL DEFAULT 0,
+    filled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (station_id, date),
+    INDEX idx_filled_city_date (city_id, date),
+    FOREIGN KEY (city_id) REFERENCES cities(city_id),
+    FOREIGN KEY (station_id) REFERENCES stations(station_id)
+);
@@ -0,0 +1,44 @@
+-- Precomputed Health Impact Analytics
+-- Populated by health_analytics.py (python health_analytics.py)
+
+USE dcds_project;
+
+-- Fingerprints of the source tables each precomputed table was built from
+CREATE TABLE IF NOT EXISTS analytics_state (
+    name VARCHAR(50) PRIMARY KEY,
+    fingerprint VARCHAR(64) NOT NULL,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- One row per city per year of health_impact data.
+-- Each sort option offered by /cities has its own index so the
+-- ORDER BY ... LIMIT n listing is served by an index scan.
+CREATE TABLE IF NOT EXISTS health_analytics (
+    city_id INT NOT NULL,
+    year INT NOT NULL,
+    city_name VARCHAR(50) NOT NULL,
+    total_population BIGINT,
+    asthma_cases INT NOT NULL DEFAULT 0,
+    lung_cancer_cases INT NOT NULL DEFAULT 0,
+    respiratory_cases INT NOT NULL DEFAULT 0,
+    hospital_visits INT NOT NULL DEFAULT 0,
+    pollution_deaths INT NOT NULL DEFAULT 0,
+    total_cases INT NOT NULL DEFAULT 0,
+    asthma_per_100k DECIMAL(10,2),
+    lung_cancer_per_100k DECIMAL(10,2),
+    respiratory_per_100k DECIMAL(10,2),
+    deaths_per_100k DECIMAL(10,2),
+    cases_per_100k DECIMAL(10,2),
+    total_cases_yoy INT,                  -- change vs previous year, NULL for the first year
+    cases_per_100k_yoy DECIMAL(10,2),
+    avg_aqi DECIMAL(6,2),                 -- mean AQI of the city over the year
+    aqi_case_correlation DECIMAL(5,4),    -- Pearson r of avg_aqi vs cases_per_100k across the city's years
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (city_id, year),
+    INDEX idx_ha_total_cases (total_cases),
+    INDEX idx_ha_city_name (city_name),
+    INDEX idx_ha_respiratory (respiratory_cases),
+    INDEX idx_ha_lung_cancer (lung_cancer_cases),
+    INDEX idx_ha_cases_per_100k (cases_per_100k),
+    FOREIGN KEY (city_id) REFERENCES cities(city_id)
+);
@@ -0,0 +1,30 @@
+-- Background Jobs
+-- Persistent queue for work too long for a web request (exports, bulk
+-- ingestion, reports). The web app inserts 'queued' rows and polls them;
+-- `python jobs.py worker` claims, runs and finishes them (see jobs.py).
+
+USE dcds_project;
+
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id CHAR(32) PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL,
+    user_id INT,
+    status ENUM('queued', 'running', 'succeeded', 'failed', 'expired') NOT NULL DEFAULT 'queued',
+    params JSON,
+    progress DECIMAL(5, 4) NOT NULL DEFAULT 0,
+    message VARCHAR(255),
+    error TEXT,
+    result_path VARCHAR(500),
+    result_name VARCHAR(255),
+    result_mimetype VARCHAR(100),
+    attempts INT NOT NULL DEFAULT 0,
+    worker VARCHAR(100),
+    claim_token CHAR(32),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL,
+    heartbeat_at TIMESTAMP NULL,
+    finished_at TIMESTAMP NULL,
+    INDEX idx_jobs_status_created (status, created_at),
+    INDEX idx_jobs_user_created (user_id, created_at),
+    INDEX idx_jobs_claim_token (claim_token)
+);
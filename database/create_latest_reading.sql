@@ -0,0 +1,74 @@
+-- Latest Reading Per Station and Per City
+-- Newest AQI and pollutant values of every station (scope 'station') and city
+-- (scope 'city'), upserted set-wise by the Python write paths - one statement
+-- per batch, see latest_reading.py. Replaces trg_after_aqi_insert, which ran an
+-- INFORMATION_SCHEMA lookup and an audit_log insert for every single AQI row.
+-- Rebuild at any time with: python latest_reading.py
+
+USE dcds_project;
+
+DROP TRIGGER IF EXISTS trg_after_aqi_insert;
+
+CREATE TABLE IF NOT EXISTS latest_reading (
+    scope ENUM('station', 'city') NOT NULL,
+    scope_id INT NOT NULL,
+    city_id INT NOT NULL,
+    station_id INT,
+    date DATE NOT NULL,
+    aqi_value INT NOT NULL,
+    pm25 DECIMAL(6,2),
+    pm10 DECIMAL(6,2),
+    o3 DECIMAL(6,2),
+    no2 DECIMAL(6,2),
+    so2 DECIMAL(6,2),
+    co DECIMAL(6,2),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (scope, scope_id),
+    INDEX idx_latest_reading_city (city_id),
+    FOREIGN KEY (city_id) REFERENCES cities(city_id) ON DELETE CASCADE
+);
+
+-- Initial fill (same statements as latest_reading.rebuild())
+INSERT INTO latest_reading (scope, scope_id, city_id, station_id, date, aqi_value, pm25, pm10, o3, no2, so2, co)
+SELECT 'station', a.station_id, a.city_id, a.station_id, a.date, a.aqi_value,
+       p.pm25, p.pm10, p.o3, p.no2, p.so2, p.co
+FROM aqi a
+JOIN (SELECT station_id, MAX(date) AS date FROM aqi GROUP BY station_id) m
+     ON m.station_id = a.station_id AND m.date = a.date
+LEFT JOIN pollutants p ON p.station_id = a.station_id AND p.date = a.date
+ON DUPLICATE KEY UPDATE
+    city_id = VALUES(city_id), station_id = VALUES(station_id), date = VALUES(date),
+    aqi_value = VALUES(aqi_value), pm25 = VALUES(pm25), pm10 = VALUES(pm10), o3 = VALUES(o3),
+    no2 = VALUES(no2), so2 = VALUES(so2), co = VALUES(co);
+
+INSERT INTO latest_reading (scope, scope_id, city_id, station_id, date, aqi_value, pm25, pm10, o3, no2, so2, co)
+SELECT 'city', a.city_id, a.city_id, a.station_id, a.date, a.aqi_value,
+       p.pm25, p.pm10, p.o3, p.no2, p.so2, p.co
+FROM aqi a
+JOIN (SELECT city_id, MAX(date) AS date FROM aqi GROUP BY city_id) m
+     ON m.city_id = a.city_id AND m.date = a.date
+LEFT JOIN pollutants p ON p.station_id = a.station_id AND p.date = a.date
+ON DUPLICATE KEY UPDATE
+    city_id = VALUES(city_id), station_id = VALUES(station_id), date = VALUES(date),
+    aqi_value = VALUES(aqi_value), pm25 = VALUES(pm25), pm10 = VALUES(pm10), o3 = VALUES(o3),
+    no2 = VALUES(no2), so2 = VALUES(so2), co = VALUES(co);
+
+-- View: Latest AQI record per station (now a keyed read of latest_reading)
+CREATE OR REPLACE VIEW vw_station_latest_aqi AS
+SELECT
+    lr.station_id,
+    s.station_name,
+    s.city_id,
+    c.city_name,
+    lr.aqi_value,
+    lr.date,
+    lr.pm25,
+    lr.pm10,
+    lr.o3,
+    lr.no2,
+    lr.so2,
+    lr.co
+FROM latest_reading lr
+JOIN stations s ON lr.station_id = s.station_id
+JOIN cities c ON s.city_id = c.city_id
+WHERE lr.scope = 'station';
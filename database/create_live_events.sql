@@ -0,0 +1,17 @@
+-- Live Event Relay
+-- Carries /api/stream events between processes (gunicorn workers, asgi_api.py,
+-- job workers, synthetic_data.py ingestion) when LIVE_RELAY_ENABLED is set (the
+-- default); each process tails it with one poller (see live_updates.py). Rows
+-- older than an hour are pruned.
+
+USE dcds_project;
+
+CREATE TABLE IF NOT EXISTS live_events (
+    event_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    origin VARCHAR(100) NOT NULL,
+    event_type VARCHAR(20) NOT NULL,
+    city_id INT NOT NULL,
+    payload JSON NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_live_events_created (created_at)
+);
@@ -0,0 +1,87 @@
+-- Monthly Range Partitioning of aqi, pollutants and weather
+-- Run once after DCDS Project.sql; retention.py then keeps the partitions rolling
+-- (python retention.py creates future months and drops / archives expired ones)
+
+USE dcds_project;
+
+-- Partitioned InnoDB tables cannot take part in foreign keys, and every unique
+-- key must include the partitioning column. The implicit city_id / station_id
+-- indexes created for the foreign keys stay in place.
+ALTER TABLE aqi DROP FOREIGN KEY aqi_ibfk_1, DROP FOREIGN KEY aqi_ibfk_2;
+ALTER TABLE pollutants DROP FOREIGN KEY pollutants_ibfk_1, DROP FOREIGN KEY pollutants_ibfk_2;
+ALTER TABLE weather DROP FOREIGN KEY weather_ibfk_1;
+
+ALTER TABLE aqi
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (aqi_id, date),
+    ADD INDEX idx_aqi_city_date (city_id, date),
+    ADD INDEX idx_aqi_station_date (station_id, date);
+
+ALTER TABLE pollutants
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (pollutant_id, date),
+    ADD INDEX idx_pollutants_city_date (city_id, date),
+    ADD INDEX idx_pollutants_station_date (station_id, date);
+
+ALTER TABLE weather
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (weather_id, date),
+    ADD INDEX idx_weather_city_date (city_id, date);
+
+-- Partition names are pYYYYMM and hold that calendar month; p_history holds
+-- everything older and p_future is the empty catch-all that retention.py
+-- splits new months off (REORGANIZE of an empty partition is instant).
+ALTER TABLE aqi PARTITION BY RANGE COLUMNS (date) (
+    PARTITION p_history VALUES LESS THAN ('2024-01-01'),
+    PARTITION p202401 VALUES LESS THAN ('2024-02-01'),
+    PARTITION p202402 VALUES LESS THAN ('2024-03-01'),
+    PARTITION p202403 VALUES LESS THAN ('2024-04-01'),
+    PARTITION p202404 VALUES LESS THAN ('2024-05-01'),
+    PARTITION p202405 VALUES LESS THAN ('2024-06-01'),
+    PARTITION p202406 VALUES LESS THAN ('2024-07-01'),
+    PARTITION p202407 VALUES LESS THAN ('2024-08-01'),
+    PARTITION p202408 VALUES LESS THAN ('2024-09-01'),
+    PARTITION p202409 VALUES LESS THAN ('2024-10-01'),
+    PARTITION p202410 VALUES LESS THAN ('2024-11-01'),
+    PARTITION p202411 VALUES LESS THAN ('2024-12-01'),
+    PARTITION p202412 VALUES LESS THAN ('2025-01-01'),
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
+
+ALTER TABLE pollutants PARTITION BY RANGE COLUMNS (date) (
+    PARTITION p_history VALUES LESS THAN ('2024-01-01'),
+    PARTITION p202401 VALUES LESS THAN ('2024-02-01'),
+    PARTITION p202402 VALUES LESS THAN ('2024-03-01'),
+    PARTITION p202403 VALUES LESS THAN ('2024-04-01'),
+    PARTITION p202404 VALUES LESS THAN ('2024-05-01'),
+    PARTITION p202405 VALUES LESS THAN ('2024-06-01'),
+    PARTITION p202406 VALUES LESS THAN ('2024-07-01'),
+    PARTITION p202407 VALUES LESS THAN ('2024-08-01'),
+    PARTITION p202408 VALUES LESS THAN ('2024-09-01'),
+    PARTITION p202409 VALUES LESS THAN ('2024-10-01'),
+    PARTITION p202410 VALUES LESS THAN ('2024-11-01'),
+    PARTITION p202411 VALUES LESS THAN ('2024-12-01'),
+    PARTITION p202412 VALUES LESS THAN ('2025-01-01'),
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
+
+ALTER TABLE weather PARTITION BY RANGE COLUMNS (date) (
+    PARTITION p_history VALUES LESS THAN ('2024-01-01'),
+    PARTITION p202401 VALUES LESS THAN ('2024-02-01'),
+    PARTITION p202402 VALUES LESS THAN ('2024-03-01'),
+    PARTITION p202403 VALUES LESS THAN ('2024-04-01'),
+    PARTITION p202404 VALUES LESS THAN ('2024-05-01'),
+    PARTITION p202405 VALUES LESS THAN ('2024-06-01'),
+    PARTITION p202406 VALUES LESS THAN ('2024-07-01'),
+    PARTITION p202407 VALUES LESS THAN ('2024-08-01'),
+    PARTITION p202408 VALUES LESS THAN ('2024-09-01'),
+    PARTITION p202409 VALUES LESS THAN ('2024-10-01'),
+    PARTITION p202410 VALUES LESS THAN ('2024-11-01'),
+    PARTITION p202411 VALUES LESS THAN ('2024-12-01'),
+    PARTITION p202412 VALUES LESS THAN ('2025-01-01'),
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
+
+-- Verify pruning, e.g.:
+-- EXPLAIN SELECT AVG(aqi_value) FROM aqi WHERE city_id = 1 AND date >= '2024-03-01' AND date < '2024-04-01';
+-- (the partitions column should list only p202403)
@@ -0,0 +1,248 @@
+"""
+AQI Exposure Scoring Module
+Distribution metrics of daily AQI per city: days in each AQI category,
+p50/p90/p99 and the longest run of Unhealthy-or-worse days.
+Computed vectorized with NumPy over live and archived readings and cached
+per (city, year) for the current data version
+(response_cache.get_data_version()), so any write other processes record
+is picked up as well
+"""
+
+import logging
+import threading
+from datetime import date
+
+import numpy as np
+
+from database import execute_query
+from response_cache import get_data_version
+
+logger = logging.getLogger(__name__)
+
+# Same bands as get_aqi_health_impact() in api_core.py (upper bounds are inclusive)
+AQI_CATEGORIES = [
+    'Good',
+    'Moderate',
+    'Unhealthy for Sensitive Groups',
+    'Unhealthy',
+    'Very Unhealthy',
+    'Hazardous'
+]
+AQI_BREAKPOINTS = [50, 100, 150, 200, 300]
+UNHEALTHY_CATEGORY = AQI_CATEGORIES.index('Unhealthy')
+
+PERCENTILES = [50, 90, 99]
+
+# Daily city AQI = mean over the city's stations for that day
+DAILY_AQI_QUERY = """
+    SELECT city_id, date, AVG(aqi_value) as aqi_value
+    FROM aqi
+    WHERE {where}
+    GROUP BY city_id, date
+    ORDER BY city_id, date
+"""
+
+_cache = {}
+_cache_version = [None]
+_cache_lock = threading.Lock()
+
+
+def _cached(key, version):
+    """Entry for key, emptying the cache first when the data version moved on"""
+    with _cache_lock:
+        if _cache_version[0] != version:
+            _cache.clear()
+            _cache_version[0] = version
+        return _cache.get(key)
+
+
+def _store(entries, version):
+    """Cache entries computed from the data of ``version`` (dropped if it is already outdated)"""
+    with _cache_lock:
+        if _cache_version[0] == version:
+            _cache.update(entries)
+
+
+def longest_streak(days, mask):
+    """
+    Longest run of consecutive calendar days where mask is True
+
+    Args:
+        days: Sorted numpy array of day numbers (datetime64[D] as int)
+        mask: Boolean numpy array, same length
+
+    Returns:
+        Tuple (length, start_index, end_index); (0, None, None) if no day matches
+    """
+    if not mask.any():
+        return 0, None, None
+
+    # A streak continues when the previous day also matched and is exactly one day earlier
+    continues = np.zeros(len(mask), dtype=bool)
+    continues[1:] = mask[1:] & mask[:-1] & (np.diff(days) == 1)
+    starts = mask & ~continues
+
+    streak_ids = np.cumsum(starts)
+    lengths = np.bincount(streak_ids[mask])
+    best = int(lengths.argmax())
+
+    positions = np.flatnonzero(mask & (streak_ids == best))
+    return int(lengths[best]), int(positions[0]), int(positions[-1])
+
+
+def compute_exposure(dates, values):
+    """
+    Exposure metrics for one daily AQI series
+
+    Args:
+        dates: Sequence of datetime.date, ascending
+        values: Sequence of daily AQI values
+
+    Returns:
+        Dict with day counts per category, percentiles, mean and the longest
+        Unhealthy-or-worse streak
+    """
+    values = np.asarray(values, dtype=float)
+    days = np.asarray(dates, dtype='datetime64[D]')
+
+    valid = ~np.isnan(values)
+    values, days = values[valid], days[valid]
+
+    if len(values) == 0:
+        return {
+            'days': 0,
+            'mean_aqi': None,
+            'percentiles': {f'p{p}': None for p in PERCENTILES},
+            'category_days': {name: 0 for name in AQI_CATEGORIES},
+            'longest_unhealthy_streak': {'days': 0, 'start': None, 'end': None}
+        }
+
+    categories = np.digitize(values, AQI_BREAKPOINTS, right=True)
+    counts = np.bincount(categories, minlength=len(AQI_CATEGORIES))
+    percentiles = np.percentile(values, PERCENTILES)
+
+    streak, start, end = longest_streak(days.astype(np.int64), categories >= UNHEALTHY_CATEGORY)
+
+    return {
+        'days': int(len(values)),
+        'mean_aqi': round(float(values.mean()), 2),
+        'percentiles': {f'p{p}': round(float(v), 2) for p, v in zip(PERCENTILES, percentiles)},
+        'category_days': {name: int(n) for name, n in zip(AQI_CATEGORIES, counts)},
+        'longest_unhealthy_streak': {
+            'days': streak,
+            'start': str(days[start]) if start is not None else None,
+            'end': str(days[end]) if end is not None else None
+        }
+    }
+
+
+def _archived_daily(city_id, start, end):
+    """
+    Daily city means of the archived part of [start, end), read through
+    archive.read_range() so rows written to archived months count too
+
+    Returns:
+        Tuple (rows, live_start) - DAILY_AQI_QUERY covers live_start to end
+    """
+    import archive
+
+    boundary = archive.archived_through('aqi')
+    if not boundary or start >= boundary:
+        return [], start
+    live_start = min(end, boundary)
+
+    filters = {} if city_id is None else {'city_id': city_id}
+    frame = archive.read_range('aqi', start, live_start, **filters)
+    daily = frame.groupby(['city_id', 'date'])['aqi_value'].mean()
+    rows = [{'city_id': int(city), 'date': day.date(), 'aqi_value': value} for (city, day), value in daily.items()]
+    return rows, live_start
+
+
+def daily_aqi(city_id=None, year=None):
+    """
+    Daily city AQI rows (city_id, date, aqi_value) of one city or all cities,
+    over a year or the full history including archived months
+
+    Returns:
+        List of dicts ordered by city_id, date; None if the live rows could not be read
+    """
+    import archive
+
+    start, end = (date(year, 1, 1), date(year + 1, 1, 1)) if year is not None else archive.full_history()
+    rows, live_start = _archived_daily(city_id, start, end)
+
+    if live_start < end:
+        where, params = 'date >= %s AND date < %s', (live_start, end)
+        if city_id is not None:
+            where, params = 'city_id = %s AND ' + where, (city_id,) + params
+        live = execute_query(DAILY_AQI_QUERY.format(where=where), params, fetch=True)
+        if live is None:
+            return None
+        rows = rows + live
+
+    rows.sort(key=lambda row: (row['city_id'], row['date']))
+    return rows
+
+
+def get_city_exposure(city_id, year=None):
+    """
+    Exposure metrics for one city over a year (or its full history)
+
+    Returns:
+        Dict from compute_exposure() plus city_id and year
+    """
+    key = (city_id, year)
+    version = get_data_version()
+    cached = _cached(key, version)
+    if cached is not None:
+        return cached
+
+    rows = daily_aqi(city_id, year) or []
+
+    result = compute_exposure([r['date'] for r in rows], [r['aqi_value'] for r in rows])
+    result.update({'city_id': city_id, 'year': year})
+
+    _store({key: result}, version)
+    return result
+
+
+def get_all_exposure(year=None):
+    """
+    Exposure metrics for every city with readings, computed from one pass over daily_aqi()
+
+    Returns:
+        List of dicts (see get_city_exposure), ordered by city_id
+    """
+    version = get_data_version()
+    cached = _cached(('all', year), version)
+    if cached is not None:
+        return cached
+
+    rows = daily_aqi(year=year) or []
+
+    results = []
+    if rows:
+        city_ids = np.array([r['city_id'] for r in rows])
+        # Rows are ordered by city_id, so each city is one contiguous slice
+        boundaries = np.flatnonzero(np.diff(city_ids)) + 1
+        for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(rows)]):
+            chunk = rows[start:end]
+            result = compute_exposure([r['date'] for r in chunk], [r['aqi_value'] for r in chunk])
+            result.update({'city_id': int(city_ids[start]), 'year': year})
+            results.append(result)
+
+    entries = {(result['city_id'], year): result for result in results}
+    entries[('all', year)] = results
+    _store(entries, version)
+    return results
+
+
+def invalidate(city_id=None):
+    """Drop cached metrics for a city (and the all-cities lists), or everything"""
+    with _cache_lock:
+        if city_id is None:
+            _cache.clear()
+            return
+        for key in list(_cache):
+            if key[0] in (city_id, 'all'):
+                del _cache[key]
@@ -0,0 +1,351 @@
+"""
+Geospatial Station Index
+In-memory grid index over station coordinates (database/add_coordinates.sql)
+for nearest-station lookups and inverse-distance-weighted (IDW) AQI
+interpolation over a latitude / longitude grid (/api/v1/aqi-grid).
+
+Stations without their own coordinates are placed at their city's. City
+coordinates also spare the live OpenWeatherMap lookup its geocoding call:
+a city is geocoded once and the result stored (save_city_coordinates()).
+
+The index is rebuilt lazily after invalidate() (called by data_changed() in
+app.py) or Config.GEO_INDEX_TTL seconds. Interpolated grids are cached per
+date, bounding box, resolution and power until the next invalidate().
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import timedelta
+
+import numpy as np
+
+from config import Config
+from database import execute_query
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# A search margin this wide (degrees) covers every coordinate
+GLOBE_DEGREES = 360
+
+# Grid points per side of the tiles GeoIndex.interpolate() works through
+IDW_TILE = 16
+
+CITIES_QUERY = "SELECT city_id, city_name, latitude, longitude FROM cities"
+STATIONS_QUERY = "SELECT station_id, city_id, station_name, latitude, longitude FROM stations"
+LATEST_VALUES_QUERY = "SELECT station_id, aqi_value, date FROM latest_reading WHERE scope = 'station'"
+SAVE_CITY_QUERY = "UPDATE cities SET latitude = %s, longitude = %s WHERE city_id = %s"
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km (numpy broadcasting over any of the arguments)"""
+    lat1, lon1, lat2, lon2 = (np.radians(value) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _idw_block(point_lats, point_lons, station_lats, station_lons, values, power, k):
+    """IDW over the k nearest stations for a block of points, plus each point's k-th distance"""
+    distances = haversine_km(point_lats[:, None], point_lons[:, None], station_lats[None, :], station_lons[None, :])
+    if k < len(values):
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        distances = np.take_along_axis(distances, nearest, axis=1)
+        near_values = values[nearest]
+    else:
+        near_values = np.broadcast_to(values, distances.shape)
+
+    exact = distances < 1e-6
+    on_station = exact.any(axis=1)
+    with np.errstate(divide='ignore'):
+        weights = np.where(exact, 0.0, 1.0 / distances ** power)
+    interpolated = (weights * near_values).sum(axis=1) / np.where(on_station, 1.0, weights.sum(axis=1))
+    if on_station.any():
+        # A point on top of a station takes the station's value
+        interpolated[on_station] = near_values[on_station, exact[on_station].argmax(axis=1)]
+    return interpolated, distances.max(axis=1)
+
+
+class GeoIndex:
+    """Immutable snapshot of located stations, bucketed into Config.GEO_CELL_DEGREES cells"""
+
+    def __init__(self, cities, stations, cell_degrees):
+        self.cell_degrees = cell_degrees
+        self.cities = {
+            row['city_id']: (float(row['latitude']), float(row['longitude']))
+            for row in cities if row['latitude'] is not None and row['longitude'] is not None
+        }
+
+        self.stations = []  # Dicts in index order
+        latitudes, longitudes = [], []
+        for row in stations:
+            if row['latitude'] is not None and row['longitude'] is not None:
+                position, located_by = (float(row['latitude']), float(row['longitude'])), 'station'
+            elif row['city_id'] in self.cities:
+                position, located_by = self.cities[row['city_id']], 'city'
+            else:
+                continue
+            self.stations.append({
+                'station_id': row['station_id'],
+                'station_name': row['station_name'],
+                'city_id': row['city_id'],
+                'latitude': position[0],
+                'longitude': position[1],
+                'located_by': located_by
+            })
+            latitudes.append(position[0])
+            longitudes.append(position[1])
+
+        self.latitudes = np.array(latitudes, dtype=float)
+        self.longitudes = np.array(longitudes, dtype=float)
+        self.positions = {station['station_id']: i for i, station in enumerate(self.stations)}
+
+        self._cells = defaultdict(list)
+        for i, (lat, lon) in enumerate(zip(latitudes, longitudes)):
+            self._cells[self._cell(lat, lon)].append(i)
+        if self._cells:
+            rows, cols = zip(*self._cells)
+            self._extent = (min(rows), max(rows), min(cols), max(cols))
+        self.built_at = time.monotonic()
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def _ring(self, row, col, radius):
+        """Station indexes in the cells exactly ``radius`` cells away from (row, col)"""
+        if radius == 0:
+            return list(self._cells.get((row, col), ()))
+        found = []
+        for r in range(row - radius, row + radius + 1):
+            step = 1 if r in (row - radius, row + radius) else 2 * radius
+            for c in range(col - radius, col + radius + 1, step):
+                found.extend(self._cells.get((r, c), ()))
+        return found
+
+    def nearest(self, lat, lon, n=5):
+        """
+        The n stations closest to a point
+
+        Rings of grid cells are searched outwards until the n-th best distance
+        is shorter than anything the next ring could hold.
+
+        Returns:
+            Station dicts with distance_km, closest first
+        """
+        if not self.stations:
+            return []
+        row, col = self._cell(lat, lon)
+        min_row, max_row, min_col, max_col = self._extent
+        last_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+
+        candidates = []
+        for radius in range(last_ring + 1):
+            candidates.extend(self._ring(row, col, radius))
+            if len(candidates) < n:
+                continue
+            distances = haversine_km(lat, lon, self.latitudes[candidates], self.longitudes[candidates])
+            # Closest any unsearched cell can be: radius cells of longitude at the widest latitude in reach
+            widest = min(89.9, abs(lat) + (radius + 1) * self.cell_degrees)
+            bound = radius * self.cell_degrees * KM_PER_DEGREE * math.cos(math.radians(widest))
+            if np.partition(distances, n - 1)[n - 1] <= bound:
+                break
+
+        distances = haversine_km(lat, lon, self.latitudes[candidates], self.longitudes[candidates])
+        order = np.argsort(distances, kind='stable')[:n]
+        return [dict(self.stations[candidates[i]], distance_km=round(float(distances[i]), 3)) for i in order]
+
+    def interpolate(self, latitudes, longitudes, positions, values, power, neighbours):
+        """
+        IDW grid of station values
+
+        The grid is processed in tiles; each tile only weighs the stations
+        inside a margin around it, widened until every point's k-th nearest
+        station provably lies within it (same result as weighing every station).
+
+        Args:
+            latitudes, longitudes: Grid axes (1-D)
+            positions: Index positions of the stations with a value
+            values: Their values
+
+        Returns:
+            Array (len(latitudes), len(longitudes))
+        """
+        station_lats, station_lons = self.latitudes[positions], self.longitudes[positions]
+        usable = np.isfinite(station_lats) & np.isfinite(station_lons) & np.isfinite(values)
+        station_lats, station_lons, values = station_lats[usable], station_lons[usable], values[usable]
+        k = min(neighbours, len(values))
+        result = np.full((len(latitudes), len(longitudes)), np.nan)
+        if not k:
+            return result
+
+        for r in range(0, len(latitudes), IDW_TILE):
+            for c in range(0, len(longitudes), IDW_TILE):
+                tile_lats, tile_lons = latitudes[r:r + IDW_TILE], longitudes[c:c + IDW_TILE]
+                grid_lats, grid_lons = np.meshgrid(tile_lats, tile_lons, indexing='ij')
+                margin = self.cell_degrees
+                while True:
+                    inside = ((station_lats >= tile_lats.min() - margin) & (station_lats <= tile_lats.max() + margin) &
+                              (station_lons >= tile_lons.min() - margin) & (station_lons <= tile_lons.max() + margin))
+                    if margin >= GLOBE_DEGREES:
+                        inside[:] = True  # The margin spans the globe (also ends the loop for NaN grid points)
+                    if inside.sum() >= k:
+                        block, reach = _idw_block(grid_lats.ravel(), grid_lons.ravel(), station_lats[inside],
+                                                  station_lons[inside], values[inside], power, k)
+                        widest = min(89.9, max(abs(tile_lats.min()), abs(tile_lats.max())) + margin)
+                        if inside.all() or reach.max() <= margin * KM_PER_DEGREE * math.cos(math.radians(widest)):
+                            break
+                    margin *= 2
+                result[r:r + IDW_TILE, c:c + IDW_TILE] = block.reshape(grid_lats.shape)
+        return result
+
+
+# ==================== Shared Instance ====================
+
+_index = None
+_stale = True
+_build_lock = threading.Lock()
+_grids = OrderedDict()
+_grids_lock = threading.Lock()
+
+
+def build_index():
+    """Read city and station coordinates and build a new index"""
+    cities = execute_query(CITIES_QUERY, fetch=True)
+    stations = execute_query(STATIONS_QUERY, fetch=True)
+    if cities is None or stations is None:
+        return None
+    index = GeoIndex(cities, stations, Config.GEO_CELL_DEGREES)
+    logger.info(f"✅ Geo index built ({len(index.stations)} located stations, {len(index.cities)} cities)")
+    return index
+
+
+def get_index():
+    """Current index, rebuilt first if invalidated or older than Config.GEO_INDEX_TTL"""
+    global _index, _stale
+    index = _index
+    if index is not None and not _stale and time.monotonic() - index.built_at < Config.GEO_INDEX_TTL:
+        return index
+
+    with _build_lock:
+        if _index is not None and not _stale and time.monotonic() - _index.built_at < Config.GEO_INDEX_TTL:
+            return _index
+        _stale = False
+        rebuilt = build_index()
+        if rebuilt is not None:
+            with _grids_lock:
+                _grids.clear()
+            _index = rebuilt
+        elif _index is not None:
+            logger.warning("⚠️ Geo index rebuild failed, serving the previous index")
+        return _index
+
+
+def invalidate():
+    """Rebuild the index and recompute grids on the next lookup (called after writes)"""
+    global _stale
+    _stale = True
+    with _grids_lock:
+        _grids.clear()
+
+
+def nearest_stations(lat, lon, n=5):
+    index = get_index()
+    return index.nearest(lat, lon, n) if index else []
+
+
+# ==================== City Coordinates ====================
+
+def city_coordinates(city_id):
+    """Stored (latitude, longitude) of a city, or None if it was never geocoded"""
+    index = get_index()
+    return index.cities.get(city_id) if index else None
+
+
+def save_city_coordinates(city_id, lat, lon):
+    """Store geocoded coordinates so later live lookups skip the geocoding call"""
+    if execute_query(SAVE_CITY_QUERY, (lat, lon, city_id)) is not None:
+        invalidate()
+
+
+# ==================== AQI Grid ====================
+
+def station_values(day=None):
+    """
+    AQI per station for a day (mean of its readings), or each station's latest reading
+
+    Returns:
+        Tuple (dict station_id -> AQI, date label)
+    """
+    if day is None:
+        rows = execute_query(LATEST_VALUES_QUERY, fetch=True) or []
+        label = max((row['date'] for row in rows), default=None)
+        return {row['station_id']: float(row['aqi_value']) for row in rows}, label
+
+    import archive  # pandas-backed, only needed for past dates
+    readings = archive.read_range('aqi', day, day + timedelta(days=1))
+    means = readings.groupby('station_id')['aqi_value'].mean()
+    return {int(station_id): float(value) for station_id, value in means.items()}, day
+
+
+def aqi_grid(day=None, bbox=None, resolution=None, power=None):
+    """
+    IDW-interpolated AQI over a latitude / longitude grid
+
+    Args:
+        day: date, or None for every station's latest reading
+        bbox: (min_lat, min_lon, max_lat, max_lon); default: the reporting
+              stations' extent plus a small margin
+        resolution: Points per side (Config.AQI_GRID_RESOLUTION)
+        power: IDW distance exponent (Config.AQI_GRID_IDW_POWER)
+
+    Returns:
+        Dict with date, bbox, latitudes, longitudes, aqi (rows of values,
+        south to north) and stations (how many contributed), or None if no
+        located station has a reading
+    """
+    resolution = resolution or Config.AQI_GRID_RESOLUTION
+    power = power or Config.AQI_GRID_IDW_POWER
+    key = (day, bbox, resolution, power)
+    with _grids_lock:
+        grid = _grids.get(key)
+        if grid is not None:
+            _grids.move_to_end(key)
+            return grid
+
+    index = get_index()
+    if index is None:
+        return None
+    values, label = station_values(day)
+    located = [(index.positions[station_id], value) for station_id, value in values.items()
+               if station_id in index.positions]
+    if not located:
+        return None
+    positions = np.array([position for position, _ in located])
+    station_lats, station_lons = index.latitudes[positions], index.longitudes[positions]
+
+    if bbox is None:
+        margin = Config.GEO_CELL_DEGREES / 5
+        bbox = (float(station_lats.min()) - margin, float(station_lons.min()) - margin,
+                float(station_lats.max()) + margin, float(station_lons.max()) + margin)
+    latitudes = np.linspace(bbox[0], bbox[2], resolution)
+    longitudes = np.linspace(bbox[1], bbox[3], resolution)
+    aqi = index.interpolate(latitudes, longitudes, positions, np.array([value for _, value in located]),
+                            power, Config.AQI_GRID_NEIGHBOURS)
+
+    grid = {
+        'date': label.isoformat() if label is not None else None,
+        'bbox': [round(float(value), 6) for value in bbox],
+        'latitudes': np.round(latitudes, 6).tolist(),
+        'longitudes': np.round(longitudes, 6).tolist(),
+        'aqi': np.round(aqi, 1).tolist(),
+        'stations': len(located),
+        'power': power
+    }
+    with _grids_lock:
+        _grids[key] = grid
+        while len(_grids) > Config.AQI_GRID_CACHE_SIZE:
+            _grids.popitem(last=False)
+    return grid
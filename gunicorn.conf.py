@@ -0,0 +1,49 @@
+"""
+Gunicorn Configuration
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+The app is preloaded in the master (imports and heavy modules are shared by
+the workers); each worker creates its own MySQL pool right after the fork and
+warms its caches before it accepts connections. Settings can be overridden
+with GUNICORN_* environment variables.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Threads: /api/stream (Server-Sent Events) holds one per connected client, up to
+# Config.LIVE_MAX_SUBSCRIBERS (GUNICORN_THREADS - 8 by default); the rest serve requests
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1').lower() in ('1', 'true', 'yes')
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')  # e.g. '-' for stdout
+
+
+def when_ready(server):
+    """Master: load the deferred heavy modules once, before the first fork"""
+    if preload_app:
+        import wsgi
+        wsgi.preload_modules()
+
+
+def post_fork(server, worker):
+    """Worker: open this process's own connection pool (nothing is inherited from the master)"""
+    import database
+    if not database.init_pools():
+        worker.log.warning("Database unreachable at start-up, the pool will be created on first use")
+
+
+def post_worker_init(worker):
+    """Worker: build caches before the worker starts accepting requests"""
+    import wsgi
+    wsgi.warm_up()
+
+
+def worker_exit(server, worker):
+    import credentials
+    credentials.shutdown()
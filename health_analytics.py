@@ -0,0 +1,244 @@
+"""
+Health Impact Analytics Module
+Precomputes population-normalized health metrics per city and year into the
+health_analytics table, so listing pages read indexed rows instead of
+recomputing totals and rates on every request
+
+Usage:
+    python health_analytics.py   # force a full refresh
+"""
+
+import hashlib
+import logging
+import threading
+import time
+
+import numpy as np
+
+from config import Config
+from database import get_db_connection, execute_query
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = 'health_analytics'
+
+# Cheap change detector over every table the analytics are derived from
+FINGERPRINT_QUERY = """
+    SELECT CONCAT_WS(':',
+        (SELECT CONCAT(COUNT(*), '-', COALESCE(SUM(CRC32(CONCAT_WS(',',
+                    city_id, year, asthma_cases, lung_cancer_cases, respiratory_cases,
+                    hospital_visits, pollution_deaths))), 0))
+         FROM health_impact),
+        (SELECT CONCAT(COUNT(*), '-', COALESCE(SUM(CRC32(CONCAT_WS(',', city_id, year, total_population))), 0))
+         FROM population),
+        (SELECT CONCAT(COUNT(*), '-', COALESCE(SUM(CRC32(CONCAT_WS(',', city_id, city_name))), 0))
+         FROM cities),
+        (SELECT CONCAT(COUNT(*), '-', COALESCE(SUM(aqi_count), 0), '-', COALESCE(SUM(aqi_sum), 0))
+         FROM aqi_cube_city)
+    ) AS fingerprint
+"""
+
+HEALTH_QUERY = """
+    SELECT h.city_id, h.year, c.city_name, p.total_population,
+           SUM(COALESCE(h.asthma_cases, 0)) as asthma_cases,
+           SUM(COALESCE(h.lung_cancer_cases, 0)) as lung_cancer_cases,
+           SUM(COALESCE(h.respiratory_cases, 0)) as respiratory_cases,
+           SUM(COALESCE(h.hospital_visits, 0)) as hospital_visits,
+           SUM(COALESCE(h.pollution_deaths, 0)) as pollution_deaths
+    FROM health_impact h
+    JOIN cities c ON h.city_id = c.city_id
+    LEFT JOIN population p ON h.city_id = p.city_id AND h.year = p.year
+    GROUP BY h.city_id, h.year, c.city_name, p.total_population
+    ORDER BY h.city_id, h.year
+"""
+
+# Yearly AQI from the cube's city rollups (database/create_cube.sql), which
+# cover archived months as well as the live table
+AQI_QUERY = """
+    SELECT city_id, year, SUM(aqi_sum) / SUM(aqi_count) as avg_aqi
+    FROM aqi_cube_city
+    GROUP BY city_id, year
+"""
+
+COLUMNS = [
+    'city_id', 'year', 'city_name', 'total_population',
+    'asthma_cases', 'lung_cancer_cases', 'respiratory_cases', 'hospital_visits', 'pollution_deaths',
+    'total_cases', 'asthma_per_100k', 'lung_cancer_per_100k', 'respiratory_per_100k',
+    'deaths_per_100k', 'cases_per_100k', 'total_cases_yoy', 'cases_per_100k_yoy',
+    'avg_aqi', 'aqi_case_correlation'
+]
+
+_state_lock = threading.Lock()
+_last_check = 0.0
+
+
+def per_100k(count, population):
+    """Rate per 100,000 people, or None when population is unknown"""
+    if not population:
+        return None
+    return round(float(count) * 100000.0 / float(population), 2)
+
+
+def compute_health_analytics(health_rows, aqi_rows):
+    """
+    Derive per-100k rates, year-over-year deltas and AQI correlation
+
+    Args:
+        health_rows: Rows of HEALTH_QUERY, ordered by city_id, year
+        aqi_rows: Rows of AQI_QUERY
+
+    Returns:
+        List of dicts keyed by COLUMNS
+    """
+    avg_aqi = {(r['city_id'], r['year']): float(r['avg_aqi']) for r in aqi_rows if r['avg_aqi'] is not None}
+
+    results = []
+    previous = None
+    for row in health_rows:
+        population = row['total_population']
+        record = {
+            'city_id': row['city_id'],
+            'year': row['year'],
+            'city_name': row['city_name'],
+            'total_population': population,
+            'asthma_cases': int(row['asthma_cases']),
+            'lung_cancer_cases': int(row['lung_cancer_cases']),
+            'respiratory_cases': int(row['respiratory_cases']),
+            'hospital_visits': int(row['hospital_visits']),
+            'pollution_deaths': int(row['pollution_deaths']),
+        }
+        record['total_cases'] = record['asthma_cases'] + record['lung_cancer_cases'] + record['respiratory_cases']
+        record['asthma_per_100k'] = per_100k(record['asthma_cases'], population)
+        record['lung_cancer_per_100k'] = per_100k(record['lung_cancer_cases'], population)
+        record['respiratory_per_100k'] = per_100k(record['respiratory_cases'], population)
+        record['deaths_per_100k'] = per_100k(record['pollution_deaths'], population)
+        record['cases_per_100k'] = per_100k(record['total_cases'], population)
+        record['avg_aqi'] = round(avg_aqi[(row['city_id'], row['year'])], 2) \
+            if (row['city_id'], row['year']) in avg_aqi else None
+
+        # Year-over-year deltas against the previous row of the same city
+        if previous and previous['city_id'] == record['city_id']:
+            record['total_cases_yoy'] = record['total_cases'] - previous['total_cases']
+            record['cases_per_100k_yoy'] = (
+                round(record['cases_per_100k'] - previous['cases_per_100k'], 2)
+                if record['cases_per_100k'] is not None and previous['cases_per_100k'] is not None else None
+            )
+        else:
+            record['total_cases_yoy'] = None
+            record['cases_per_100k_yoy'] = None
+
+        record['aqi_case_correlation'] = None
+        results.append(record)
+        previous = record
+
+    # Pearson correlation of yearly AQI exposure against case rates, per city
+    by_city = {}
+    for record in results:
+        if record['avg_aqi'] is not None and record['cases_per_100k'] is not None:
+            by_city.setdefault(record['city_id'], []).append((record['avg_aqi'], record['cases_per_100k']))
+
+    correlation = {}
+    for city_id, pairs in by_city.items():
+        values = np.array(pairs, dtype=float)
+        if len(values) >= 2 and values[:, 0].std() > 0 and values[:, 1].std() > 0:
+            correlation[city_id] = round(float(np.corrcoef(values[:, 0], values[:, 1])[0, 1]), 4)
+
+    for record in results:
+        record['aqi_case_correlation'] = correlation.get(record['city_id'])
+
+    return results
+
+
+def get_source_fingerprint():
+    """Hash of the current source data, used to detect when a refresh is needed"""
+    result = execute_query(FINGERPRINT_QUERY, fetch=True)
+    if not result:
+        return None
+    return hashlib.sha256(result[0]['fingerprint'].encode('utf-8')).hexdigest()
+
+
+def refresh_health_analytics(fingerprint=None):
+    """
+    Rebuild the health_analytics table from health_impact, population and the AQI cube
+
+    Returns:
+        Number of rows written, or None if the refresh failed
+    """
+    if fingerprint is None:
+        fingerprint = get_source_fingerprint()
+
+    health_rows = execute_query(HEALTH_QUERY, fetch=True)
+    aqi_rows = execute_query(AQI_QUERY, fetch=True)
+    if health_rows is None or aqi_rows is None:
+        logger.error("❌ Health analytics refresh failed: could not read source tables")
+        return None
+
+    records = compute_health_analytics(health_rows, aqi_rows)
+    insert_query = f"""
+        INSERT INTO health_analytics ({', '.join(COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(COLUMNS))})
+    """
+
+    try:
+        with get_db_connection() as connection:
+            cursor = connection.cursor()
+            connection.start_transaction()
+            cursor.execute("DELETE FROM health_analytics")
+            if records:
+                cursor.executemany(insert_query, [tuple(r[c] for c in COLUMNS) for r in records])
+            cursor.execute("""
+                INSERT INTO analytics_state (name, fingerprint) VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE fingerprint = VALUES(fingerprint)
+            """, (STATE_NAME, fingerprint or ''))
+            connection.commit()
+            cursor.close()
+    except Exception as e:
+        logger.error(f"❌ Health analytics refresh failed: {e}")
+        return None
+
+    logger.info(f"✅ Health analytics refreshed ({len(records)} rows)")
+    return len(records)
+
+
+def ensure_fresh():
+    """
+    Refresh health_analytics if its source tables changed
+
+    The fingerprint check runs at most once per
+    Config.HEALTH_ANALYTICS_CHECK_INTERVAL seconds per process unless
+    mark_stale() was called by a write route.
+
+    Returns:
+        True if a refresh was performed
+    """
+    global _last_check
+
+    if time.monotonic() - _last_check < Config.HEALTH_ANALYTICS_CHECK_INTERVAL:
+        return False
+
+    with _state_lock:
+        if time.monotonic() - _last_check < Config.HEALTH_ANALYTICS_CHECK_INTERVAL:
+            return False
+        _last_check = time.monotonic()
+
+        try:
+            fingerprint = get_source_fingerprint()
+            stored = execute_query("SELECT fingerprint FROM analytics_state WHERE name = %s",
+                                   (STATE_NAME,), fetch=True)
+            if fingerprint and stored and stored[0]['fingerprint'] == fingerprint:
+                return False
+            return refresh_health_analytics(fingerprint) is not None
+        except Exception as e:
+            logger.error(f"❌ Health analytics freshness check failed: {e}")
+            return False
+
+
+def mark_stale():
+    """Force the next ensure_fresh() call to re-check the source tables"""
+    global _last_check
+    _last_check = 0.0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    refresh_health_analytics()
@@ -0,0 +1,276 @@
+"""
+Instrumentation Module
+Per-route latency histograms, per-request DB query counts and time, slow
+query capture with normalized SQL and upstream HTTP timings, exposed in
+Prometheus text format by the /metrics endpoint
+"""
+
+import contextvars
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets (seconds / query counts)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Per-request DB counters: [query_count, query_seconds], None outside a request
+_request_db = contextvars.ContextVar('request_db', default=None)
+
+_lock = threading.Lock()
+_metrics = {}
+_slow_queries = {}
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+
+def _histogram(name, labels, buckets=LATENCY_BUCKETS):
+    """Get or create the histogram for (name, labels); caller holds _lock"""
+    key = (name, labels)
+    histogram = _metrics.get(key)
+    if histogram is None:
+        histogram = _metrics[key] = Histogram(buckets)
+    return histogram
+
+
+def _increment(name, labels, amount=1):
+    """Increment a counter; caller holds _lock"""
+    key = (name, labels)
+    _metrics[key] = _metrics.get(key, 0) + amount
+
+
+# ==================== SQL Normalization ====================
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(query):
+    """Collapse whitespace and replace literals/placeholders so equivalent queries group together"""
+    normalized = _STRING_LITERAL.sub('?', query)
+    normalized = normalized.replace('%s', '?')
+    normalized = _NUMBER_LITERAL.sub('?', normalized)
+    normalized = _PLACEHOLDER_LIST.sub('(?+)', normalized)
+    return _WHITESPACE.sub(' ', normalized).strip()
+
+
+# ==================== Recording ====================
+
+def record_query(query, seconds):
+    """Record one executed SQL statement (called by database.py)"""
+    counters = _request_db.get()
+    if counters is not None:
+        counters[0] += 1
+        counters[1] += seconds
+
+    with _lock:
+        _histogram('dcds_db_query_duration_seconds', ()).observe(seconds)
+
+    if seconds >= Config.SLOW_QUERY_THRESHOLD:
+        normalized = normalize_sql(query)
+        with _lock:
+            entry = _slow_queries.get(normalized)
+            if entry is None:
+                if len(_slow_queries) >= Config.SLOW_QUERY_MAX_ENTRIES:
+                    return
+                entry = _slow_queries[normalized] = {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+            entry['count'] += 1
+            entry['total_seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+            entry['last_seen'] = time.time()
+        if logger.isEnabledFor(logging.WARNING):
+            logger.warning("Slow query (%.3fs): %s", seconds, normalized)
+
+
+@contextmanager
+def track_upstream(service):
+    """Time an upstream HTTP call: ``with track_upstream('openweather_geo'): ...``"""
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            _histogram('dcds_upstream_request_duration_seconds', (('service', service),)).observe(elapsed)
+            if failed:
+                _increment('dcds_upstream_errors_total', (('service', service),))
+
+
+def record_statement_cache(outcome):
+    """Count a prepared statement cache 'hit', 'miss' or 'eviction' (called by database.py)"""
+    with _lock:
+        _increment('dcds_statement_cache_total', (('outcome', outcome),))
+
+
+def statement_cache_hit_ratio():
+    """Share of prepared statement lookups served from the cache (0 before any lookup)"""
+    with _lock:
+        hits = _metrics.get(('dcds_statement_cache_total', (('outcome', 'hit'),)), 0)
+        misses = _metrics.get(('dcds_statement_cache_total', (('outcome', 'miss'),)), 0)
+    return round(hits / (hits + misses), 4) if hits + misses else 0
+
+
+def record_singleflight(group, outcome):
+    """Count a single-flight call as 'leader', 'shared' or 'timeout' (called by singleflight.py)"""
+    with _lock:
+        _increment('dcds_singleflight_calls_total', (('group', group), ('outcome', outcome)))
+
+
+def record_startup(phase, seconds):
+    """Remember how long a start-up phase took (wsgi.py: 'import', 'warmup', 'first_request')"""
+    with _lock:
+        _metrics[('dcds_startup_seconds', (('phase', phase),))] = round(seconds, 6)
+
+
+def start_request():
+    """Begin per-request accounting (before_request hook)"""
+    _request_db.set([0, 0.0])
+    return time.perf_counter()
+
+
+def finish_request(route, method, status, started):
+    """
+    Record latency and DB usage of the finished request (after_request hook)
+
+    Returns:
+        Tuple (elapsed_seconds, db_query_count, db_seconds)
+    """
+    elapsed = time.perf_counter() - started
+    counters = _request_db.get() or [0, 0.0]
+    _request_db.set(None)
+
+    route_label = (('route', route or 'unknown'),)
+    with _lock:
+        _histogram('dcds_http_request_duration_seconds', route_label + (('method', method),)).observe(elapsed)
+        _increment('dcds_http_requests_total', route_label + (('method', method), ('status', str(status))))
+        _histogram('dcds_db_queries_per_request', route_label, QUERY_COUNT_BUCKETS).observe(counters[0])
+        _increment('dcds_db_request_seconds_total', route_label, counters[1])
+
+    return elapsed, counters[0], counters[1]
+
+
+def init_app(app):
+    """Register the request hooks on a Flask app"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.instrumentation_started = start_request()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('instrumentation_started', None)
+        if started is not None:
+            elapsed, queries, db_seconds = finish_request(
+                request.endpoint, request.method, response.status_code, started)
+            response.headers['Server-Timing'] = (
+                f'app;dur={elapsed * 1000:.1f}, db;dur={db_seconds * 1000:.1f};desc="{queries} queries"'
+            )
+        return response
+
+
+# ==================== Export ====================
+
+def _escape(value):
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+METRIC_HELP = {
+    'dcds_http_request_duration_seconds': ('histogram', 'Request latency by route'),
+    'dcds_http_requests_total': ('counter', 'Requests by route and status'),
+    'dcds_db_queries_per_request': ('histogram', 'SQL statements executed per request'),
+    'dcds_db_request_seconds_total': ('counter', 'Time spent in SQL per route'),
+    'dcds_db_query_duration_seconds': ('histogram', 'Duration of individual SQL statements'),
+    'dcds_upstream_request_duration_seconds': ('histogram', 'Upstream HTTP call latency'),
+    'dcds_upstream_errors_total': ('counter', 'Failed upstream HTTP calls'),
+    'dcds_statement_cache_total': ('counter', 'Prepared statement cache lookups by outcome (hit, miss, eviction)'),
+    'dcds_singleflight_calls_total': ('counter', 'Coalesced calls by group and outcome (leader, shared, timeout)'),
+    'dcds_startup_seconds': ('gauge', 'Duration of this worker\'s start-up phases and of its first request'),
+}
+
+
+def render_metrics(extra_gauges=None):
+    """
+    Render all metrics in Prometheus text exposition format
+
+    Args:
+        extra_gauges: Optional dict name -> value added as gauges
+    """
+    lines = []
+    with _lock:
+        snapshot = dict(_metrics)
+        histograms = {k: (v.buckets, list(v.counts), v.total, v.count)
+                      for k, v in snapshot.items() if isinstance(v, Histogram)}
+        slow = {k: dict(v) for k, v in _slow_queries.items()}
+
+    for name, (metric_type, help_text) in METRIC_HELP.items():
+        keys = sorted(k for k in snapshot if k[0] == name)
+        if not keys:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for key in keys:
+            labels = key[1]
+            if key in histograms:
+                buckets, counts, total, count = histograms[key]
+                for bound, bucket_count in zip(buckets, counts):
+                    lines.append(f'{name}_bucket{_format_labels(labels, (("le", bound),))} {bucket_count}')
+                lines.append(f'{name}_bucket{_format_labels(labels, (("le", "+Inf"),))} {count}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {total:.6f}')
+                lines.append(f'{name}_count{_format_labels(labels)} {count}')
+            else:
+                lines.append(f'{name}{_format_labels(labels)} {snapshot[key]}')
+
+    if slow:
+        lines.append('# HELP dcds_slow_queries_total Statements slower than SLOW_QUERY_THRESHOLD')
+        lines.append('# TYPE dcds_slow_queries_total counter')
+        for query, entry in slow.items():
+            lines.append(f'dcds_slow_queries_total{_format_labels((("query", query),))} {entry["count"]}')
+
+    for name, value in (extra_gauges or {}).items():
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(f'{name} {value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def get_slow_queries():
+    """Captured slow queries, slowest (by max duration) first"""
+    with _lock:
+        entries = [dict(entry, query=query) for query, entry in _slow_queries.items()]
+    return sorted(entries, key=lambda e: e['max_seconds'], reverse=True)
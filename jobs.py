@@ -0,0 +1,536 @@
+"""
+Background Jobs Module
+Persistent job queue (database/create_jobs.sql) and the worker pool that runs
+it, so exports, bulk ingestion and report building return a job ID at once
+instead of holding a web worker for minutes.
+
+Web processes only enqueue() jobs and read their status. `python jobs.py
+worker` starts Config.JOB_WORKERS processes that each claim one queued job at
+a time, report its progress, write its result under Config.JOB_RESULTS_DIR
+and heartbeat while it runs; a running job whose heartbeat stops (worker
+killed, host restarted) is queued again up to Config.JOB_MAX_ATTEMPTS times.
+Between jobs the workers also recompute the dirty months of the AQI cube.
+
+Job types are plain functions registered with @handler('type'): they receive
+the job's params and a JobContext, and return (path, download_name, mimetype)
+of their result file.
+
+Usage:
+    python jobs.py worker                 # Config.JOB_WORKERS processes
+    python jobs.py worker --processes 4
+    python jobs.py purge                  # delete results past JOB_RESULT_TTL_HOURS
+"""
+
+import argparse
+import csv
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from config import Config
+from database import execute_query, get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Imported by every worker so their @handler registrations exist
+HANDLER_MODULES = ('jobs', 'report_builder')
+
+EXPORT_TABLES = ('cities', 'stations', 'aqi', 'vehicle_info', 'emissions_by_city')
+EXPORT_BATCH_ROWS = 5000
+INGEST_BATCH_ROWS = 1000
+INGEST_MAX_ERRORS = 100  # Rejected rows listed in the ingestion report
+PROGRESS_INTERVAL = 0.5  # Seconds between progress writes of one job
+
+PUBLIC_COLUMNS = ('job_id', 'job_type', 'user_id', 'status', 'progress', 'message', 'error',
+                  'result_name', 'attempts', 'created_at', 'started_at', 'finished_at')
+
+ENQUEUE_QUERY = "INSERT INTO jobs (job_id, job_type, user_id, params, message) VALUES (%s, %s, %s, %s, 'Queued')"
+
+# Claiming is a single UPDATE, so two workers can never take the same row
+CLAIM_QUERY = """
+    UPDATE jobs
+    SET status = 'running', worker = %s, claim_token = %s, attempts = attempts + 1,
+        started_at = NOW(), heartbeat_at = NOW(), message = 'Started'
+    WHERE status = 'queued'
+    ORDER BY created_at
+    LIMIT 1
+"""
+
+PROGRESS_QUERY = """
+    UPDATE jobs SET progress = %s, message = %s, heartbeat_at = NOW()
+    WHERE job_id = %s AND claim_token = %s
+"""
+
+HEARTBEAT_QUERY = "UPDATE jobs SET heartbeat_at = NOW() WHERE job_id = %s AND claim_token = %s"
+
+SUCCEED_QUERY = """
+    UPDATE jobs
+    SET status = 'succeeded', progress = 1, message = 'Done', finished_at = NOW(),
+        result_path = %s, result_name = %s, result_mimetype = %s
+    WHERE job_id = %s AND claim_token = %s
+"""
+
+FAIL_QUERY = """
+    UPDATE jobs SET status = 'failed', error = %s, message = 'Failed', finished_at = NOW()
+    WHERE job_id = %s AND claim_token = %s
+"""
+
+REQUEUE_STALE_QUERY = """
+    UPDATE jobs SET status = 'queued', worker = NULL, claim_token = NULL, message = 'Re-queued'
+    WHERE status = 'running' AND heartbeat_at < NOW() - INTERVAL %s SECOND AND attempts < %s
+"""
+
+FAIL_STALE_QUERY = """
+    UPDATE jobs
+    SET status = 'failed', error = 'Worker stopped responding', message = 'Failed', finished_at = NOW()
+    WHERE status = 'running' AND heartbeat_at < NOW() - INTERVAL %s SECOND
+"""
+
+ACTIVE_JOB_QUERY = """
+    SELECT job_id FROM jobs
+    WHERE job_type = %s AND status IN ('queued', 'running') AND params = CAST(%s AS JSON)
+    ORDER BY created_at
+    LIMIT 1
+"""
+
+EXPIRED_RESULTS_QUERY = """
+    SELECT job_id, job_type, params FROM jobs
+    WHERE status IN ('succeeded', 'failed') AND finished_at < NOW() - INTERVAL %s HOUR
+"""
+
+_handlers = {}
+
+
+def handler(job_type):
+    """Register a function as the runner of one job type"""
+    def register(func):
+        _handlers[job_type] = func
+        return func
+    return register
+
+
+# ==================== Queue ====================
+
+def enqueue(job_type, params=None, user_id=None):
+    """
+    Queue a job for the worker pool
+
+    Returns:
+        The job ID, or None if the jobs table could not be written
+    """
+    job_id = uuid.uuid4().hex
+    result = execute_query(ENQUEUE_QUERY, (job_id, job_type, user_id, json.dumps(params or {}, default=str)))
+    if result is None:
+        logger.error(f"❌ Could not queue {job_type} job")
+        return None
+    logger.info(f"✅ Queued {job_type} job {job_id}")
+    return job_id
+
+
+def enqueue_once(job_type, params=None, user_id=None):
+    """enqueue() unless a job with the same type and params is already queued or running; returns its ID"""
+    active = execute_query(ACTIVE_JOB_QUERY, (job_type, json.dumps(params or {}, default=str)), fetchone=True)
+    if active:
+        return active['job_id']
+    return enqueue(job_type, params, user_id)
+
+
+def get_job(job_id, include_result=False):
+    """One job's public fields (plus result_path / result_mimetype if asked), or None"""
+    columns = PUBLIC_COLUMNS + (('result_path', 'result_mimetype') if include_result else ())
+    rows = execute_query(f"SELECT {', '.join(columns)} FROM jobs WHERE job_id = %s", (job_id,), fetch=True)
+    return rows[0] if rows else None
+
+
+def list_jobs(user_id=None, limit=20):
+    """Newest jobs first, optionally only one user's"""
+    where = "WHERE user_id = %s" if user_id is not None else ""
+    params = (user_id, limit) if user_id is not None else (limit,)
+    return execute_query(
+        f"SELECT {', '.join(PUBLIC_COLUMNS)} FROM jobs {where} ORDER BY created_at DESC LIMIT %s",
+        params, fetch=True
+    ) or []
+
+
+def describe(job):
+    """JSON-ready form of a get_job() / list_jobs() row"""
+    described = {column: job.get(column) for column in PUBLIC_COLUMNS}
+    described['progress'] = float(job.get('progress') or 0)
+    for column in ('created_at', 'started_at', 'finished_at'):
+        if described[column] is not None:
+            described[column] = described[column].isoformat()
+    return described
+
+
+def results_dir(job_id):
+    return os.path.join(Config.JOB_RESULTS_DIR, job_id)
+
+
+def purge_expired():
+    """Delete result files (and uploads of failed ingestions) of jobs finished more than JOB_RESULT_TTL_HOURS ago"""
+    rows = execute_query(EXPIRED_RESULTS_QUERY, (Config.JOB_RESULT_TTL_HOURS,), fetch=True) or []
+    for row in rows:
+        shutil.rmtree(results_dir(row['job_id']), ignore_errors=True)
+        if row['job_type'] == 'ingest_aqi':
+            params = json.loads(row['params']) if isinstance(row['params'], str) else (row['params'] or {})
+            if params.get('path') and os.path.exists(params['path']):
+                os.remove(params['path'])
+        execute_query("UPDATE jobs SET status = 'expired', result_path = NULL WHERE job_id = %s", (row['job_id'],))
+    if rows:
+        logger.info(f"✅ Expired {len(rows)} job results")
+    return len(rows)
+
+
+def recover_stale():
+    """Queue again (or fail, after JOB_MAX_ATTEMPTS) running jobs whose worker stopped heartbeating"""
+    execute_query(REQUEUE_STALE_QUERY, (Config.JOB_STALE_AFTER, Config.JOB_MAX_ATTEMPTS))
+    execute_query(FAIL_STALE_QUERY, (Config.JOB_STALE_AFTER,))
+
+
+# ==================== Worker ====================
+
+class JobContext:
+    """What a handler gets besides its params: progress reporting and a result directory"""
+
+    def __init__(self, job):
+        self.job_id = job['job_id']
+        self.user_id = job['user_id']
+        self.claim_token = job['claim_token']
+        self._last_progress = 0.0
+
+    def progress(self, fraction, message=None, force=False):
+        """Record progress (0..1); writes are throttled to one per PROGRESS_INTERVAL"""
+        now = time.monotonic()
+        if not force and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        execute_query(PROGRESS_QUERY, (round(min(max(fraction, 0.0), 1.0), 4), (message or '')[:255],
+                                       self.job_id, self.claim_token))
+
+    def result_path(self, filename):
+        """Path for a result file inside this job's own directory"""
+        directory = results_dir(self.job_id)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, filename)
+
+
+def claim(worker_name):
+    """Take the oldest queued job, or None"""
+    token = uuid.uuid4().hex
+    execute_query(CLAIM_QUERY, (worker_name, token))
+    rows = execute_query(
+        "SELECT job_id, job_type, user_id, params, claim_token, attempts FROM jobs WHERE claim_token = %s",
+        (token,), fetch=True
+    )
+    return rows[0] if rows else None
+
+
+def _heartbeat(job, stop):
+    while not stop.wait(Config.JOB_HEARTBEAT_INTERVAL):
+        execute_query(HEARTBEAT_QUERY, (job['job_id'], job['claim_token']))
+
+
+def run_job(job):
+    """Run a claimed job and record its result or error"""
+    started = time.perf_counter()
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job, stop), daemon=True).start()
+    try:
+        run = _handlers.get(job['job_type'])
+        if run is None:
+            raise ValueError(f"Unknown job type {job['job_type']}")
+        params = json.loads(job['params']) if isinstance(job['params'], str) else (job['params'] or {})
+        path, name, mimetype = run(params, JobContext(job))
+        execute_query(SUCCEED_QUERY, (path, name, mimetype, job['job_id'], job['claim_token']))
+        logger.info(f"✅ Job {job['job_id']} ({job['job_type']}) finished in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        logger.error(f"❌ Job {job['job_id']} ({job['job_type']}) failed: {e}", exc_info=True)
+        execute_query(FAIL_QUERY, (str(e)[:2000], job['job_id'], job['claim_token']))
+    finally:
+        stop.set()
+
+
+def work(worker_name, stop):
+    """One worker process: claim and run jobs until stop is set"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The pool parent handles Ctrl-C
+    for name in HANDLER_MODULES:
+        importlib.import_module(name)
+    logger.info(f"✅ Job worker {worker_name} started ({', '.join(sorted(_handlers))})")
+
+    import cube
+
+    maintained = refreshed = 0.0
+    while not stop.is_set():
+        if time.monotonic() - maintained > Config.JOB_STALE_AFTER:
+            maintained = time.monotonic()
+            try:
+                recover_stale()
+                purge_expired()
+            except Exception as e:
+                logger.warning(f"⚠️ Job maintenance failed: {e}")
+        if time.monotonic() - refreshed > Config.CUBE_REFRESH_INTERVAL:
+            # One worker (across hosts) recomputes; the others find the lock taken
+            refreshed = time.monotonic()
+            try:
+                cube.refresh_dirty()
+            except Exception as e:
+                logger.warning(f"⚠️ Cube refresh failed: {e}")
+        job = claim(worker_name)
+        if job is None:
+            stop.wait(Config.JOB_POLL_INTERVAL)
+            continue
+        run_job(job)
+
+
+def run_pool(processes=None):
+    """Start the worker processes and restart any that die, until SIGTERM / Ctrl-C"""
+    processes = processes or Config.JOB_WORKERS
+    context = multiprocessing.get_context('spawn' if os.name == 'nt' else 'fork')
+    stop = context.Event()
+    host = socket.gethostname()
+    workers = {}
+
+    def start(index):
+        worker = context.Process(target=work, args=(f'{host}:{os.getpid()}-{index}', stop),
+                                 name=f'job-worker-{index}', daemon=True)
+        worker.start()
+        workers[index] = worker
+
+    def shutdown(signum, frame):
+        logger.info("Stopping job workers after their current jobs")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    for index in range(processes):
+        start(index)
+
+    while not stop.is_set():
+        stop.wait(Config.JOB_POLL_INTERVAL)
+        for index, worker in list(workers.items()):
+            if not worker.is_alive() and not stop.is_set():
+                logger.warning(f"⚠️ Job worker {index} exited ({worker.exitcode}), restarting")
+                start(index)
+    for worker in workers.values():
+        worker.join()
+
+
+# ==================== Job Types ====================
+
+def _parse_day(value, default):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else default
+
+
+@handler('export_csv')
+def export_csv(params, context):
+    """
+    Every row of a table as CSV
+
+    Time-series tables are always read through the archive facade (cold
+    storage merged with MySQL), one month at a time to bound memory; the
+    others are streamed from a server-side cursor.
+
+    Params:
+        table: One of EXPORT_TABLES
+        start, end: Optional YYYY-MM-DD range (end exclusive) for the
+                    time-series tables (default: everything)
+    """
+    table = params['table']
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Table {table} cannot be exported")
+    path = context.result_path(f'{table}.csv')
+    name = f'{table}_{datetime.now().strftime("%Y%m%d")}.csv'
+
+    import archive
+    written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if table in archive.TABLE_COLUMNS:
+            start = _parse_day(params.get('start'), date(1970, 1, 1))
+            end = _parse_day(params.get('end'), date.today() + timedelta(days=1))
+            # Skip the empty months before the oldest archived or live row
+            months = sorted(archive.load_manifest().get(table, {}).get('months', {}))
+            oldest = (execute_query(f"SELECT MIN(date) AS oldest FROM {table}", fetchone=True) or {}).get('oldest')
+            candidates = [day for day in (oldest, date.fromisoformat(f'{months[0]}-01') if months else None) if day]
+            month = archive.month_start(max(start, min(candidates))) if candidates else end
+            total_months = max(1, (end.year - month.year) * 12 + end.month - month.month + 1)
+
+            columns = archive.TABLE_COLUMNS[table]
+            writer.writerow(columns)
+            done = 0
+            while month < end:
+                frame = archive.read_range(table, max(start, month), min(end, archive.month_start(month, 1)))
+                for row in archive.frame_rows(table, frame):
+                    writer.writerow([row[column] for column in columns])
+                written += len(frame)
+                done += 1
+                context.progress(done / total_months, f'{month:%Y-%m}: {written:,} rows')
+                month = archive.month_start(month, 1)
+        else:
+            total = (execute_query(f"SELECT COUNT(*) AS total FROM {table}", fetchone=True) or {}).get('total') or 0
+            with get_db_connection(read_only=True) as connection:
+                cursor = connection.cursor()
+                cursor.execute(f"SELECT * FROM {table}")
+                writer.writerow(cursor.column_names)
+                while True:
+                    rows = cursor.fetchmany(EXPORT_BATCH_ROWS)
+                    if not rows:
+                        break
+                    writer.writerows(rows)
+                    written += len(rows)
+                    context.progress(written / max(total, 1), f'{written:,} of {total:,} rows')
+                cursor.close()
+
+    context.progress(1, f'{written:,} rows', force=True)
+    return path, name, 'text/csv'
+
+
+@handler('ingest_aqi')
+def ingest_aqi(params, context):
+    """
+    Bulk-load an uploaded AQI file (CSV or XLSX)
+
+    Columns: city_id, station_id, date, aqi_value and optionally the
+    pollutant columns (pm25, pm10, o3, no2, so2, co). Rows whose station is
+    unknown or belongs to another city are rejected like unknown cities.
+    Valid rows are inserted in batches inside one transaction (with their
+    latest_reading upserts and dirty cube months), so a failed or re-run job
+    never leaves half a file behind; rejected rows are listed in the JSON
+    report that becomes the job's result.
+
+    Params:
+        path: The uploaded file (kept until the job succeeds, so a re-queued job can read it again)
+        filename: Original file name, for the report
+    """
+    import pandas as pd
+
+    import city_stats
+    import cube
+    import latest_reading
+    import live_updates
+    import response_cache
+
+    source = params['path']
+    context.progress(0, 'Reading file', force=True)
+    if source.lower().endswith('.xlsx'):
+        frame = pd.read_excel(source, dtype=str)
+    else:
+        frame = pd.read_csv(source, dtype=str)
+
+    frame.columns = [str(column).strip().lower() for column in frame.columns]
+    # aqi.station_id and pollutants.station_id are NOT NULL
+    missing = {'city_id', 'station_id', 'date', 'aqi_value'} - set(frame.columns)
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(sorted(missing))}")
+    pollutants = [name for name in latest_reading.POLLUTANTS if name in frame.columns]
+
+    # Vectorized validation; rows with any unparseable required value are rejected
+    parsed = pd.DataFrame({
+        'city_id': pd.to_numeric(frame['city_id'], errors='coerce'),
+        'station_id': pd.to_numeric(frame['station_id'], errors='coerce'),
+        'date': pd.to_datetime(frame['date'], errors='coerce'),
+        'aqi_value': pd.to_numeric(frame['aqi_value'], errors='coerce'),
+    })
+    for name in pollutants:
+        parsed[name] = pd.to_numeric(frame[name], errors='coerce')
+    invalid = parsed[['city_id', 'station_id', 'date', 'aqi_value']].isna().any(axis=1) | (parsed['aqi_value'] < 0)
+    cities = execute_query("SELECT city_id FROM cities", fetch=True)
+    stations = execute_query("SELECT station_id, city_id FROM stations", fetch=True)
+    if cities is None or stations is None:
+        raise RuntimeError("Could not read cities and stations for validation")
+    invalid |= ~parsed['city_id'].isin({row['city_id'] for row in cities})
+    station_cities = parsed['station_id'].map({row['station_id']: row['city_id'] for row in stations})
+    invalid |= station_cities != parsed['city_id']
+
+    errors = [
+        {'line': int(index) + 2, 'row': {key: (None if pd.isna(value) else value) for key, value in record.items()}}
+        for index, record in frame[invalid].head(INGEST_MAX_ERRORS).to_dict('index').items()
+    ]
+    valid = parsed[~invalid]
+
+    readings = []
+    for record in valid.to_dict('records'):
+        reading = {
+            'city_id': int(record['city_id']),
+            'station_id': int(record['station_id']),
+            'date': record['date'].date(),
+            'aqi_value': int(round(record['aqi_value']))
+        }
+        for name in pollutants:
+            reading[name] = None if pd.isna(record[name]) else float(record[name])
+        readings.append(reading)
+
+    aqi_query = "INSERT INTO aqi (city_id, station_id, date, aqi_value) VALUES (%s, %s, %s, %s)"
+    pollutant_columns = ['city_id', 'station_id', 'date'] + pollutants
+    pollutant_query = (f"INSERT INTO pollutants ({', '.join(pollutant_columns)}) "
+                       f"VALUES ({', '.join(['%s'] * len(pollutant_columns))})")
+    inserted = 0
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        for offset in range(0, len(readings), INGEST_BATCH_ROWS):
+            batch = readings[offset:offset + INGEST_BATCH_ROWS]
+            cursor.executemany(aqi_query, [(r['city_id'], r['station_id'], r['date'], r['aqi_value']) for r in batch])
+            if pollutants:
+                cursor.executemany(pollutant_query, [tuple(r[c] for c in pollutant_columns) for r in batch])
+            latest_reading.record(batch, cursor)
+            cube.mark_dirty([r['date'] for r in batch], cursor)
+            inserted += len(batch)
+            context.progress(inserted / len(readings), f'{inserted:,} of {len(readings):,} rows inserted')
+        connection.commit()
+        cursor.close()
+
+    for city_id in sorted({reading['city_id'] for reading in readings}):
+        city_stats.refresh(city_id)
+    if readings:
+        response_cache.bump_data_version()
+
+    # Each city's newest ingested reading reaches /api/stream clients through the relay
+    newest = {}
+    for reading in readings:
+        if reading['city_id'] not in newest or reading['date'] >= newest[reading['city_id']]['date']:
+            newest[reading['city_id']] = reading
+    for reading in newest.values():
+        live_updates.publish_reading(reading['city_id'], reading['date'], reading['aqi_value'],
+                                     {name: reading[name] for name in pollutants}, station_id=reading['station_id'])
+
+    report = {
+        'file': params.get('filename'),
+        'rows': len(frame),
+        'inserted': inserted,
+        'rejected': int(invalid.sum()),
+        'pollutant_columns': pollutants,
+        'errors': errors
+    }
+    path = context.result_path('ingest_report.json')
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    if os.path.exists(source):
+        os.remove(source)
+    context.progress(1, f'{inserted:,} rows inserted, {report["rejected"]:,} rejected', force=True)
+    return path, f'ingest_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json', 'application/json'
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL, logging.INFO))
+    parser = argparse.ArgumentParser(description='Background job worker pool')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    worker_parser = subcommands.add_parser('worker', help='Run the worker pool')
+    worker_parser.add_argument('--processes', type=int, help='Worker processes (default JOB_WORKERS)')
+    subcommands.add_parser('purge', help='Delete expired job results')
+    args = parser.parse_args()
+
+    # Run through the importable module so workers see the handlers it registers
+    import jobs
+    if args.command == 'worker':
+        jobs.run_pool(args.processes)
+    else:
+        jobs.purge_expired()
@@ -0,0 +1,128 @@
+"""
+Latest Reading Module
+Maintains the latest_reading table (database/create_latest_reading.sql): the
+newest AQI and pollutant values per station (scope 'station') and per city
+(scope 'city'). Write paths hand over their whole batch; it is reduced to
+one row per key in Python and upserted with a single multi-row statement,
+which replaces the per-row work of the old trg_after_aqi_insert trigger.
+
+Usage:
+    python latest_reading.py        # rebuild from aqi and pollutants
+"""
+
+import logging
+
+from database import execute_query
+
+logger = logging.getLogger(__name__)
+
+POLLUTANTS = ('pm25', 'pm10', 'o3', 'no2', 'so2', 'co')
+COLUMNS = ('scope', 'scope_id', 'city_id', 'station_id', 'date', 'aqi_value') + POLLUTANTS
+
+# An older reading never replaces a newer one; date moves last so the IFs see the stored value
+UPSERT_TEMPLATE = """
+    INSERT INTO latest_reading ({columns})
+    VALUES {rows}
+    ON DUPLICATE KEY UPDATE
+        {assignments},
+        date = GREATEST(date, VALUES(date))
+"""
+
+REBUILD_TEMPLATE = """
+    INSERT INTO latest_reading ({columns})
+    SELECT '{scope}', a.{key}, a.city_id, a.station_id, a.date, a.aqi_value,
+           p.pm25, p.pm10, p.o3, p.no2, p.so2, p.co
+    FROM aqi a
+    JOIN (SELECT {key}, MAX(date) AS date FROM aqi GROUP BY {key}) m
+         ON m.{key} = a.{key} AND m.date = a.date
+    LEFT JOIN pollutants p ON p.station_id = a.station_id AND p.date = a.date
+    ON DUPLICATE KEY UPDATE
+        {assignments}
+"""
+
+
+def _upsert_query(row_count):
+    placeholders = '(' + ', '.join(['%s'] * len(COLUMNS)) + ')'
+    assignments = ',\n        '.join(
+        f'{column} = IF(VALUES(date) >= date, VALUES({column}), {column})'
+        for column in ('city_id', 'station_id', 'aqi_value') + POLLUTANTS
+    )
+    return UPSERT_TEMPLATE.format(columns=', '.join(COLUMNS), rows=', '.join([placeholders] * row_count),
+                                  assignments=assignments)
+
+
+def _rebuild_query(scope, key):
+    assignments = ', '.join(f'{column} = VALUES({column})' for column in COLUMNS[2:])
+    return REBUILD_TEMPLATE.format(columns=', '.join(COLUMNS), scope=scope, key=key, assignments=assignments)
+
+
+REBUILD_QUERIES = (_rebuild_query('station', 'station_id'), _rebuild_query('city', 'city_id'))
+
+
+def merge(aqi_rows, pollutant_rows=()):
+    """
+    Attach each AQI row's pollutants (same station and date)
+
+    Args:
+        aqi_rows: Dicts with city_id, station_id, date, aqi_value
+        pollutant_rows: Dicts with station_id, date and the pollutant columns
+    """
+    pollutants = {(row.get('station_id'), str(row['date'])): row for row in pollutant_rows}
+    readings = []
+    for row in aqi_rows:
+        reading = dict(row)
+        match = pollutants.get((row.get('station_id'), str(row['date'])), {})
+        for name in POLLUTANTS:
+            reading.setdefault(name, match.get(name))
+        readings.append(reading)
+    return readings
+
+
+def latest_rows(readings):
+    """Reduce readings to the newest one per station and per city (later input wins ties)"""
+    latest = {}
+    for reading in readings:
+        keys = [('city', reading['city_id'])]
+        if reading.get('station_id') is not None:
+            keys.append(('station', reading['station_id']))
+        for key in keys:
+            current = latest.get(key)
+            if current is None or str(reading['date']) >= str(current['date']):
+                latest[key] = reading
+    return [
+        (scope, scope_id, reading['city_id'], reading.get('station_id'), reading['date'],
+         int(round(float(reading['aqi_value'])))) + tuple(reading.get(name) for name in POLLUTANTS)
+        for (scope, scope_id), reading in latest.items()
+    ]
+
+
+def record(readings, cursor=None):
+    """
+    Upsert a batch of new or corrected readings in one statement
+
+    Args:
+        readings: Dicts with city_id, station_id (may be None), date,
+                  aqi_value and optionally the pollutant columns (see merge())
+        cursor: Run inside the caller's transaction instead of execute_query
+    """
+    rows = latest_rows(readings)
+    if not rows:
+        return
+    query = _upsert_query(len(rows))
+    params = tuple(value for row in rows for value in row)
+    if cursor is not None:
+        cursor.execute(query, params)
+    else:
+        execute_query(query, params)
+
+
+def rebuild():
+    """Recompute every row from aqi and pollutants"""
+    for query in REBUILD_QUERIES:
+        execute_query(query)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    rebuild()
+    logger.info("✅ latest_reading rebuilt")
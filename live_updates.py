@@ -0,0 +1,244 @@
+"""
+Live Updates Module
+In-process publish/subscribe hub behind the /api/stream Server-Sent Events
+endpoint. Write paths publish new AQI / pollutant readings and live
+OpenWeatherMap snapshot changes per city; every connected client holds a
+bounded queue that the hub fans events out to, so streaming costs no
+database polling per client.
+
+Other processes (gunicorn workers, the asgi_api.py tier, job workers,
+synthetic_data.py ingestion) reach the hub through the live_events table
+when Config.LIVE_RELAY_ENABLED is set (the default): publish() appends the event there and one
+relay thread per process tails the table and re-publishes foreign events
+locally (database/create_live_events.sql). Event IDs are then the
+table's event_id, so a client reconnecting to another worker resumes
+correctly from its Last-Event-ID.
+
+Every client holds a server thread for as long as it listens, so each
+process accepts at most Config.LIVE_MAX_SUBSCRIBERS streams.
+"""
+
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from collections import deque
+
+from config import Config
+from database import execute_query
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ('reading', 'snapshot')
+
+# Identifies events this process already delivered when they come back through the relay
+ORIGIN = f'{socket.gethostname()}:{os.getpid()}'
+
+
+class Subscription:
+    """One connected client: a bounded event queue filtered by city"""
+
+    def __init__(self, city_ids):
+        self.city_ids = frozenset(city_ids) if city_ids else None  # None = every city
+        self.events = queue.Queue(maxsize=Config.LIVE_QUEUE_SIZE)
+        self.dropped = 0
+
+    def wants(self, event):
+        return self.city_ids is None or event['city_id'] in self.city_ids
+
+    def offer(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            # A stalled client loses events rather than slowing down publishers
+            self.dropped += 1
+
+
+class Hub:
+    """Fan-out of published events to subscriptions, with a short replay buffer for Last-Event-ID"""
+
+    def __init__(self, history_size):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._history = deque(maxlen=history_size)
+        self._last_id = 0
+        self._snapshots = {}
+        self._rejected = 0
+
+    def subscribe(self, city_ids=None, last_event_id=None):
+        """New subscription, or None if the process already serves Config.LIVE_MAX_SUBSCRIBERS"""
+        subscription = Subscription(city_ids)
+        with self._lock:
+            if Config.LIVE_MAX_SUBSCRIBERS and len(self._subscriptions) >= Config.LIVE_MAX_SUBSCRIBERS:
+                self._rejected += 1
+                return None
+            if last_event_id is not None:
+                for event in self._history:
+                    if event['id'] > last_event_id and subscription.wants(event):
+                        subscription.offer(event)
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event_type, city_id, data, event_id=None):
+        """
+        Deliver an event to every matching subscription; returns the event
+
+        Args:
+            event_id: live_events.event_id of a relayed event (default: next local ID)
+        """
+        with self._lock:
+            if event_id is None:
+                event_id = self._last_id + 1
+            self._last_id = max(self._last_id, event_id)
+            event = {'id': event_id, 'type': event_type, 'city_id': city_id, 'data': data}
+            self._history.append(event)
+            subscriptions = [s for s in self._subscriptions if s.wants(event)]
+        for subscription in subscriptions:
+            subscription.offer(event)
+        return event
+
+    def snapshot_changed(self, city_id, snapshot):
+        """True (and remembered) if a live snapshot differs from the last one published for the city"""
+        with self._lock:
+            if self._snapshots.get(city_id) == snapshot:
+                return False
+            self._snapshots[city_id] = snapshot
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscriptions),
+                'max_subscribers': Config.LIVE_MAX_SUBSCRIBERS,
+                'rejected_subscriptions': self._rejected,
+                'dropped_events': sum(s.dropped for s in self._subscriptions)
+            }
+
+
+hub = Hub(Config.LIVE_HISTORY_SIZE)
+
+
+# ==================== Publishing ====================
+
+def _to_json(value):
+    return value if isinstance(value, (int, float, str, type(None))) else str(value)
+
+
+def publish(event_type, city_id, data, relay=True):
+    """
+    Publish an event locally and, if enabled, to the other processes through live_events
+
+    With the relay the event is written first and published under its
+    event_id, the ID every other process uses for it as well.
+    """
+    data = {key: _to_json(value) for key, value in data.items()}
+    event_id = None
+    if relay and Config.LIVE_RELAY_ENABLED:
+        event_id = execute_query(
+            "INSERT INTO live_events (origin, event_type, city_id, payload) VALUES (%s, %s, %s, %s)",
+            (ORIGIN, event_type, city_id, json.dumps(data))
+        ) or None
+        if event_id is None:
+            logger.warning(f"⚠️ Live event for city {city_id} not relayed, delivering it locally only")
+    return hub.publish(event_type, city_id, data, event_id)
+
+
+def publish_reading(city_id, date, aqi_value, pollutants=None, station_id=None):
+    """A new or corrected AQI reading (with its pollutant values) for a city"""
+    data = {'date': date, 'aqi_value': aqi_value, 'station_id': station_id}
+    data.update(pollutants or {})
+    return publish('reading', city_id, data)
+
+
+def publish_snapshot(city_id, live_data):
+    """The city's OpenWeatherMap snapshot; only changes are published"""
+    if live_data and hub.snapshot_changed(city_id, live_data):
+        return publish('snapshot', city_id, live_data)
+    return None
+
+
+# ==================== Relay ====================
+
+_relay_lock = threading.Lock()
+_relay_thread = None
+
+
+def _relay_loop():
+    """Tail live_events and re-publish events written by other processes"""
+    last_id = None
+    polls = 0
+    while True:
+        try:
+            if last_id is None:
+                result = execute_query("SELECT COALESCE(MAX(event_id), 0) AS last_id FROM live_events", fetch=True)
+                last_id = result[0]['last_id'] if result else None
+            else:
+                rows = execute_query(
+                    """SELECT event_id, origin, event_type, city_id, payload FROM live_events
+                       WHERE event_id > %s ORDER BY event_id LIMIT 500""",
+                    (last_id,), fetch=True
+                ) or []
+                for row in rows:
+                    last_id = row['event_id']
+                    if row['origin'] != ORIGIN:
+                        hub.publish(row['event_type'], row['city_id'], json.loads(row['payload']), row['event_id'])
+
+            polls += 1
+            if polls % 600 == 0:
+                execute_query("DELETE FROM live_events WHERE created_at < NOW() - INTERVAL 1 HOUR")
+        except Exception as e:
+            logger.warning(f"⚠️ Live event relay error: {e}")
+        time.sleep(Config.LIVE_RELAY_INTERVAL)
+
+
+def start_relay():
+    """Start this process's relay thread once (no-op unless Config.LIVE_RELAY_ENABLED)"""
+    global _relay_thread
+    if not Config.LIVE_RELAY_ENABLED:
+        return
+    with _relay_lock:
+        if _relay_thread is None:
+            _relay_thread = threading.Thread(target=_relay_loop, name='live-relay', daemon=True)
+            _relay_thread.start()
+            logger.info("✅ Live event relay started")
+
+
+# ==================== Server-Sent Events ====================
+
+def format_event(event):
+    return (f"id: {event['id']}\nevent: {event['type']}\n"
+            f"data: {json.dumps({'city_id': event['city_id'], **event['data']}, sort_keys=True)}\n\n")
+
+
+def subscribe(city_ids=None, last_event_id=None):
+    """Subscription for one client (None when the process is at Config.LIVE_MAX_SUBSCRIBERS)"""
+    start_relay()
+    return hub.subscribe(city_ids, last_event_id)
+
+
+def stream(subscription):
+    """
+    Generator of SSE frames for one subscription
+
+    Sends a retry hint first and a comment line every Config.LIVE_HEARTBEAT
+    seconds of silence, which keeps proxies from closing the connection and
+    lets the server notice disconnected clients.
+    """
+    try:
+        yield f"retry: {Config.LIVE_RETRY_MS}\n\n"
+        while True:
+            try:
+                event = subscription.events.get(timeout=Config.LIVE_HEARTBEAT)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,92 @@
+"""
+Page Fragment Cache Module
+Caches the rendered blocks (title, extra_css, content, extra_js) of the heavy
+HTML pages. base.html - navigation, user name and flash messages - is still
+rendered per request, so a hit skips the page's queries and the expensive
+part of the template rendering while staying correct for every user
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, request, session, render_template
+from markupsafe import Markup
+
+from config import Config
+from response_cache import get_data_version
+import singleflight
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_BLOCKS = ('title', 'extra_css', 'content', 'extra_js')
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Concurrent misses for the same page key run the queries and rendering once
+_flights = singleflight.Group('page_cache')
+
+
+def render_blocks(template_name, context):
+    """Render the FRAGMENT_BLOCKS of a page template with the given context"""
+    template = current_app.jinja_env.get_template(template_name)
+    context = dict(context)
+    current_app.update_template_context(context)
+    jinja_context = template.new_context(context)
+
+    return {
+        name: Markup(''.join(template.blocks[name](jinja_context)))
+        for name in FRAGMENT_BLOCKS
+        if name in template.blocks
+    }
+
+
+def _build(key, template_name, build_context):
+    fragments = render_blocks(template_name, build_context())
+    with _cache_lock:
+        _cache[key] = (time.monotonic(), fragments)
+        while len(_cache) > Config.PAGE_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return fragments
+
+
+def render_cached_page(template_name, build_context, params=(), vary_on=('role', 'city_id')):
+    """
+    Render a page through the fragment cache
+
+    Args:
+        template_name: Page template extending base.html
+        build_context: Callable returning the template context (runs the queries)
+        params: Query parameters that change the page
+        vary_on: Session keys that change the page
+
+    Returns:
+        Rendered HTML
+    """
+    key = (
+        template_name,
+        tuple((name, request.args.get(name)) for name in params),
+        tuple((name, session.get(name)) for name in vary_on),
+        get_data_version()
+    )
+
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and time.monotonic() - entry[0] < Config.PAGE_CACHE_TTL:
+            _cache.move_to_end(key)
+            fragments = entry[1]
+        else:
+            fragments = None
+
+    if fragments is None:
+        fragments = _flights.do(key, _build, key, template_name, build_context)
+
+    return render_template('fragment_page.html', fragments=fragments)
+
+
+def clear():
+    """Drop every cached fragment (called by write routes)"""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,367 @@
+"""
+City Report Builder
+Monthly and annual city reports (AQI trend chart, AQI category breakdown,
+pollutant averages, emissions and health impact) rendered as PDF (reportlab)
+or XLSX (xlsxwriter) by the background job workers.
+
+Reports are stored content-addressed: the file name is a digest of (city,
+period, data version, format, layout), so a repeat request is a single
+os.path.exists() and a file send - no query and no rendering - until a write
+bumps the data version. Only the newest file per city, period and format is
+kept.
+
+Usage:
+    python report_builder.py --period 2025-03              # every city, both formats
+    python report_builder.py --period 2025 --city 3 --format pdf
+"""
+
+import argparse
+import glob
+import hashlib
+import importlib.util
+import logging
+import os
+from datetime import date, datetime
+
+from config import Config
+from database import execute_query
+import exposure
+import jobs
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout changes so stored reports are rebuilt
+REPORT_LAYOUT_VERSION = 1
+
+MIMETYPES = {
+    'pdf': 'application/pdf',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+RENDERER_MODULES = {'pdf': 'reportlab', 'xlsx': 'xlsxwriter'}
+
+POLLUTANTS = ('pm25', 'pm10', 'o3', 'no2', 'so2', 'co')
+
+CITY_QUERY = "SELECT city_id, city_name, state_name FROM cities WHERE city_id = %s"
+EMISSIONS_QUERY = "SELECT * FROM emissions_by_city WHERE city_id = %s AND year <= %s ORDER BY year DESC LIMIT 1"
+HEALTH_QUERY = """
+    SELECT year, total_population, asthma_cases, lung_cancer_cases, respiratory_cases,
+           hospital_visits, pollution_deaths, total_cases, cases_per_100k, deaths_per_100k,
+           total_cases_yoy, avg_aqi
+    FROM health_analytics
+    WHERE city_id = %s AND year <= %s
+    ORDER BY year DESC
+    LIMIT 1
+"""
+
+
+def available_formats():
+    """Formats whose renderer library is installed"""
+    return [fmt for fmt, module in RENDERER_MODULES.items() if importlib.util.find_spec(module)]
+
+
+def parse_period(period):
+    """
+    '2025-03' (month) or '2025' (year) -> (start, end) dates, end exclusive
+
+    Raises:
+        ValueError for anything else
+    """
+    if len(period) == 7:
+        start = datetime.strptime(period, '%Y-%m').date()
+        end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    elif len(period) == 4:
+        start = date(int(period), 1, 1)
+        end = date(start.year + 1, 1, 1)
+    else:
+        raise ValueError('period must be YYYY-MM or YYYY')
+    return start, end
+
+
+def report_path(city_id, period, fmt, data_version):
+    """Content-addressed location of one report"""
+    digest = hashlib.sha256(
+        f'{REPORT_LAYOUT_VERSION}:{city_id}:{period}:{data_version}:{fmt}'.encode()
+    ).hexdigest()[:32]
+    return os.path.join(Config.REPORTS_DIR, str(city_id), period, f'{digest}.{fmt}')
+
+
+def is_report_of(path, city_id, period, fmt):
+    """True if path is a report_path() of this city, period and format (any data version)"""
+    directory = os.path.join(Config.REPORTS_DIR, str(city_id), period)
+    return (bool(path) and path.endswith(f'.{fmt}')
+            and os.path.dirname(os.path.abspath(path)) == os.path.abspath(directory))
+
+
+def download_name(city_name, period, fmt):
+    slug = ''.join(ch if ch.isalnum() else '_' for ch in (city_name or 'city').lower())
+    return f'aqi_report_{slug}_{period}.{fmt}'
+
+
+def cached_report(city_id, period, fmt):
+    """Path of the report for the current data version if it is on disk, else None"""
+    import response_cache
+
+    path = report_path(city_id, period, fmt, response_cache.get_data_version())
+    return path if os.path.exists(path) else None
+
+
+# ==================== Data ====================
+
+def collect(city_id, period):
+    """Everything a report shows, as plain Python values"""
+    import archive
+
+    start, end = parse_period(period)
+    city = execute_query(CITY_QUERY, (city_id,), fetchone=True)
+    if not city:
+        raise ValueError(f"City {city_id} does not exist")
+
+    # Daily city AQI = mean over the city's stations, archived months included
+    aqi = archive.read_range('aqi', start, end, city_id=city_id)
+    daily = aqi.groupby('date')['aqi_value'].agg(['mean', 'min', 'max']).reset_index()
+    pollutants = archive.read_range('pollutants', start, end, city_id=city_id)
+
+    if len(period) == 4:
+        # Annual reports chart monthly means; monthly reports chart days
+        trend = daily.groupby(daily['date'].dt.to_period('M'))['mean'].mean()
+        trend_points = [(str(label), round(float(value), 1)) for label, value in trend.items()]
+    else:
+        trend_points = [(row.date.strftime('%d'), round(float(row.mean), 1)) for row in daily.itertuples()]
+
+    emissions = execute_query(EMISSIONS_QUERY, (city_id, start.year), fetchone=True) or {}
+    health = execute_query(HEALTH_QUERY, (city_id, start.year), fetchone=True) or {}
+
+    return {
+        'city': city,
+        'period': period,
+        'start': start,
+        'end': end,
+        'generated_at': datetime.now().replace(microsecond=0),
+        'readings': int(len(aqi)),
+        'daily': [
+            {'date': row.date.date(), 'mean': round(float(row.mean), 1), 'min': int(row.min), 'max': int(row.max)}
+            for row in daily.itertuples()
+        ],
+        'trend': trend_points,
+        'exposure': exposure.compute_exposure([d.date() for d in daily['date']], daily['mean'].tolist()),
+        'pollutants': {
+            name: (None if pollutants.empty or pollutants[name].isna().all() else round(float(pollutants[name].mean()), 2))
+            for name in POLLUTANTS
+        },
+        'emissions': {
+            key: int(value) if key == 'year' else float(value) for key, value in emissions.items()
+            if key not in ('emission_id', 'city_id') and value is not None and not isinstance(value, str)
+        },
+        'health': {key: value for key, value in health.items() if value is not None}
+    }
+
+
+def summary_rows(data):
+    exposure_data = data['exposure']
+    streak = exposure_data['longest_unhealthy_streak']
+    rows = [
+        ('City', f"{data['city']['city_name']} ({data['city'].get('state_name') or ''})"),
+        ('Period', f"{data['start']} to {data['end']} (exclusive)"),
+        ('Readings', data['readings']),
+        ('Days with data', exposure_data['days']),
+        ('Mean AQI', exposure_data['mean_aqi']),
+    ]
+    rows += [(f'AQI {name.upper()}', value) for name, value in exposure_data['percentiles'].items()]
+    rows.append(('Longest Unhealthy+ streak (days)', streak['days']))
+    return rows
+
+
+# ==================== Renderers ====================
+
+def render_xlsx(data, path):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {'default_date_format': 'yyyy-mm-dd'})
+    bold = workbook.add_format({'bold': True})
+    title = workbook.add_format({'bold': True, 'font_size': 14})
+
+    summary = workbook.add_worksheet('Summary')
+    summary.set_column(0, 0, 34)
+    summary.set_column(1, 1, 28)
+    summary.write(0, 0, f"AQI Report - {data['city']['city_name']} {data['period']}", title)
+    for index, (label, value) in enumerate(summary_rows(data), start=2):
+        summary.write(index, 0, label, bold)
+        summary.write(index, 1, '' if value is None else value)
+
+    row = len(summary_rows(data)) + 4
+    summary.write(row, 0, 'AQI category', bold)
+    summary.write(row, 1, 'Days', bold)
+    for offset, (name, days) in enumerate(data['exposure']['category_days'].items(), start=1):
+        summary.write(row + offset, 0, name)
+        summary.write(row + offset, 1, days)
+    categories = workbook.add_chart({'type': 'column'})
+    categories.add_series({'name': 'Days', 'categories': ['Summary', row + 1, 0, row + 6, 0],
+                           'values': ['Summary', row + 1, 1, row + 6, 1]})
+    categories.set_title({'name': 'Days per AQI category'})
+    categories.set_legend({'none': True})
+    summary.insert_chart(1, 3, categories)
+
+    trend = workbook.add_worksheet('AQI Trend')
+    trend.write_row(0, 0, ['Period', 'Mean AQI'], bold)
+    for index, (label, value) in enumerate(data['trend'], start=1):
+        trend.write_row(index, 0, [label, value])
+    if data['trend']:
+        chart = workbook.add_chart({'type': 'line'})
+        chart.add_series({'name': 'Mean AQI', 'categories': ['AQI Trend', 1, 0, len(data['trend']), 0],
+                          'values': ['AQI Trend', 1, 1, len(data['trend']), 1]})
+        chart.set_title({'name': 'AQI trend'})
+        trend.insert_chart(1, 3, chart)
+
+    daily = workbook.add_worksheet('Daily AQI')
+    daily.write_row(0, 0, ['Date', 'Mean', 'Min', 'Max'], bold)
+    for index, day in enumerate(data['daily'], start=1):
+        daily.write_datetime(index, 0, datetime.combine(day['date'], datetime.min.time()))
+        daily.write_row(index, 1, [day['mean'], day['min'], day['max']])
+
+    details = workbook.add_worksheet('Pollutants, Emissions, Health')
+    details.set_column(0, 0, 28)
+    row = 0
+    for heading, values in (('Mean pollutant concentration', data['pollutants']),
+                            ('Emissions (tonnes/year)', data['emissions']),
+                            ('Health impact', data['health'])):
+        details.write(row, 0, heading, bold)
+        for label, value in values.items():
+            row += 1
+            details.write(row, 0, label)
+            details.write(row, 1, '' if value is None else value)
+        row += 2
+
+    workbook.close()
+
+
+def render_pdf(data, path):
+    from reportlab.graphics.charts.barcharts import VerticalBarChart
+    from reportlab.graphics.charts.linecharts import HorizontalLineChart
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    table_style = TableStyle([
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.lightgrey),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ])
+
+    def key_value_table(rows):
+        return Table([[label, '' if value is None else str(value)] for label, value in rows],
+                     colWidths=[7 * cm, 8 * cm], style=table_style)
+
+    story = [
+        Paragraph(f"AQI Report - {data['city']['city_name']}, {data['period']}", styles['Title']),
+        Paragraph(f"Generated {data['generated_at']}", styles['Normal']),
+        Spacer(1, 0.4 * cm),
+        key_value_table(summary_rows(data)),
+        Spacer(1, 0.6 * cm),
+        Paragraph('AQI trend', styles['Heading2']),
+    ]
+
+    if data['trend']:
+        drawing = Drawing(16 * cm, 6 * cm)
+        chart = HorizontalLineChart()
+        chart.x, chart.y, chart.width, chart.height = 1.2 * cm, 1 * cm, 14 * cm, 4.5 * cm
+        chart.data = [[value for _, value in data['trend']]]
+        chart.categoryAxis.categoryNames = [label for label, _ in data['trend']]
+        chart.categoryAxis.labels.fontSize = 6
+        chart.valueAxis.valueMin = 0
+        chart.lines[0].strokeColor = colors.HexColor('#667eea')
+        drawing.add(chart)
+        story.append(drawing)
+    else:
+        story.append(Paragraph('No AQI readings in this period.', styles['Normal']))
+
+    category_days = data['exposure']['category_days']
+    drawing = Drawing(16 * cm, 6 * cm)
+    bars = VerticalBarChart()
+    bars.x, bars.y, bars.width, bars.height = 1.2 * cm, 1.5 * cm, 14 * cm, 4 * cm
+    bars.data = [list(category_days.values())]
+    bars.categoryAxis.categoryNames = [name.replace(' for Sensitive Groups', ' (SG)') for name in category_days]
+    bars.categoryAxis.labels.fontSize = 6
+    bars.valueAxis.valueMin = 0
+    bars.bars[0].fillColor = colors.HexColor('#fd7e14')
+    drawing.add(bars)
+    story += [Paragraph('Days per AQI category', styles['Heading2']), drawing]
+
+    for heading, values in (('Mean pollutant concentration', data['pollutants']),
+                            ('Emissions (tonnes/year)', data['emissions']),
+                            ('Health impact', data['health'])):
+        story.append(Paragraph(heading, styles['Heading2']))
+        story.append(key_value_table(values.items()) if values else Paragraph('No data.', styles['Normal']))
+
+    SimpleDocTemplate(path, pagesize=A4, title=f"AQI Report {data['period']}").build(story)
+
+
+RENDERERS = {'pdf': render_pdf, 'xlsx': render_xlsx}
+
+
+# ==================== Build ====================
+
+def build(city_id, period, fmt, progress=None):
+    """
+    Render one report unless the current data version's file already exists
+
+    The data version is read before the data, so a write during the build
+    can only make the stored file newer than its key, never older.
+
+    Returns:
+        (path, city_name)
+    """
+    import response_cache
+
+    if fmt not in RENDERERS:
+        raise ValueError(f"Unknown report format {fmt}")
+    path = report_path(city_id, period, fmt, response_cache.get_data_version())
+    city = execute_query(CITY_QUERY, (city_id,), fetchone=True) or {}
+    if os.path.exists(path):
+        return path, city.get('city_name')
+
+    progress = progress or (lambda fraction, message=None, force=False: None)
+    progress(0.1, 'Collecting data', force=True)
+    data = collect(city_id, period)
+    progress(0.6, 'Rendering', force=True)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f'{path}.{os.getpid()}.tmp'
+    RENDERERS[fmt](data, partial)
+    os.replace(partial, path)
+
+    # Older data versions of the same report are never requested again
+    for stale in glob.glob(os.path.join(os.path.dirname(path), f'*.{fmt}')):
+        if stale != path:
+            os.remove(stale)
+
+    logger.info(f"✅ Built {fmt} report for city {city_id}, {period}")
+    return path, data['city']['city_name']
+
+
+@jobs.handler('city_report')
+def build_job(params, context):
+    """Job type city_report: params city_id, period, format"""
+    path, city_name = build(params['city_id'], params['period'], params['format'], context.progress)
+    return path, download_name(city_name, params['period'], params['format']), MIMETYPES[params['format']]
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Pre-build city reports (e.g. at month end)')
+    parser.add_argument('--period', required=True, help='YYYY-MM or YYYY')
+    parser.add_argument('--city', type=int, action='append', help='City ID (repeatable, default all)')
+    parser.add_argument('--format', choices=list(RENDERERS), action='append', help='Default: every installed one')
+    args = parser.parse_args()
+
+    parse_period(args.period)
+    city_ids = args.city or [row['city_id'] for row in execute_query("SELECT city_id FROM cities", fetch=True) or []]
+    for city_id in city_ids:
+        for fmt in args.format or available_formats():
+            try:
+                build(city_id, args.period, fmt)
+            except Exception as e:
+                logger.error(f"❌ Report for city {city_id} ({fmt}) failed: {e}")
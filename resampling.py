@@ -0,0 +1,205 @@
+"""
+Gap-Filling and Resampling Pipeline
+Aligns every station's AQI and pollutant history to a daily grid, fills gaps
+and stores the result with per-value quality flags in aqi_daily_filled
+
+Usage:
+    python resampling.py                  # all stations
+    python resampling.py --station 2 -g 5 # one station, max 5-day interpolation
+"""
+
+import argparse
+import logging
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from database import get_db_connection, execute_query
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+POLLUTANT_COLUMNS = ['pm25', 'pm10', 'o3', 'no2', 'so2', 'co']
+VALUE_COLUMNS = ['aqi_value'] + POLLUTANT_COLUMNS
+
+# Quality flags stored next to every value in aqi_daily_filled
+FLAG_RAW = 0
+FLAG_INTERPOLATED = 1
+FLAG_SEASONAL = 2
+FLAG_MISSING = 3
+
+UPSERT_QUERY = """
+    INSERT INTO aqi_daily_filled (
+        station_id, date, city_id,
+        aqi_value, aqi_flag, pm25, pm25_flag, pm10, pm10_flag,
+        o3, o3_flag, no2, no2_flag, so2, so2_flag, co, co_flag
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        city_id = VALUES(city_id),
+        aqi_value = VALUES(aqi_value), aqi_flag = VALUES(aqi_flag),
+        pm25 = VALUES(pm25), pm25_flag = VALUES(pm25_flag),
+        pm10 = VALUES(pm10), pm10_flag = VALUES(pm10_flag),
+        o3 = VALUES(o3), o3_flag = VALUES(o3_flag),
+        no2 = VALUES(no2), no2_flag = VALUES(no2_flag),
+        so2 = VALUES(so2), so2_flag = VALUES(so2_flag),
+        co = VALUES(co), co_flag = VALUES(co_flag)
+"""
+
+
+def flag_column(column):
+    """Name of the quality flag column stored for a value column"""
+    return 'aqi_flag' if column == 'aqi_value' else f'{column}_flag'
+
+
+def load_station_history(station_id):
+    """
+    Load the raw AQI and pollutant readings of one station, archived months
+    included (read through archive.read_range())
+
+    Returns:
+        DataFrame indexed by date with one column per value in VALUE_COLUMNS;
+        duplicate readings for the same day are averaged
+    """
+    import archive
+
+    start, end = archive.full_history()
+    aqi = archive.read_range('aqi', start, end, station_id=station_id)[['date', 'aqi_value']]
+    pollutants = archive.read_range('pollutants', start, end, station_id=station_id)[['date'] + POLLUTANT_COLUMNS]
+
+    frames = []
+    for frame in (aqi, pollutants):
+        values = frame.drop(columns='date').apply(pd.to_numeric, errors='coerce')
+        frames.append(values.groupby(frame['date']).mean())
+
+    history = frames[0].join(frames[1], how='outer')
+    return history.reindex(columns=VALUE_COLUMNS)
+
+
+def resample_daily(history, max_gap=None):
+    """
+    Align a station history to a daily grid and fill the gaps
+
+    Gaps of at most ``max_gap`` consecutive days are linearly interpolated in
+    time. Longer gaps, and the values interpolation cannot reach, fall back to
+    the station's mean for the same calendar month (seasonal imputation).
+
+    Args:
+        history: DataFrame indexed by date (see load_station_history)
+        max_gap: Longest run of missing days to interpolate across
+
+    Returns:
+        DataFrame on the daily grid with the filled values and one
+        ``*_flag`` column per value (FLAG_RAW ... FLAG_MISSING)
+    """
+    if max_gap is None:
+        max_gap = Config.RESAMPLE_MAX_INTERPOLATION_GAP
+
+    if history.empty:
+        return pd.DataFrame(columns=VALUE_COLUMNS + [flag_column(c) for c in VALUE_COLUMNS])
+
+    history = history.sort_index()
+    grid = pd.date_range(history.index.min(), history.index.max(), freq='D', name='date')
+    frame = history.reindex(grid)
+
+    raw = frame.notna()
+    missing = ~raw
+
+    # Length of the run of missing days each cell belongs to
+    run_ids = raw.cumsum()
+    run_length = pd.DataFrame({
+        column: missing[column].groupby(run_ids[column]).transform('sum')
+        for column in frame.columns
+    })
+
+    interpolated = frame.interpolate(method='time', limit_area='inside')
+    interpolated_mask = missing & (run_length <= max_gap) & interpolated.notna()
+    filled = frame.where(~interpolated_mask, interpolated)
+
+    # Seasonal profile from raw readings only
+    seasonal = frame.groupby(frame.index.month).transform('mean')
+    seasonal_mask = filled.isna() & seasonal.notna()
+    filled = filled.where(~seasonal_mask, seasonal)
+
+    flags = np.select(
+        [raw.to_numpy(), interpolated_mask.to_numpy(), seasonal_mask.to_numpy()],
+        [FLAG_RAW, FLAG_INTERPOLATED, FLAG_SEASONAL],
+        default=FLAG_MISSING
+    ).astype(np.int8)
+
+    result = filled.round(2)
+    result['aqi_value'] = result['aqi_value'].round()
+    for position, column in enumerate(VALUE_COLUMNS):
+        result[flag_column(column)] = flags[:, position]
+    return result
+
+
+def store_filled(station_id, city_id, filled, batch_size=1000):
+    """
+    Upsert a resampled station series into aqi_daily_filled
+
+    Returns:
+        Number of rows written
+    """
+    if filled.empty:
+        return 0
+
+    values = filled[VALUE_COLUMNS].astype(object).where(filled[VALUE_COLUMNS].notna(), None)
+    flags = filled[[flag_column(c) for c in VALUE_COLUMNS]]
+
+    rows = []
+    for day, value_row, flag_row in zip(filled.index, values.itertuples(index=False), flags.itertuples(index=False)):
+        row = [station_id, day.date(), city_id]
+        for value, flag in zip(value_row, flag_row):
+            row.extend((value, int(flag)))
+        rows.append(tuple(row))
+
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(UPSERT_QUERY, rows[start:start + batch_size])
+        connection.commit()
+        cursor.close()
+
+    return len(rows)
+
+
+def run_pipeline(station_ids=None, max_gap=None):
+    """
+    Resample and store every station (or the given station IDs)
+
+    Returns:
+        Dict of station_id -> {flag name: count} summarising the fill
+    """
+    stations = execute_query("SELECT station_id, city_id FROM stations ORDER BY station_id", fetch=True) or []
+    if station_ids:
+        stations = [s for s in stations if s['station_id'] in set(station_ids)]
+
+    summary = {}
+    for station in stations:
+        history = load_station_history(station['station_id'])
+        filled = resample_daily(history, max_gap=max_gap)
+        written = store_filled(station['station_id'], station['city_id'], filled)
+
+        flags = filled[[flag_column(c) for c in VALUE_COLUMNS]].to_numpy()
+        counts = np.bincount(flags.ravel().astype(np.int64), minlength=4)
+        summary[station['station_id']] = {
+            'days': written,
+            'raw': int(counts[FLAG_RAW]),
+            'interpolated': int(counts[FLAG_INTERPOLATED]),
+            'seasonal': int(counts[FLAG_SEASONAL]),
+            'missing': int(counts[FLAG_MISSING])
+        }
+        logger.info(f"✅ Station {station['station_id']}: {summary[station['station_id']]}")
+
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Resample station data to a daily grid and fill gaps')
+    parser.add_argument('--station', '-s', type=int, action='append', help='Station ID (repeatable)')
+    parser.add_argument('--max-gap', '-g', type=int, default=None,
+                        help='Longest gap (days) to interpolate across')
+    args = parser.parse_args()
+    run_pipeline(station_ids=args.station, max_gap=args.max_gap)
@@ -0,0 +1,204 @@
+"""
+Response Cache Module
+ETag / If-None-Match handling and compressed response caching for the
+read-only JSON APIs. ETags are derived from a data version counter that
+every write route bumps, so cached payloads stay valid until data changes
+"""
+
+import gzip
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, session, make_response
+
+from config import Config
+from database import execute_query
+import singleflight
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 512
+
+_version_lock = threading.Lock()
+_version = 0
+_version_checked = 0.0
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Concurrent misses for the same ETag build the body once
+_flights = singleflight.Group('response_cache')
+
+
+# ==================== Data Version ====================
+
+def get_data_version():
+    """
+    Current data version, re-read from the data_version table at most once
+    per Config.DATA_VERSION_CHECK_INTERVAL seconds (so other workers'
+    bumps are picked up quickly)
+    """
+    global _version, _version_checked
+
+    if time.monotonic() - _version_checked < Config.DATA_VERSION_CHECK_INTERVAL:
+        return _version
+
+    with _version_lock:
+        if time.monotonic() - _version_checked >= Config.DATA_VERSION_CHECK_INTERVAL:
+            result = execute_query("SELECT version FROM data_version WHERE id = 1", fetch=True)
+            if result:
+                _version = max(_version, int(result[0]['version']))
+            _version_checked = time.monotonic()
+        return _version
+
+
+def bump_data_version():
+    """Mark all cached API responses stale; called by every write route"""
+    global _version, _version_checked
+
+    with _version_lock:
+        execute_query("UPDATE data_version SET version = version + 1 WHERE id = 1")
+        result = execute_query("SELECT version FROM data_version WHERE id = 1", fetch=True)
+        # Fall back to a process-local counter if the table is missing
+        _version = max(_version + 1, int(result[0]['version']) if result else 0)
+        _version_checked = time.monotonic()
+
+    with _cache_lock:
+        _cache.clear()
+    return _version
+
+
+# ==================== Cached Responses ====================
+
+class CachedBody:
+    """Serialized response body plus its lazily built compressed variants"""
+
+    def __init__(self, body, mimetype):
+        self.mimetype = mimetype
+        self.encodings = {'identity': body}
+        self.lock = threading.Lock()
+
+    def get(self, encoding):
+        """Return the body in the given encoding, compressing on first use"""
+        body = self.encodings.get(encoding)
+        if body is None:
+            with self.lock:
+                body = self.encodings.get(encoding)
+                if body is None:
+                    identity = self.encodings['identity']
+                    if encoding == 'br':
+                        body = brotli.compress(identity, quality=5)
+                    else:
+                        body = gzip.compress(identity, compresslevel=6)
+                    self.encodings[encoding] = body
+        return body
+
+
+def choose_encoding(size):
+    """Pick the best Content-Encoding the client accepts for a body of this size"""
+    if size < MIN_COMPRESS_SIZE:
+        return 'identity'
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return 'identity'
+
+
+def make_etag(ttl=None):
+    """ETag for the current request: route, query string, viewer and data version"""
+    parts = [
+        request.path,
+        '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True))),
+        str(session.get('role')),
+        str(session.get('city_id')),
+        str(get_data_version())
+    ]
+    if ttl:
+        # Live data (e.g. OpenWeatherMap) is additionally bucketed by time
+        parts.append(str(int(time.time() // ttl)))
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def build_response(entry, etag):
+    """Response for a cached body (or a 304 if entry is None), compressed for the current client"""
+    if entry is None:
+        response = make_response('', 304)
+    else:
+        encoding = choose_encoding(len(entry.encodings['identity']))
+        response = make_response(entry.get(encoding), 200)
+        response.mimetype = entry.mimetype
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+    response.vary.add('Cookie')
+    return response
+
+
+def cached_json(view=None, ttl=None):
+    """
+    Decorator for read-only JSON views
+
+    Adds an ETag, answers matching If-None-Match requests with 304 and
+    serves repeat requests from a compressed in-memory cache. Only 200
+    responses are cached. Use ttl= for views that embed live data.
+
+    Concurrent misses for the same ETag run the view once; the others wait
+    and share its body (a non-200 result is not shared - each waiter then
+    runs the view itself).
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            etag = make_etag(ttl)
+
+            # The ETag only changes with the data version, so a match is
+            # still valid even if this worker evicted (or never built) the body
+            if request.if_none_match.contains(etag):
+                return build_response(None, etag)
+
+            with _cache_lock:
+                entry = _cache.get(etag)
+                if entry is not None:
+                    _cache.move_to_end(etag)
+
+            if entry is None:
+                response = None
+
+                def build():
+                    nonlocal response
+                    response = make_response(func(*args, **kwargs))
+                    if response.status_code != 200 or not response.is_json:
+                        return None
+                    built = CachedBody(response.get_data(), response.mimetype)
+                    with _cache_lock:
+                        _cache[etag] = built
+                        while len(_cache) > Config.RESPONSE_CACHE_MAX_ENTRIES:
+                            _cache.popitem(last=False)
+                    return built
+
+                entry = _flights.do(etag, build)
+                if entry is None:
+                    # This request's own non-200 response, or a shared miss that produced none
+                    return response if response is not None else make_response(func(*args, **kwargs))
+
+            return build_response(entry, etag)
+        return wrapper
+
+    if view is not None:
+        return decorator(view)
+    return decorator
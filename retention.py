@@ -0,0 +1,248 @@
+"""
+Partition Retention Manager
+Keeps the monthly RANGE COLUMNS partitions of aqi, pollutants and weather
+(database/partition_tables.sql) rolling: splits upcoming months off the
+empty p_future partition and drops or archives months older than the
+retention window. Both are metadata operations - expired months are never
+deleted row by row.
+
+Archiving swaps the partition with an empty standalone table named
+<table>_archive_pYYYYMM (EXCHANGE PARTITION), so the rows leave the hot
+table instantly and stay queryable until they are exported or dropped.
+
+Usage:
+    python retention.py                 # apply Config.RETENTION_* settings
+    python retention.py --dry-run       # print the planned statements only
+    python retention.py --keep 36 --archive
+"""
+
+import argparse
+import logging
+from datetime import date
+
+from mysql.connector import Error
+
+from config import Config
+from database import execute_query, get_db_connection
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ('aqi', 'pollutants', 'weather')
+FUTURE_PARTITION = 'p_future'
+
+
+def month_start(day, offset=0):
+    """First day of the month ``offset`` months after day's month"""
+    index = day.year * 12 + day.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'p{month.year}{month.month:02d}'
+
+
+def list_partitions(table):
+    """
+    Partitions of a table in ascending order
+
+    Returns:
+        List of dicts with name, upper bound (date, or None for MAXVALUE) and row estimate
+    """
+    rows = execute_query(
+        """SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS bound, TABLE_ROWS AS row_estimate
+           FROM information_schema.PARTITIONS
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+           ORDER BY PARTITION_ORDINAL_POSITION""",
+        (table,), fetch=True
+    ) or []
+
+    partitions = []
+    for row in rows:
+        bound = row['bound'].strip("'")
+        partitions.append({
+            'name': row['name'],
+            'bound': None if bound == 'MAXVALUE' else date.fromisoformat(bound),
+            'row_estimate': row['row_estimate']
+        })
+    return partitions
+
+
+def plan_future_partitions(partitions, today, months_ahead):
+    """
+    Statement splitting the missing months up to ``months_ahead`` off p_future
+
+    Returns:
+        Tuple (SQL fragment for ALTER TABLE or None, new partition names)
+    """
+    bounds = [p['bound'] for p in partitions if p['bound'] is not None]
+    if not bounds or partitions[-1]['name'] != FUTURE_PARTITION:
+        return None, []
+
+    last_bound = max(bounds)
+    target = month_start(today, months_ahead + 1)
+    names, definitions = [], []
+    while last_bound < target:
+        names.append(partition_name(last_bound))
+        definitions.append(f"PARTITION {names[-1]} VALUES LESS THAN ('{month_start(last_bound, 1)}')")
+        last_bound = month_start(last_bound, 1)
+
+    if not names:
+        return None, []
+    definitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return f"REORGANIZE PARTITION {FUTURE_PARTITION} INTO ({', '.join(definitions)})", names
+
+
+def plan_expired_partitions(partitions, today, keep_months):
+    """Partitions (including p_history) that lie entirely before the retention window"""
+    cutoff = month_start(today, -keep_months)
+    return [p for p in partitions if p['bound'] is not None and p['bound'] <= cutoff]
+
+
+def run_ddl(statement, dry_run=False):
+    """
+    Log and execute one DDL statement
+
+    Unlike execute_query() a failure is raised (mysql.connector Error), so
+    callers can stop before acting on a step that did not happen.
+    """
+    logger.info(statement)
+    if dry_run:
+        return
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        try:
+            cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def archive_partition(table, partition, dry_run=False):
+    """
+    Move one partition's rows into <table>_archive_<partition> via EXCHANGE PARTITION
+
+    Safe to re-run: an archive table left by an earlier attempt is reused
+    if it is empty. One holding rows is never exchanged again - that would
+    swap them back into the live table; if the partition is already empty
+    (an earlier exchange whose DROP failed) the exchange counts as done.
+
+    Raises:
+        mysql.connector Error if any step failed (the partition still holds its rows)
+    """
+    archive_table = f'{table}_archive_{partition}'
+    existing = execute_query(
+        """SELECT CREATE_OPTIONS AS options, TABLE_ROWS AS row_estimate FROM information_schema.TABLES
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s""",
+        (archive_table,), fetch=True
+    )
+    if existing is None:
+        raise Error(msg=f"Could not look up {archive_table}")
+
+    if not existing:
+        run_ddl(f"CREATE TABLE {archive_table} LIKE {table}", dry_run)
+        run_ddl(f"ALTER TABLE {archive_table} REMOVE PARTITIONING", dry_run)
+    else:
+        if 'partitioned' in (existing[0]['options'] or '').lower():
+            run_ddl(f"ALTER TABLE {archive_table} REMOVE PARTITIONING", dry_run)
+        # TABLE_ROWS is an estimate; only a real lookup proves a table empty
+        rows = execute_query(
+            f"""SELECT EXISTS(SELECT 1 FROM {archive_table}) AS archived,
+                       EXISTS(SELECT 1 FROM {table} PARTITION ({partition})) AS live""",
+            fetch=True
+        )
+        if rows is None:
+            raise Error(msg=f"Could not inspect {archive_table}")
+        if rows[0]['archived']:
+            if not rows[0]['live']:
+                logger.info(f"  {table} {partition} was already exchanged into {archive_table}")
+                return archive_table
+            raise Error(msg=f"{archive_table} already holds rows, refusing to exchange {table} {partition} into it")
+
+    run_ddl(f"ALTER TABLE {table} EXCHANGE PARTITION {partition} WITH TABLE {archive_table}", dry_run)
+    return archive_table
+
+
+def apply_retention(tables=PARTITIONED_TABLES, keep_months=None, months_ahead=None, archive=None,
+                    today=None, dry_run=False):
+    """
+    Create future partitions and drop or archive expired ones
+
+    Returns:
+        Dict table -> {'created': [...], 'dropped': [...], 'archived': [...]}
+    """
+    keep_months = Config.RETENTION_MONTHS if keep_months is None else keep_months
+    months_ahead = Config.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    archive = Config.RETENTION_ARCHIVE if archive is None else archive
+    today = today or date.today()
+
+    summary = {}
+    expired_any = False
+    cube_dropped_through = None
+    for table in tables:
+        partitions = list_partitions(table)
+        if not partitions:
+            logger.warning(f"⚠️ {table} is not partitioned, run database/partition_tables.sql first")
+            continue
+        result = summary[table] = {'created': [], 'dropped': [], 'archived': []}
+
+        reorganize, created = plan_future_partitions(partitions, today, months_ahead)
+        if reorganize:
+            try:
+                run_ddl(f"ALTER TABLE {table} {reorganize}", dry_run)
+                result['created'] = created
+            except Error as e:
+                logger.error(f"❌ Could not create the future partitions of {table}: {e}")
+
+        if keep_months:
+            bounds = {p['name']: p['bound'] for p in plan_expired_partitions(partitions, today, keep_months)}
+            expired = list(bounds)
+            if archive:
+                # A partition whose exchange failed still holds its rows and must not be dropped
+                exchanged = []
+                for name in expired:
+                    try:
+                        result['archived'].append(archive_partition(table, name, dry_run))
+                        exchanged.append(name)
+                    except Error as e:
+                        logger.error(f"❌ Could not archive {table} partition {name}, keeping it: {e}")
+                expired = exchanged
+            if expired:
+                try:
+                    run_ddl(f"ALTER TABLE {table} DROP PARTITION {', '.join(expired)}", dry_run)
+                    result['dropped'] = expired
+                    expired_any = True
+                    if table in ('aqi', 'pollutants'):
+                        through = max(bounds[name] for name in expired)
+                        cube_dropped_through = max(through, cube_dropped_through or through)
+                except Error as e:
+                    logger.error(f"❌ Could not drop the expired partitions of {table}: {e}")
+
+    if expired_any and not dry_run:
+        # Cached API responses and pages may include the removed months
+        import response_cache
+        response_cache.bump_data_version()
+        if summary.get('aqi', {}).get('dropped'):
+            import city_stats
+            city_stats.refresh()
+        if cube_dropped_through:
+            # The cube still aggregates the dropped months until they are recomputed
+            import cube
+            cube.mark_dirty_before(cube_dropped_through)
+
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Roll the monthly partitions of aqi, pollutants and weather')
+    parser.add_argument('--keep', type=int, help='Months to keep (0 keeps everything)')
+    parser.add_argument('--ahead', type=int, help='Future months to pre-create')
+    parser.add_argument('--archive', action='store_true', default=None,
+                        help='Exchange expired months into <table>_archive_pYYYYMM tables instead of dropping')
+    parser.add_argument('--table', action='append', choices=PARTITIONED_TABLES, help='Table (repeatable)')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    result = apply_retention(tables=args.table or PARTITIONED_TABLES, keep_months=args.keep,
+                             months_ahead=args.ahead, archive=args.archive, dry_run=args.dry_run)
+    for table, changes in result.items():
+        logger.info(f"✅ {table}: {changes}")
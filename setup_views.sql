@@ -22,22 +22,22 @@ LEFT JOIN (
 GROUP BY c.city_id, c.city_name, c.state_name;
 
 -- View 2: Health Summary with population-adjusted metrics
+-- Reads the precomputed health_analytics table (database/create_health_analytics.sql)
 CREATE OR REPLACE VIEW health_summary AS
 SELECT 
-  h.city_id,
-  c.city_name,
+  ha.city_id,
+  ha.city_name,
   c.state_name,
-  h.year,
-  h.asthma_cases,
-  h.lung_cancer_cases,
-  h.respiratory_cases,
-  h.hospital_visits,
-  h.pollution_deaths,
-  p.total_population,
-  ROUND((h.asthma_cases * 100000.0 / p.total_population), 2) as asthma_per_100k,
-  ROUND((h.pollution_deaths * 100000.0 / p.total_population), 2) as deaths_per_100k
-FROM health_impact h
-JOIN cities c ON h.city_id = c.city_id
-JOIN population p ON h.city_id = p.city_id AND h.year = p.year;
+  ha.year,
+  ha.asthma_cases,
+  ha.lung_cancer_cases,
+  ha.respiratory_cases,
+  ha.hospital_visits,
+  ha.pollution_deaths,
+  ha.total_population,
+  ha.asthma_per_100k,
+  ha.deaths_per_100k
+FROM health_analytics ha
+JOIN cities c ON ha.city_id = c.city_id;
 
 SELECT 'Views created successfully!' as Status;
@@ -0,0 +1,87 @@
+"""
+Single-Flight Module
+Request coalescing across the threads of one worker: while a call for a key
+is in flight, identical calls wait for it and share its result instead of
+repeating the same queries or upstream HTTP calls. Nothing is cached - once
+the call returns, the next one for that key runs again (caching stays with
+response_cache / page_cache).
+
+Usage:
+    _weather = singleflight.Group('openweather')
+    data = _weather.do(('city', city_id), fetch, city_name)
+
+Shared results are handed to several callers, so they must be treated as
+read-only.
+"""
+
+import logging
+import threading
+
+from config import Config
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class Group:
+    """Calls sharing a key namespace (one per kind of work, e.g. 'openweather')"""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs), or wait for the identical call already running
+
+        A follower that waits longer than Config.SINGLEFLIGHT_WAIT_TIMEOUT
+        runs func itself, so a stuck leader cannot stall every request.
+        Exceptions raised by the leader are re-raised in its followers.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.followers += 1
+
+        if not leader:
+            if call.done.wait(Config.SINGLEFLIGHT_WAIT_TIMEOUT):
+                instrumentation.record_singleflight(self.name, 'shared')
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            instrumentation.record_singleflight(self.name, 'timeout')
+            logger.warning(f"⚠️ Single-flight {self.name} call {key!r} still running, computing separately")
+            return func(*args, **kwargs)
+
+        instrumentation.record_singleflight(self.name, 'leader')
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            # Forget the call before releasing the followers: later arrivals start a fresh one
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        """Keys currently being computed"""
+        with self._lock:
+            return list(self._calls)
@@ -0,0 +1,417 @@
+"""
+Synthetic Data Generator
+Learns per-city seasonal profiles from the bundled CSVs (AQI/*.csv station
+pollutant exports, aqi_output.csv and weather_data.csv) and streams
+statistically similar aqi, pollutants and weather rows for any number of
+cities, stations and years - either as LOAD DATA-ready CSV files or as
+batched inserts - so performance work can be tested at production size.
+
+Every series is modelled as a monthly seasonal mean plus AR(1) noise
+(log-space for AQI, pollutants and wind). Stations of one city share a
+city-wide component, pollutants follow AQI with the correlation seen in the
+real data, and missing days / blank pollutant cells occur at the real rates.
+
+Usage:
+    python synthetic_data.py --cities 500 --stations 8 --start 2015-01-01 --out bench_data/
+    python synthetic_data.py --cities 50 --stations 4 --insert
+"""
+
+import argparse
+import csv
+import glob
+import logging
+import os
+import re
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+POLLUTANT_COLUMNS = ['pm25', 'pm10', 'o3', 'no2', 'so2', 'co']
+
+# Cities of the bundled dataset (city_id as used by aqi_output.csv / weather_data.csv)
+BUNDLED_CITIES = {
+    1: ('Delhi', 'Delhi'), 2: ('Mumbai', 'Maharashtra'), 3: ('Bangalore', 'Karnataka'),
+    4: ('Chennai', 'Tamil Nadu'), 5: ('Kolkata', 'West Bengal'), 6: ('Hyderabad', 'Telangana'),
+    7: ('Pune', 'Maharashtra'), 8: ('Bhopal', 'Madhya Pradesh'), 9: ('Jaipur', 'Rajasthan'),
+    10: ('Lucknow', 'Uttar Pradesh')
+}
+
+# (latitude, longitude) of the bundled cities, as seeded by database/add_coordinates.sql
+BUNDLED_COORDINATES = {
+    1: (28.6139, 77.2090), 2: (19.0760, 72.8777), 3: (12.9716, 77.5946), 4: (13.0827, 80.2707),
+    5: (22.5726, 88.3639), 6: (17.3850, 78.4867), 7: (18.5204, 73.8567), 8: (23.2599, 77.4126),
+    9: (26.9124, 75.7873), 10: (26.8467, 80.9462)
+}
+
+# Share of a station's AQI noise that is common to the whole city
+STATION_CORRELATION = 0.7
+# Spread of synthetic cities / stations around their template city (log-space)
+CITY_LEVEL_SIGMA = 0.15
+STATION_LEVEL_SIGMA = 0.08
+# Spread (degrees) of synthetic cities around their template city and of stations around their city
+CITY_POSITION_SIGMA = 0.5
+STATION_POSITION_SIGMA = 0.05
+
+TABLE_COLUMNS = {
+    'cities': ['city_id', 'city_name', 'pin_code', 'state_name', 'latitude', 'longitude'],
+    'stations': ['station_id', 'city_id', 'station_name', 'station_type', 'managed_by', 'latitude', 'longitude'],
+    'aqi': ['city_id', 'station_id', 'date', 'aqi_value'],
+    'pollutants': ['city_id', 'station_id', 'date'] + POLLUTANT_COLUMNS,
+    'weather': ['city_id', 'date', 'temp', 'humidity', 'wind_speed', 'precipitation']
+}
+
+
+# ==================== Learning ====================
+
+def _city_from_filename(path):
+    """'kurla,-mumbai-air-quality.csv' -> 'mumbai'"""
+    match = re.search(r'([a-z]+)-air-quality\.csv$', os.path.basename(path).lower())
+    return match.group(1) if match else None
+
+
+def fit_series(values):
+    """
+    Fit a monthly seasonal mean plus AR(1) residual
+
+    Args:
+        values: Series indexed by a DatetimeIndex (NaN allowed)
+
+    Returns:
+        Dict with 'monthly' (12 means), 'sigma' (innovation std), 'phi' and
+        'residual' (Series of deseasonalized values, used for correlations)
+    """
+    values = values.dropna()
+    if values.empty:
+        return {'monthly': [0.0] * 12, 'sigma': 0.0, 'phi': 0.0, 'residual': values}
+
+    monthly = values.groupby(values.index.month).mean().reindex(range(1, 13))
+    # Months without data take the yearly mean
+    monthly = monthly.fillna(values.mean())
+    residual = values - monthly.loc[values.index.month].to_numpy()
+
+    daily = residual.groupby(residual.index).mean().asfreq('D')
+    pairs = pd.concat([daily, daily.shift(1)], axis=1).dropna()
+    phi = float(pairs.corr().iloc[0, 1]) if len(pairs) > 2 else 0.0
+    phi = float(np.clip(np.nan_to_num(phi), 0.0, 0.98))
+    sigma = float(residual.std(ddof=0)) * np.sqrt(1 - phi ** 2)
+
+    return {'monthly': monthly.tolist(), 'sigma': float(np.nan_to_num(sigma)), 'phi': phi, 'residual': daily}
+
+
+def _read_station_csv(path):
+    frame = pd.read_csv(path, skipinitialspace=True, na_values=['', ' '])
+    frame.columns = [c.strip() for c in frame.columns]
+    frame['date'] = pd.to_datetime(frame['date'], format='%d-%m-%Y', errors='coerce')
+    frame = frame.dropna(subset=['date'])
+    values = frame[POLLUTANT_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    return values.groupby(frame['date']).mean().sort_index()
+
+
+def learn_profiles(data_dir=None):
+    """
+    Learn one profile per bundled city
+
+    Returns:
+        Dict city_id -> profile dict (aqi, pollutants, weather and gap statistics)
+    """
+    data_dir = data_dir or os.path.dirname(os.path.abspath(__file__))
+    aqi = pd.read_csv(os.path.join(data_dir, 'aqi_output.csv'))
+    aqi['date'] = pd.to_datetime(aqi['date'], format='%d-%m-%Y', errors='coerce')
+    weather = pd.read_csv(os.path.join(data_dir, 'weather_data.csv'), parse_dates=['date'])
+
+    names = {name.lower(): city_id for city_id, (name, _) in BUNDLED_CITIES.items()}
+    station_files = {names.get(_city_from_filename(p)): p for p in glob.glob(os.path.join(data_dir, 'AQI', '*.csv'))}
+
+    profiles = {}
+    for city_id, (city_name, state_name) in BUNDLED_CITIES.items():
+        city_aqi = aqi[aqi['city_id'] == city_id].set_index('date')['AQI'].astype(float)
+        aqi_fit = fit_series(np.log(city_aqi.clip(lower=1)))
+
+        profile = {
+            'city_id': city_id,
+            'city_name': city_name,
+            'state_name': state_name,
+            'aqi': {k: v for k, v in aqi_fit.items() if k != 'residual'},
+            'pollutants': {},
+            'missing_day_rate': 0.0,
+            'weather': {}
+        }
+
+        path = station_files.get(city_id)
+        if path:
+            readings = _read_station_csv(path)
+            span = (readings.index.max() - readings.index.min()).days + 1
+            profile['missing_day_rate'] = float(np.clip(1 - len(readings) / span, 0.0, 0.5)) if span > 0 else 0.0
+            for column in POLLUTANT_COLUMNS:
+                fit = fit_series(np.log1p(readings[column].clip(lower=0)))
+                aligned = pd.concat([fit['residual'], aqi_fit['residual']], axis=1).dropna()
+                rho = float(aligned.corr().iloc[0, 1]) if len(aligned) > 2 else 0.0
+                profile['pollutants'][column] = {
+                    'monthly': fit['monthly'],
+                    'sigma': fit['sigma'],
+                    'phi': fit['phi'],
+                    'aqi_correlation': float(np.clip(np.nan_to_num(rho), -0.95, 0.95)),
+                    'blank_rate': float(readings[column].isna().mean())
+                }
+        if not profile['pollutants']:
+            logger.warning(f"⚠️ No station CSV for {city_name}, pollutants follow AQI only")
+            for column in POLLUTANT_COLUMNS:
+                profile['pollutants'][column] = {
+                    'monthly': [m - 0.5 for m in aqi_fit['monthly']], 'sigma': aqi_fit['sigma'],
+                    'phi': aqi_fit['phi'], 'aqi_correlation': 0.8, 'blank_rate': 0.05
+                }
+
+        city_weather = weather[weather['city_id'] == city_id].set_index('date')
+        for column, transform in (('temperature', None), ('humidity', None), ('wind_speed', np.log1p)):
+            series = city_weather[column].astype(float)
+            fit = fit_series(transform(series) if transform else series)
+            profile['weather'][column] = {k: v for k, v in fit.items() if k != 'residual'}
+        rain = city_weather['precipitation'].astype(float)
+        wet = rain > 0
+        profile['weather']['precipitation'] = {
+            'wet_probability': wet.groupby(rain.index.month).mean().reindex(range(1, 13)).fillna(0).tolist(),
+            'wet_mean': rain[wet].groupby(rain[wet].index.month).mean().reindex(range(1, 13)).fillna(0).tolist()
+        }
+
+        profiles[city_id] = profile
+    return profiles
+
+
+# ==================== Generation ====================
+
+def ar1(rng, size, phi, sigma):
+    """Stationary AR(1) series of ``size`` values"""
+    shocks = rng.normal(0.0, sigma, size)
+    series = np.empty(size)
+    series[0] = shocks[0] / np.sqrt(max(1 - phi ** 2, 1e-6))
+    for i in range(1, size):
+        series[i] = phi * series[i - 1] + shocks[i]
+    return series
+
+
+def _seasonal(fit, months):
+    return np.asarray(fit['monthly'])[months - 1]
+
+
+def generate_city(profile, city_id, station_ids, dates, rng):
+    """
+    Rows for one synthetic city
+
+    Args:
+        profile: Template profile from learn_profiles()
+        city_id: ID of the synthetic city
+        station_ids: Station IDs to generate
+        dates: DatetimeIndex of days
+
+    Returns:
+        Dict table -> list of row tuples (aqi, pollutants, weather)
+    """
+    n = len(dates)
+    months = dates.month.to_numpy()
+    day_values = [d.date() for d in dates]
+    aqi_fit = profile['aqi']
+    city_level = rng.normal(0.0, CITY_LEVEL_SIGMA)
+    city_noise = ar1(rng, n, aqi_fit['phi'], aqi_fit['sigma'])
+
+    rows = {'aqi': [], 'pollutants': [], 'weather': []}
+    for station_id in station_ids:
+        own_noise = ar1(rng, n, aqi_fit['phi'], aqi_fit['sigma'])
+        noise = np.sqrt(STATION_CORRELATION) * city_noise + np.sqrt(1 - STATION_CORRELATION) * own_noise
+        level = city_level + rng.normal(0.0, STATION_LEVEL_SIGMA)
+        aqi = np.clip(np.exp(_seasonal(aqi_fit, months) + level + noise), 1, 500).round().astype(int)
+        # Standardized AQI noise drives the correlated part of each pollutant
+        aqi_z = noise / (np.std(noise) or 1.0)
+
+        pollutant_values = {}
+        for column, fit in profile['pollutants'].items():
+            rho = fit['aqi_correlation']
+            own = ar1(rng, n, fit['phi'], 1.0)
+            own = own / (np.std(own) or 1.0)
+            spread = fit['sigma'] / np.sqrt(max(1 - fit['phi'] ** 2, 1e-6))
+            logged = _seasonal(fit, months) + level + spread * (rho * aqi_z + np.sqrt(1 - rho ** 2) * own)
+            values = np.clip(np.expm1(logged), 0, 9999.99).round(2)
+            blanks = rng.random(n) < fit['blank_rate']
+            pollutant_values[column] = np.where(blanks, np.nan, values)
+
+        present = rng.random(n) >= profile['missing_day_rate']
+        for i in np.flatnonzero(present):
+            rows['aqi'].append((city_id, station_id, day_values[i], int(aqi[i])))
+            rows['pollutants'].append((city_id, station_id, day_values[i]) + tuple(
+                None if np.isnan(pollutant_values[c][i]) else float(pollutant_values[c][i])
+                for c in POLLUTANT_COLUMNS
+            ))
+
+    weather = profile['weather']
+    temp_fit, humidity_fit, wind_fit = weather['temperature'], weather['humidity'], weather['wind_speed']
+    temp = _seasonal(temp_fit, months) + ar1(rng, n, temp_fit['phi'], temp_fit['sigma'])
+    humidity = np.clip(_seasonal(humidity_fit, months) + ar1(rng, n, humidity_fit['phi'], humidity_fit['sigma']), 0, 100)
+    wind = np.clip(np.expm1(_seasonal(wind_fit, months) + ar1(rng, n, wind_fit['phi'], wind_fit['sigma'])), 0, 999)
+    rain_fit = weather['precipitation']
+    wet = rng.random(n) < np.asarray(rain_fit['wet_probability'])[months - 1]
+    rain = np.where(wet, rng.exponential(np.maximum(np.asarray(rain_fit['wet_mean'])[months - 1], 0.1)), 0.0)
+    for i in range(n):
+        rows['weather'].append((city_id, day_values[i], round(float(temp[i]), 2), round(float(humidity[i]), 2),
+                                round(float(wind[i]), 2), round(float(min(rain[i], 9999.99)), 2)))
+    return rows
+
+
+def iter_dataset(profiles, cities, stations_per_city, start, end, city_offset=1000, seed=42):
+    """
+    Stream the synthetic dataset one city at a time
+
+    Synthetic city ``city_offset + k`` uses bundled city ``k % 10`` as its
+    template; its stations are numbered ``city_id * 100 + m``.
+
+    Yields:
+        Tuples (table_name, rows) with table_name in TABLE_COLUMNS
+    """
+    if stations_per_city > 100:
+        raise ValueError("At most 100 stations per city (station_id = city_id * 100 + m)")
+
+    rng = np.random.default_rng(seed)
+    # Positions come from their own stream so a seed keeps producing the same readings
+    position_rng = np.random.default_rng([seed, 1])
+    dates = pd.date_range(start, end, freq='D')
+    templates = [profiles[k] for k in sorted(profiles)]
+
+    for k in range(cities):
+        profile = templates[k % len(templates)]
+        city_id = city_offset + k
+        station_ids = [city_id * 100 + m for m in range(stations_per_city)]
+        city_lat, city_lon = np.round(np.add(BUNDLED_COORDINATES[profile['city_id']],
+                                             position_rng.normal(0.0, CITY_POSITION_SIGMA, 2)), 6)
+        station_positions = np.round([city_lat, city_lon] + position_rng.normal(
+            0.0, STATION_POSITION_SIGMA, (len(station_ids), 2)), 6)
+
+        yield 'cities', [(city_id, f"{profile['city_name']} {city_id}", f'{city_id % 1000000:06d}', profile['state_name'],
+                          float(city_lat), float(city_lon))]
+        yield 'stations', [(station_id, city_id, f"Synthetic Station {station_id}",
+                            'Air Quality Monitoring Station', 'Synthetic', float(lat), float(lon))
+                           for station_id, (lat, lon) in zip(station_ids, station_positions)]
+        for table, rows in generate_city(profile, city_id, station_ids, dates, rng).items():
+            yield table, rows
+
+
+# ==================== Output ====================
+
+def write_csv_files(batches, out_dir):
+    """
+    Write the stream to one CSV per table plus load_data.sql (LOAD DATA LOCAL INFILE)
+
+    NULLs are written as \\N so LOAD DATA keeps them as NULL.
+
+    Returns:
+        Dict table -> rows written
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    files, writers, counts = {}, {}, {}
+    try:
+        for table, rows in batches:
+            if table not in writers:
+                files[table] = open(os.path.join(out_dir, f'{table}.csv'), 'w', newline='')
+                writers[table] = csv.writer(files[table])
+                writers[table].writerow(TABLE_COLUMNS[table])
+                counts[table] = 0
+            writers[table].writerows(tuple('\\N' if v is None else v for v in row) for row in rows)
+            counts[table] += len(rows)
+    finally:
+        for f in files.values():
+            f.close()
+
+    with open(os.path.join(out_dir, 'load_data.sql'), 'w') as f:
+        f.write("-- Generated by synthetic_data.py; run with mysql --local-infile=1\n")
+        for table in TABLE_COLUMNS:
+            if table in counts:
+                f.write(f"LOAD DATA LOCAL INFILE '{os.path.abspath(os.path.join(out_dir, table + '.csv'))}'\n"
+                        f"    {'IGNORE ' if table in ('cities', 'stations') else ''}INTO TABLE {table}\n"
+                        f"    FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"'\n"
+                        f"    IGNORE 1 LINES ({', '.join(TABLE_COLUMNS[table])});\n")
+        if 'aqi' in counts:
+            f.write("-- LOAD DATA bypasses the app: afterwards run python latest_reading.py\n")
+    return counts
+
+
+def insert_dataset(batches, batch_size=5000):
+    """
+    Insert the stream with batched executemany, committing once per city
+
+    Existing cities / stations with the same IDs are kept (INSERT IGNORE).
+    Each city's latest_reading rows are upserted and its months marked dirty
+    in the cube in the same transaction (one statement each per city). After
+    its commit the city's latest reading is published to /api/stream clients
+    (across processes when Config.LIVE_RELAY_ENABLED is set) and its
+    city_stats row is recomputed.
+
+    Returns:
+        Dict table -> rows inserted
+    """
+    import city_stats
+    import cube
+    import latest_reading
+    import live_updates
+    from database import get_db_connection
+
+    counts = {}
+    latest = {}
+    city_rows = {'aqi': [], 'pollutants': []}
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        for table, rows in batches:
+            columns = TABLE_COLUMNS[table]
+            verb = 'INSERT IGNORE' if table in ('cities', 'stations') else 'INSERT'
+            query = f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+            for offset in range(0, len(rows), batch_size):
+                cursor.executemany(query, rows[offset:offset + batch_size])
+            counts[table] = counts.get(table, 0) + len(rows)
+            if table in ('aqi', 'pollutants') and rows:
+                latest[table] = dict(zip(columns, max(rows, key=lambda row: row[2])))
+                city_rows[table].extend(dict(zip(columns, row)) for row in rows)
+            if table == 'weather':
+                cube.mark_dirty([row['date'] for row in city_rows['aqi'] + city_rows['pollutants']], cursor)
+                latest_reading.record(latest_reading.merge(city_rows['aqi'], city_rows['pollutants']), cursor)
+                city_rows = {'aqi': [], 'pollutants': []}
+                connection.commit()
+                if rows:
+                    city_stats.refresh(rows[0][0])
+                _publish_latest(live_updates, latest)
+                latest = {}
+        connection.commit()
+        cursor.close()
+    return counts
+
+
+def _publish_latest(live_updates, latest):
+    """Publish a city's newest generated reading (aqi row plus its station's pollutants)"""
+    reading = latest.get('aqi')
+    if not reading:
+        return
+    pollutants = latest.get('pollutants', {})
+    if pollutants.get('date') != reading['date'] or pollutants.get('station_id') != reading['station_id']:
+        pollutants = {}
+    live_updates.publish_reading(reading['city_id'], reading['date'], reading['aqi_value'],
+                                 {name: pollutants.get(name) for name in POLLUTANT_COLUMNS},
+                                 station_id=reading['station_id'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic AQI, pollutant and weather data')
+    parser.add_argument('--cities', type=int, default=100)
+    parser.add_argument('--stations', type=int, default=5, help='Stations per city')
+    parser.add_argument('--start', default=f'{date.today().year - 1}-01-01')
+    parser.add_argument('--end', default=f'{date.today().year - 1}-12-31')
+    parser.add_argument('--city-offset', type=int, default=1000, help='First synthetic city_id')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', help='Directory containing aqi_output.csv, weather_data.csv and AQI/')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--out', help='Write bulk-loadable CSV files into this directory')
+    target.add_argument('--insert', action='store_true', help='Insert directly into the configured database')
+    args = parser.parse_args()
+
+    stream = iter_dataset(learn_profiles(args.data_dir), args.cities, args.stations, args.start, args.end,
+                          city_offset=args.city_offset, seed=args.seed)
+    result = write_csv_files(stream, args.out) if args.out else insert_dataset(stream)
+    logger.info(f"✅ Generated {result}")
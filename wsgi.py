@@ -0,0 +1,118 @@
+"""
+Production WSGI Entrypoint
+App factory plus the start-up hooks gunicorn.conf.py calls around each
+worker. Nothing here opens a database connection at import time, so the app
+can be preloaded in the gunicorn master (--preload / preload_app) and share
+its imported modules copy-on-write with the forked workers; every worker then
+creates its own MySQL pool (post_fork) and warms its caches before it starts
+accepting requests (post_worker_init).
+
+Start-up is measured: the import, warm-up and first-request durations are
+logged and exported at /metrics as dcds_startup_seconds{phase=...}
+(benchmarks/startup_bench.py compares cold and warmed workers).
+
+Usage:
+    gunicorn -c gunicorn.conf.py wsgi:application
+"""
+
+import logging
+import os
+import threading
+import time
+
+_import_started = time.perf_counter()
+
+from flask import g
+
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Modules that are imported on first use by the routes (pandas and friends);
+# loading them in the master before forking shares them across workers
+DEFERRED_MODULES = ('archive', 'pandas')
+
+
+def create_app():
+    """Import the Flask app and attach the first-request timer"""
+    from app import app
+
+    first_request = {'pending': True}
+    first_request_lock = threading.Lock()
+
+    @app.before_request
+    def _time_first_request():
+        if first_request['pending']:
+            with first_request_lock:
+                if first_request['pending']:
+                    first_request['pending'] = False
+                    g.startup_first_request = time.perf_counter()
+
+    @app.teardown_request
+    def _record_first_request(exc):
+        started = g.pop('startup_first_request', None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            instrumentation.record_startup('first_request', elapsed)
+            logger.info(f"✅ Worker {os.getpid()} served its first request in {elapsed * 1000:.1f} ms")
+
+    return app
+
+
+def preload_modules():
+    """Import the deferred heavy modules (gunicorn master, before the workers fork)"""
+    started = time.perf_counter()
+    for name in DEFERRED_MODULES:
+        __import__(name)
+    logger.info(f"✅ Preloaded {', '.join(DEFERRED_MODULES)} in {time.perf_counter() - started:.2f}s")
+
+
+def warm_up(app=None):
+    """
+    Build this worker's caches before it serves traffic
+
+    Each step is independent: one that fails (e.g. the database is still
+    starting) is logged and the worker starts anyway, filling that cache on
+    its first request instead.
+
+    Returns:
+        Dict step -> seconds (None for failed steps)
+    """
+    import city_index
+    import credentials
+    import database
+    import geo_index
+    import health_analytics
+    import response_cache
+
+    app = app or application
+    steps = (
+        ('modules', preload_modules),
+        ('db_pool', database.init_pools),
+        ('data_version', response_cache.get_data_version),
+        ('city_index', city_index.get_index),
+        ('geo_index', geo_index.get_index),
+        ('health_analytics', health_analytics.ensure_fresh),
+        ('templates', lambda: [app.jinja_env.get_template(name) for name in app.jinja_env.list_templates()]),
+        ('hash_pool', credentials.start_pool),
+    )
+
+    started = time.perf_counter()
+    timings = {}
+    for name, step in steps:
+        step_started = time.perf_counter()
+        try:
+            step()
+            timings[name] = round(time.perf_counter() - step_started, 4)
+        except Exception as e:
+            logger.warning(f"⚠️ Warm-up step {name} failed: {e}")
+            timings[name] = None
+
+    elapsed = time.perf_counter() - started
+    instrumentation.record_startup('warmup', elapsed)
+    logger.info(f"✅ Worker {os.getpid()} warmed up in {elapsed:.2f}s {timings}")
+    return timings
+
+
+application = create_app()
+instrumentation.record_startup('import', time.perf_counter() - _import_started)